@@ -1,24 +1,18 @@
 from datetime import timedelta
 
 from flask import Flask
-from flask.json import JSONEncoder
 from flask_jwt_extended import JWTManager
-from flask_bcrypt import Bcrypt
-
-from bson import json_util, ObjectId
 
 from config import app_config
+from app.encoders import JSON_ENCODERS, MongoJsonEncoder
+from app.indexes import indexes_cli, ensure_indexes_in_background
+from app.migrations import migrations_cli
+from app.scheduler import advance_phases_in_background
 from app.api.user import user_api_v1
 from app.api.placement import placement_api_v1
 from app.api.post import post_api_v1
 from app.api.post import notice_api_v1
-
-
-class MongoJsonEncoder(JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        return json_util.default(obj, json_util.CANONICAL_JSON_OPTIONS)
+from app.api.stats import stats_api_v1
 
 
 def create_app(config_name):
@@ -36,10 +30,7 @@ def create_app(config_name):
     app.config.from_object(app_config[config_name])
     app.config.from_pyfile("config.py")
 
-    app.json_encoder = MongoJsonEncoder
-
-    # bcrypt
-    app.config["BCRYPT"] = Bcrypt(app)
+    app.json_encoder = JSON_ENCODERS[app.config["JSON_ENCODER"]]
 
     # jwt
     jwt = JWTManager(app)
@@ -56,5 +47,14 @@ def create_app(config_name):
     app.register_blueprint(placement_api_v1)
     app.register_blueprint(post_api_v1)
     app.register_blueprint(notice_api_v1)
+    app.register_blueprint(stats_api_v1)
+
+    app.cli.add_command(indexes_cli)
+    app.cli.add_command(migrations_cli)
+    if app.config["MONGO_ENSURE_INDEXES"]:
+        ensure_indexes_in_background(app)
+    if app.config["PHASE_SCHEDULER_ENABLED"]:
+        # only processes serving requests advance the phases, not CLI commands
+        app.before_first_request(lambda: advance_phases_in_background(app))
 
     return app
@@ -1,25 +1,81 @@
 """
 This module contains all API for the placements.
 """
-from flask import Blueprint, jsonify, request
-
-from ..helpers import expect
+import csv
+import io
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Blueprint, jsonify, request, current_app
+from pymongo import ASCENDING, DESCENDING
+
+from ..helpers import expect, paginated
+from ..streaming import stream_json
+from ..shortlist import get_student_columns
+from ..cache import cached, response_cache
+from ..conflicts import get_phase_schedule
+from ..slots import allocate_slots, busy_slots
+from ..offers import allocate_offers, offer_changes
+from ..sync import delta_response, is_delta_request
 from app.dao.placementsDAO import (
     start_placement,
     create_phase,
+    get_phase,
     approve_phase,
     suggest_date_phase,
     get_unapproved_phases,
     get_upcoming_phases,
+    get_upcoming_phases_since,
     get_pending_phases,
+    get_phases_between,
     get_phase_result,
+    save_phase_results,
+    PHASE_RESULT_STATUSES,
+    get_phase_candidates,
+    get_busy_intervals,
+    lock_slot_days,
+    unlock_slot_days,
+    save_interview_slots,
+    get_interview_slots,
+    get_all_registered_students_cursor,
+    register_student,
+    unregister_student,
+    get_registrants,
+    get_placement_eligibility,
+    get_placements_eligibility,
+    get_offer_candidates,
+    save_offer_allocation,
 )
+from app.dao.usersDAO import get_students_by_ids_or_roll_numbers
 
 placement_api_v1 = Blueprint(
     "placement_api_v1", "placement_api_v1", url_prefix="/api/v1/placement"
 )
 
 
+def get_queue_args():
+    """
+    Reads ``limit``, ``offset`` & ``sort`` ("asc" or "desc") of a phase queue
+    request.
+
+    :returns: dictionary of limit, offset & sort arguments for the DAO
+    :rtype: dict
+    :raises ValueError: if an argument is not valid
+    """
+    limit = request.args.get("limit", None)
+    offset = int(request.args.get("offset", 0))
+    sort = request.args.get("sort", "asc")
+    if sort not in ("asc", "desc"):
+        raise ValueError("sort must be asc or desc")
+    if offset < 0 or (limit is not None and int(limit) < 1):
+        raise ValueError("Invalid limit or offset")
+    return {
+        "limit": int(limit) if limit else None,
+        "offset": offset,
+        "sort": ASCENDING if sort == "asc" else DESCENDING,
+    }
+
+
 @placement_api_v1.route("/start")
 def api_start_placement():
     """
@@ -44,6 +100,8 @@ def api_start_placement():
             expect(post_data["live_backlog"], str, "live_backlog"),
             expect(post_data["gender"], str, "gender"),
             expect(post_data["positions"], str, "positions"),
+            if "dream" in post_data:
+                expect(post_data["dream"], bool, "dream")
         except Exception as e:
             return jsonify({"error": str(e)}), 400
         return jsonify(start_placement(post_data)), 200
@@ -71,6 +129,10 @@ def api_create_phase():
             expect(post_data["title"], str, "title")
             expect(post_data["description"], str, "description"),
             expect(post_data["date"], str, "date"),
+            if "duration_minutes" in post_data:
+                expect(post_data["duration_minutes"], int, "duration minutes")
+            if "venue" in post_data:
+                expect(post_data["venue"], str, "venue")
         except Exception as e:
             return jsonify({"error": str(e)}), 400
         return jsonify(create_phase(post_data)), 200
@@ -78,12 +140,41 @@ def api_create_phase():
         return jsonify({"error": str(e)}), 400
 
 
+def phase_conflicts(phase, start):
+    """
+    Returns the scheduled phases of other companies overlapping a phase if it
+    took place at ``start``.
+
+    :param phase: phase as returned by ``get_phase``
+    :type phase: dict
+    :param start: date of the phase
+    :type start: `datetime.datetime`
+    :returns: list of conflicting phases
+    :rtype: list
+    """
+    minutes = (
+        phase.get("duration_minutes")
+        or current_app.config["PHASE_DEFAULT_DURATION_MINUTES"]
+    )
+    return get_phase_schedule().conflicts(
+        start,
+        start + timedelta(minutes=minutes),
+        phase.get("company_id"),
+        phase.get("venue"),
+    )
+
+
 @placement_api_v1.route("/phase/approve", methods=["PUT"])
 def api_approve_phase():
     """
     Approves the requested date for the phase of a placement.
     This function will send a JSON response to the browser containing
-    success = True and a 200 OK status code.
+    success = True, the phases of other companies overlapping it
+    (``conflicts``) and a 200 OK status code.
+
+    If there are conflicts and ``force`` is not true, the phase is not
+    approved and the response contains success = False, the conflicts and a
+    409 Conflict status code.
 
     In case of an Exception it sends a JSON response containing the errors &
     a 400 Bad Request status code.
@@ -96,9 +187,26 @@ def api_approve_phase():
             post_data = request.get_json()
             placement_id = expect(post_data["placement_id"], str, "placement id")
             phase_title = expect(post_data["phase_title"], str, "Phase title")
+            force = expect(post_data.get("force", False), bool, "force")
         except Exception as e:
             return jsonify({"error": str(e)}), 400
-        return jsonify(approve_phase(placement_id, phase_title)), 200
+        phase = get_phase(placement_id, phase_title)
+        if isinstance(phase, Exception):
+            raise phase
+        if phase is None:
+            raise ValueError("No such phase")
+        conflicts = phase_conflicts(phase, phase["requested_date"])
+        if conflicts and not force:
+            return jsonify({"success": False, "conflicts": conflicts}), 409
+        result = approve_phase(
+            placement_id,
+            phase_title,
+            current_app.config["PHASE_DEFAULT_DURATION_MINUTES"],
+        )
+        if isinstance(result, Exception):
+            raise result
+        response_cache.invalidate("phases")
+        return jsonify({**result, "conflicts": conflicts}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -108,7 +216,8 @@ def api_suggest_date_phase():
     """
     Suggests a date for a phase of the placement.
     This function will send a JSON response to the browser containing
-    success = True and a 200 OK status code.
+    success = True, the phases of other companies overlapping the suggested
+    date (``conflicts``) as a warning and a 200 OK status code.
 
     In case of an Exception it sends a JSON response containing the errors &
     a 400 Bad Request status code.
@@ -124,10 +233,14 @@ def api_suggest_date_phase():
             suggested_date = expect(post_data["suggested_date"], str, "Suggested date")
         except Exception as e:
             return jsonify({"error": str(e)}), 400
-        return (
-            jsonify(suggest_date_phase(placement_id, phase_title, suggested_date)),
-            200,
-        )
+        result = suggest_date_phase(placement_id, phase_title, suggested_date)
+        if isinstance(result, Exception):
+            raise result
+        phase = get_phase(placement_id, phase_title)
+        if isinstance(phase, Exception):
+            raise phase
+        conflicts = phase_conflicts(phase, phase["suggested_date"])
+        return jsonify({**result, "conflicts": conflicts}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -137,7 +250,8 @@ def api_get_unapproved_phases():
     """
     Returns a list of unapproved phases of all placements and a 200 OK status code.
     If a limit is passed in the request then list contains no more than ``limit``
-    number of unapproved phases.
+    number of unapproved phases, after skipping ``offset`` phases.
+    ``sort`` is "asc" (default) or "desc" order of the phase date.
 
     This function will send a JSON response to the browser containing
     list of unapproved phases and a 200 OK status code.
@@ -149,20 +263,21 @@ def api_get_unapproved_phases():
     :rtype: tuple
     """
     try:
-        limit = request.args.get("limit", None)
-        if limit:
-            return jsonify(get_unapproved_phases()[: int(limit)]), 200
-        return jsonify(get_unapproved_phases()), 200
+        return jsonify(get_unapproved_phases(**get_queue_args())), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
 @placement_api_v1.route("/phase/upcoming", methods=["GET"])
+@cached(60, "phases", unless=is_delta_request)
 def api_upcoming_phases():
     """
     Returns a list of upcoming phases of all placements and a 200 OK status code.
     If a limit is passed in the request then list contains no more than ``limit``
-    number of upcoming phases.
+    number of upcoming phases, after skipping ``offset`` phases.
+    ``sort`` is "asc" (default) or "desc" order of the phase date.
+    With ``?since=<watermark>`` only the phases changed after the watermark
+    are returned together with the next watermark.
 
     This function will send a JSON response to the browser containing
     list of upcoming phases and a 200 OK status code.
@@ -173,11 +288,10 @@ def api_upcoming_phases():
     :returns: tuple of dictionary and status code
     :rtype: tuple
     """
+    if is_delta_request():
+        return delta_response("phases", get_upcoming_phases_since)
     try:
-        limit = request.args.get("limit", None)
-        if limit:
-            return jsonify(get_upcoming_phases()[: int(limit)]), 200
-        return jsonify(get_upcoming_phases()), 200
+        return jsonify(get_upcoming_phases(**get_queue_args())), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -187,7 +301,8 @@ def api_get_upcoming_phases():
     """
     Returns a list of pending phases of all placements and a 200 OK status code.
     If a limit is passed in the request then list contains no more than ``limit``
-    number of pending phases.
+    number of pending phases, after skipping ``offset`` phases.
+    ``sort`` is "asc" (default) or "desc" order of the phase date.
 
     This function will send a JSON response to the browser containing
     list of pending phases and a 200 OK status code.
@@ -199,10 +314,73 @@ def api_get_upcoming_phases():
     :rtype: tuple
     """
     try:
-        limit = request.args.get("limit", None)
-        if limit:
-            return jsonify(get_pending_phases()[: int(limit)]), 200
-        return jsonify(get_pending_phases()), 200
+        return jsonify(get_pending_phases(**get_queue_args())), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+def read_date_window():
+    """
+    Reads the window of a calendar request: ``from`` (default today) and
+    ``to`` ("YYYY-mm-dd", ``to`` excluded) or the ``days`` (default 7)
+    following ``from``.
+
+    :returns: tuple of naive UTC start & end of the window
+    :rtype: tuple
+    :raises ValueError: if an argument is not valid
+    """
+    if "from" in request.args:
+        start = datetime.strptime(request.args["from"], "%Y-%m-%d")
+    else:
+        start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    if "to" in request.args:
+        end = datetime.strptime(request.args["to"], "%Y-%m-%d")
+    else:
+        end = start + timedelta(days=int(request.args.get("days", 7)))
+    return start, end
+
+
+@placement_api_v1.route("/phase/calendar", methods=["GET"])
+def api_get_phase_calendar():
+    """
+    Returns the scheduled phases of all placements between ``from`` (default
+    today) and ``to`` ("YYYY-mm-dd", ``to`` excluded) or in the ``days``
+    (default 7) following ``from``, and a 200 OK status code.
+
+    In case of an Exception it sends a JSON response containing the errors &
+    a 400 Bad Request status code.
+
+    :returns: tuple of list of phases and status code
+    :rtype: tuple
+    """
+    try:
+        start, end = read_date_window()
+        phases = get_phases_between(start, end)
+        if isinstance(phases, Exception):
+            raise phases
+        return jsonify(phases), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@placement_api_v1.route("/phase/free_slots", methods=["GET"])
+def api_get_free_slots():
+    """
+    Returns the days ("YYYY-mm-dd") between ``from`` (default today) and
+    ``to`` (excluded) or in the ``days`` (default 7) following ``from`` on
+    which no phase is scheduled, and a 200 OK status code.
+
+    In case of an Exception it sends a JSON response containing the errors &
+    a 400 Bad Request status code.
+
+    :returns: tuple of list of days and status code
+    :rtype: tuple
+    """
+    try:
+        start, end = read_date_window()
+        if (end - start).days > 366:
+            raise ValueError("The window cannot be longer than a year")
+        return jsonify(get_phase_schedule().free_days(start, end)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -223,3 +401,401 @@ def api_get_phase_result():
         return jsonify(get_phase_result(company_id, phase_title)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
+
+
+def read_result_rows():
+    """
+    Reads the placement_id, phase_title & result rows of a phase result
+    upload. The upload is either JSON containing ``placement_id``,
+    ``phase_title`` & ``results`` or CSV (``text/csv`` body or ``file``
+    field) with ``placement_id`` & ``phase_title`` in the query string.
+    Every row has a ``student_id`` or ``roll_number`` and a ``status``.
+
+    :returns: tuple of placement_id, phase_title & list of rows
+    :rtype: tuple
+    """
+    if request.is_json:
+        post_data = request.get_json()
+        placement_id = expect(post_data["placement_id"], str, "placement id")
+        phase_title = expect(post_data["phase_title"], str, "phase title")
+        return placement_id, phase_title, expect(post_data["results"], list, "results")
+    placement_id = expect(request.args["placement_id"], str, "placement id")
+    phase_title = expect(request.args["phase_title"], str, "phase title")
+    if "file" in request.files:
+        text = request.files["file"].read().decode("utf-8-sig")
+    else:
+        text = request.get_data(as_text=True)
+    return placement_id, phase_title, list(csv.DictReader(io.StringIO(text)))
+
+
+@placement_api_v1.route("/phase/result", methods=["POST"])
+def api_save_phase_results():
+    """
+    Saves the results of all students of a phase at once, see
+    `read_result_rows`. Roll numbers and ids are resolved with one query, a
+    student with many rows gets the status of the last one.
+    This function will send a JSON response to the browser containing the
+    count of saved results & the rows which were not saved.
+
+    :returns: tuple of dictionary and status code
+    :rtype: tuple
+    """
+    try:
+        placement_id, phase_title, rows = read_result_rows()
+        statuses, ids, roll_numbers, invalid = {}, [], [], []
+        for row in rows:
+            status = str(row.get("status") or "").strip().lower()
+            key = str(row.get("student_id") or row.get("roll_number") or "").strip()
+            if status not in PHASE_RESULT_STATUSES or not key:
+                invalid.append(row)
+                continue
+            if row.get("student_id"):
+                if not ObjectId.is_valid(key):
+                    invalid.append(row)
+                    continue
+                ids.append(ObjectId(key))
+            else:
+                roll_numbers.append(key)
+            statuses[key] = status
+        students = get_students_by_ids_or_roll_numbers(ids, roll_numbers)
+        if isinstance(students, Exception):
+            raise students
+        results = {}
+        for student in students:
+            for key in (str(student["_id"]), str(student.get("roll_number"))):
+                if key in statuses:
+                    results[student["_id"]] = statuses.pop(key)
+        if not results:
+            raise ValueError("No known students in the results")
+        saved = save_phase_results(
+            placement_id,
+            phase_title,
+            [{"student_id": id, "status": status} for id, status in results.items()],
+        )
+        if isinstance(saved, Exception):
+            raise saved
+        return jsonify({**saved, "invalid": invalid, "unknown": list(statuses)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+def get_scheduled_phase(placement_id, phase_title):
+    """
+    Returns a scheduled phase with its window, see ``get_phase``.
+
+    :returns: tuple of phase, start & end of the phase
+    :rtype: tuple
+    :raises ValueError: if there is no such scheduled phase
+    """
+    phase = get_phase(placement_id, phase_title)
+    if isinstance(phase, Exception):
+        raise phase
+    if phase is None or phase.get("scheduled_date") is None:
+        raise ValueError("No such scheduled phase")
+    start = phase["scheduled_date"]
+    end = phase.get("ends_at") or start + timedelta(
+        minutes=current_app.config["PHASE_DEFAULT_DURATION_MINUTES"]
+    )
+    return phase, start, end
+
+
+@placement_api_v1.route("/phase/slots", methods=["POST"])
+def api_allocate_interview_slots():
+    """
+    Allocates the students who passed the previous phase (or registered, for
+    the first phase) to ``panels`` interview panels in slots of
+    ``slot_minutes`` between the scheduled_date & ends_at of the phase,
+    replacing its earlier allocation. A student is never given a slot
+    overlapping their interview in another phase.
+
+    If another allocation of a phase on the same days is running, it sends a
+    409 Conflict status code.
+    This function will send a JSON response to the browser containing the
+    count of allocated students, the number of slots and the ids of the
+    students who did not get a slot, and a 200 OK status code.
+
+    In case of an Exception it sends a JSON response containing the errors &
+    a 400 Bad Request status code.
+
+    :returns: tuple of dictionary and status code
+    :rtype: tuple
+    """
+    try:
+        try:
+            post_data = request.get_json()
+            placement_id = expect(post_data["placement_id"], str, "placement id")
+            phase_title = expect(post_data["phase_title"], str, "Phase title")
+            panels = expect(post_data["panels"], int, "panels")
+            slot_minutes = expect(post_data["slot_minutes"], int, "slot minutes")
+            if panels < 1 or slot_minutes < 1:
+                raise ValueError("panels and slot_minutes must be positive")
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
+        phase, start, end = get_scheduled_phase(placement_id, phase_title)
+        slot_length = timedelta(minutes=slot_minutes)
+        slot_count = (end - start) // slot_length
+        if slot_count < 1:
+            raise ValueError("The phase is shorter than a slot")
+        students = get_phase_candidates(placement_id, phase_title)
+        if isinstance(students, Exception):
+            raise students
+        # phases on the same days are allocated one after the other, so the
+        # busy intervals read below are still current when the slots are saved
+        days = [
+            (start + timedelta(days=i)).strftime("%Y-%m-%d")
+            for i in range((end.date() - start.date()).days + 1)
+        ]
+        owner = ObjectId()
+        locked = lock_slot_days(
+            days, owner, current_app.config["SLOT_ALLOCATION_LOCK_SECONDS"]
+        )
+        if isinstance(locked, Exception):
+            raise locked
+        if not locked:
+            return (
+                jsonify({"error": "Another allocation of these days is running"}),
+                409,
+            )
+        try:
+            intervals = get_busy_intervals(students, start, end, phase["_id"])
+            if isinstance(intervals, Exception):
+                raise intervals
+            busy = {
+                student: busy_slots(times, start, slot_length, slot_count)
+                for student, times in intervals.items()
+            }
+            allocation, unallocated = allocate_slots(
+                students, slot_count, panels, busy
+            )
+            saved = save_interview_slots(
+                phase,
+                [
+                    {
+                        "student_id": student,
+                        "panel": panel + 1,
+                        "starts_at": start + slot * slot_length,
+                        "ends_at": start + (slot + 1) * slot_length,
+                    }
+                    for student, slot, panel in allocation
+                ],
+            )
+            if isinstance(saved, Exception):
+                raise saved
+        finally:
+            unlock_slot_days(days, owner)
+        return (
+            jsonify(
+                {
+                    "success": True,
+                    "allocated": saved["count"],
+                    "slots": slot_count,
+                    "unallocated": [str(id) for id in unallocated],
+                }
+            ),
+            200,
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@placement_api_v1.route("/phase/slots", methods=["GET"])
+def api_get_interview_slots():
+    """
+    Returns the interview slots of the phase ``phase_title`` of the placement
+    ``placement_id`` sorted by starts_at & panel, and a 200 OK status code.
+
+    In case of an Exception it sends a JSON response containing the errors &
+    a 400 Bad Request status code.
+
+    :returns: tuple of list of slots and status code
+    :rtype: tuple
+    """
+    try:
+        phase, _, _ = get_scheduled_phase(
+            request.args["placement_id"], request.args["phase_title"]
+        )
+        slots = get_interview_slots(phase)
+        if isinstance(slots, Exception):
+            raise slots
+        return jsonify(slots), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@placement_api_v1.route("/registered_students", methods=["GET"])
+def api_get_all_registered_students():
+    """
+    This function will send a streamed JSON response to the browser containing
+    registered students of every placement & a 200 OK status code.
+
+    In case of an Exception it sends a JSON response containing the errors &
+    a 400 Bad Request status code.
+    """
+    try:
+        cursor = get_all_registered_students_cursor(
+            current_app.config["STREAM_BATCH_SIZE"]
+        )
+        if isinstance(cursor, Exception):
+            raise cursor
+        return stream_json(cursor)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@placement_api_v1.route("/<placement_id>/register", methods=["PUT", "DELETE"])
+def api_register_student(placement_id):
+    """
+    Registers (PUT) or unregisters (DELETE) the student ``student_id`` of the
+    request for a placement. Repeating a request has no further effect. A PUT
+    may give the ``preference`` of the student for the placement (1 for the
+    most preferred), used by the offer allocation.
+
+    :param placement_id: id of the placement
+    :type placement_id: str
+    :returns: tuple of dictionary and status code
+    :rtype: tuple
+    """
+    try:
+        post_data = request.get_json()
+        student_id = expect(post_data["student_id"], str, "student id")
+        if request.method == "PUT":
+            preference = post_data.get("preference")
+            if preference is not None:
+                expect(preference, int, "preference")
+            result = register_student(placement_id, student_id, preference)
+        else:
+            result = unregister_student(placement_id, student_id)
+        if isinstance(result, Exception):
+            raise result
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@placement_api_v1.route("/<placement_id>/registrations", methods=["GET"])
+def api_get_registrants(placement_id):
+    """
+    Get the students registered for a placement, paginated with
+    ``?limit=&after=``.
+
+    :param placement_id: id of the placement
+    :type placement_id: str
+    :returns: dict containing a page of students and next_cursor
+    :rtype: dict
+    """
+    return paginated(
+        lambda limit, after: get_registrants(placement_id, limit=limit, after=after),
+        keep=lambda student: not student.get("deleted"),
+    )
+
+
+@placement_api_v1.route("/<placement_id>/shortlist", methods=["GET"])
+def api_get_shortlist(placement_id):
+    """
+    This function will send a JSON response to the browser containing
+    ids of the students eligible for a placement & a 200 OK status code.
+
+    In case of an Exception it sends a JSON response containing the errors &
+    a 400 Bad Request status code.
+
+    :param placement_id: id of the placement
+    :type placement_id: str
+    :returns: tuple of dictionary and status code
+    :rtype: tuple
+    """
+    try:
+        placement = get_placement_eligibility(placement_id)
+        if isinstance(placement, Exception):
+            raise placement
+        if placement is None:
+            raise ValueError("No such placement with that id")
+        students = get_student_columns().shortlist(placement.get("eligibility"))
+        return (
+            jsonify(
+                {
+                    "placement_id": placement_id,
+                    "count": len(students),
+                    "students": students,
+                }
+            ),
+            200,
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@placement_api_v1.route("/shortlist", methods=["GET"])
+def api_get_all_shortlists():
+    """
+    This function will send a JSON response to the browser containing
+    ids of the eligible students of every placement of a ``year``
+    (default current year) & a 200 OK status code.
+
+    In case of an Exception it sends a JSON response containing the errors &
+    a 400 Bad Request status code.
+
+    :returns: tuple of dictionary and status code
+    :rtype: tuple
+    """
+    try:
+        year = int(request.args.get("year", datetime.now().year))
+        placements = get_placements_eligibility(year)
+        if isinstance(placements, Exception):
+            raise placements
+        return jsonify(get_student_columns().shortlist_all(placements)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@placement_api_v1.route("/offers", methods=["POST"])
+def api_allocate_offers():
+    """
+    Allocates the offers of all placements of a ``year`` (default current
+    year) under the offer policy, see ``app.offers``, and replaces the
+    offers of the changed placements unless ``dry_run`` is true.
+    This function will send a JSON response to the browser containing the
+    added & removed students of every changed placement, the count of
+    modified placements, the ids of the placements skipped because their
+    positions is not a number and a 200 OK status code.
+
+    In case of an Exception it sends a JSON response containing the errors &
+    a 400 Bad Request status code.
+
+    :returns: tuple of dictionary and status code
+    :rtype: tuple
+    """
+    try:
+        try:
+            post_data = request.get_json() or {}
+            year = expect(post_data.get("year", datetime.now().year), int, "year")
+            dry_run = expect(post_data.get("dry_run", False), bool, "dry_run")
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
+        data = get_offer_candidates(year)
+        if isinstance(data, Exception):
+            raise data
+        columns = get_student_columns()
+        sgpa = dict(zip(columns.ids.tolist(), columns.sgpa.tolist()))
+        allocation, skipped = allocate_offers(
+            data["placements"], data["candidates"], sgpa
+        )
+        changes = offer_changes(data["placements"], allocation)
+        modified = 0
+        if not dry_run:
+            saved = save_offer_allocation({id: allocation[id] for id in changes})
+            if isinstance(saved, Exception):
+                raise saved
+            modified = saved["modified"]
+        return (
+            jsonify(
+                {
+                    "dry_run": dry_run,
+                    "changes": {str(id): change for id, change in changes.items()},
+                    "modified": modified,
+                    "invalid_positions": [str(id) for id in skipped],
+                }
+            ),
+            200,
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
@@ -1,13 +1,21 @@
 """
 This module contains all API for the posts.
 """
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
 import datetime
 
 from app.dao.usersDAO import get_comapany_id_by_name
+from ..streaming import stream_json
+from ..rawjson import raw_json_response
+from ..cache import cached, response_cache
+from ..conditional import conditional, version_validators
+from ..sync import delta_response, is_delta_request
 from app.dao.postsDAO import (
+    TOMBSTONE_TTL_SECONDS,
     add_post,
-    get_all_posts,
+    get_all_posts_cursor,
+    get_posts_version,
+    get_posts_since,
     get_post_by_id,
     update_post,
     delete_post,
@@ -15,6 +23,8 @@ from app.dao.postsDAO import (
     delete_post_by_company_id,
     add_notice,
     get_all_notices,
+    get_notices_version,
+    get_notices_since,
     delete_notice,
     delete_all_notices,
     update_notice,
@@ -25,14 +35,33 @@ notice_api_v1 = Blueprint("notice_api_v1", "notice_api_v1", url_prefix="/api/v1/
 
 
 @post_api_v1.route("/")
+@conditional(
+    lambda: version_validators("posts", get_posts_version()), unless=is_delta_request
+)
+@cached(60, "posts", unless=is_delta_request)
 def api_get_all_posts():
     """
-    Get details of posts.
+    Get details of posts as a streamed JSON list.
+
+    With ``?since=<watermark>`` (``0`` on the first sync) only the posts
+    changed after the watermark are returned, together with the ids of the
+    deleted posts and the next watermark.
 
     :returns: list of posts with details
     :rtype: list
     """
-    return jsonify(get_all_posts())
+    if is_delta_request():
+        return delta_response("posts", get_posts_since, TOMBSTONE_TTL_SECONDS)
+    try:
+        cursor = get_all_posts_cursor(
+            current_app.config["STREAM_BATCH_SIZE"],
+            raw=current_app.config["RAW_BSON_READS"],
+        )
+        if isinstance(cursor, Exception):
+            raise cursor
+        return stream_json(cursor)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
 
 
 @post_api_v1.route("/company")
@@ -75,10 +104,12 @@ def api_add_post():
     :returns: successfully added or Error in adding
     """
     post_details = request.json
-    post_details["updated_at"] = datetime.datetime.now()
-    post_details["posted_date"] = datetime.datetime.now()
+    post_details["updated_at"] = datetime.datetime.utcnow()
+    post_details["posted_date"] = datetime.datetime.utcnow()
     if request.method == "POST":
-        if add_post(post_details):
+        result = add_post(post_details)
+        response_cache.invalidate("posts")
+        if result:
             return "successfully added"
         else:
             return "Error in adding"
@@ -95,7 +126,9 @@ def api_delete_post():
     """
     post_details = request.json
     if request.method == "DELETE":
-        if delete_post(post_details["post_id"]):
+        result = delete_post(post_details["post_id"])
+        response_cache.invalidate("posts")
+        if result:
             return "Deleted successfully"
         else:
             return "Error in deleting"
@@ -110,7 +143,9 @@ def api_delete_all_posts():
     :returns: Deleted successfully or Error in deleting
     """
     if request.method == "DELETE":
-        if delete_all_posts():
+        result = delete_all_posts()
+        response_cache.invalidate("posts")
+        if result:
             return "Deleted successfully"
         else:
             return "Error in deleting"
@@ -130,7 +165,9 @@ def api_delete_post_company():
     company_id = get_comapany_id_by_name(company_name)  # it returns {"_id":"5ea...."}
     print(company_id)
     if request.method == "DELETE":
-        if delete_post_by_company_id(company_id["_id"]):
+        result = delete_post_by_company_id(company_id["_id"])
+        response_cache.invalidate("posts")
+        if result:
             return "Deleted successfully"
         else:
             return "Error in deleting"
@@ -146,9 +183,11 @@ def api_update_post():
     :returns: updated successfully or Error in updating
     """
     post_details = request.json
-    post_details["updated_at"] = datetime.datetime.now()
+    post_details["updated_at"] = datetime.datetime.utcnow()
     if request.method == "PUT":
-        if update_post(post_details):
+        result = update_post(post_details)
+        response_cache.invalidate("posts")
+        if result:
             return "updated successfully"
         else:
             return "Error in updating"
@@ -159,13 +198,26 @@ def api_update_post():
 
 
 @notice_api_v1.route("/")
+@conditional(
+    lambda: version_validators("notices", get_notices_version()),
+    unless=is_delta_request,
+)
+@cached(60, "notices", unless=is_delta_request)
 def api_get_all_notices():
     """
     Get details of notices.
 
+    With ``?since=<watermark>`` (``0`` on the first sync) only the notices
+    changed after the watermark are returned, together with the ids of the
+    deleted notices and the next watermark.
+
     :returns: list of notices with details
     :rtype: list
     """
+    if is_delta_request():
+        return delta_response("notices", get_notices_since, TOMBSTONE_TTL_SECONDS)
+    if current_app.config["RAW_BSON_READS"]:
+        return raw_json_response(get_all_notices(raw=True))
     return jsonify(get_all_notices())
 
 
@@ -178,10 +230,12 @@ def api_add_notice():
     :returns: successfully added or Error in adding
     """
     notice_details = request.json
-    notice_details["updated_at"] = datetime.datetime.now()
-    notice_details["posted_date"] = datetime.datetime.now()
+    notice_details["updated_at"] = datetime.datetime.utcnow()
+    notice_details["posted_date"] = datetime.datetime.utcnow()
     if request.method == "POST":
-        if add_notice(notice_details):
+        result = add_notice(notice_details)
+        response_cache.invalidate("notices")
+        if result:
             return "added successfully"
         else:
             return "Error in adding"
@@ -198,7 +252,9 @@ def api_delete_notice():
     """
     notice_details = request.json
     if request.method == "DELETE":
-        if delete_notice(notice_details["notice_id"]):
+        result = delete_notice(notice_details["notice_id"])
+        response_cache.invalidate("notices")
+        if result:
             return "Deleted successfully"
         else:
             return "Error in deleting"
@@ -213,7 +269,9 @@ def api_delete_all_notices():
     :returns: Deleted successfully or Error in deleting
     """
     if request.method == "DELETE":
-        if delete_all_notices():
+        result = delete_all_notices()
+        response_cache.invalidate("notices")
+        if result:
             return "Deleted successfully"
         else:
             return "Error in deleting"
@@ -229,9 +287,11 @@ def api_update_notice():
     :returns: updated successfully or Error in updating
     """
     notice_details = request.json
-    notice_details["updated_at"] = datetime.datetime.now()
+    notice_details["updated_at"] = datetime.datetime.utcnow()
     if request.method == "PUT":
-        if update_notice(notice_details):
+        result = update_notice(notice_details)
+        response_cache.invalidate("notices")
+        if result:
             return "updated successfully"
         else:
             return "Error in updating"
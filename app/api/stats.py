@@ -0,0 +1,43 @@
+"""
+This module contains API for runtime statistics of the application.
+"""
+from flask import Blueprint, jsonify
+
+from app.db import get_pool_stats
+from app.cache import response_cache
+from app.passwords import get_password_pool_stats
+
+stats_api_v1 = Blueprint("stats_api_v1", "stats_api_v1", url_prefix="/api/v1/stats")
+
+
+@stats_api_v1.route("/db_pool")
+def api_get_pool_stats():
+    """
+    Get connection pool statistics of the MongoDB client of this worker process.
+
+    :returns: dict containing pool options and counters
+    :rtype: dict
+    """
+    return jsonify(get_pool_stats()), 200
+
+
+@stats_api_v1.route("/response_cache")
+def api_get_response_cache_stats():
+    """
+    Get hit & miss counters of the response cache of this worker process.
+
+    :returns: dict containing cache size and counters
+    :rtype: dict
+    """
+    return jsonify(response_cache.stats()), 200
+
+
+@stats_api_v1.route("/password_pool")
+def api_get_password_pool_stats():
+    """
+    Get options & counters of the password hashing pool of this worker process.
+
+    :returns: dict containing pool options and counters
+    :rtype: dict
+    """
+    return jsonify(get_password_pool_stats()), 200
@@ -14,14 +14,18 @@ from werkzeug.local import LocalProxy
 
 from app.dao.usersDAO import (
     get_all_users,
+    get_all_users_cursor,
     get_user_by_id,
+    get_user_version,
     get_all_students,
     get_all_companies,
     approve_user,
     reject_user,
+    bulk_set_approval,
     create_profile,
     update_profile,
     create_user,
+    update_password_hash,
     get_user_by_email,
     get_approved_companies,
     get_unapproved_companies,
@@ -29,17 +33,17 @@ from app.dao.usersDAO import (
     get_unapproved_students,
     get_eligible_companies,
     get_not_eligible_companies,
+    get_eligibility,
     current_placement_details,
 )
+from app.dao.placementsDAO import get_student_registrations
 
-from ..helpers import expect
-
-
-def get_bcrypt():
-    bcrypt = getattr(g, "_bcrypt", None)
-    if bcrypt is None:
-        bcrypt = g._bcrypt = current_app.config["BCRYPT"]
-    return bcrypt
+from ..helpers import expect, paginated
+from ..streaming import stream_json
+from ..rawjson import raw_json_response
+from ..cache import cached, response_cache
+from ..conditional import conditional, version_validators
+from ..passwords import PasswordPoolBusy, hash_password, check_password
 
 
 def get_jwt():
@@ -50,11 +54,20 @@ def get_jwt():
 
 
 jwt = LocalProxy(get_jwt)
-bcrypt = LocalProxy(get_bcrypt)
 
 user_api_v1 = Blueprint("user_api_v1", "user_api_v1", url_prefix="/api/v1/user")
 
 
+@user_api_v1.errorhandler(PasswordPoolBusy)
+def password_pool_busy(e):
+    """
+    Sheds logins & registrations with 503 while the password pool is full.
+    """
+    response = jsonify({"error": str(e)})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
 class UserObject(object):
     def __init__(self, id, role, is_approved, name, email):
         self.id = id
@@ -70,15 +83,33 @@ class UserObject(object):
 @user_api_v1.route("/")
 def api_get_all_users():
     """
-    Get all users details.
+    Get all users details, paginated with ``?limit=&after=``.
+
+    :returns: dict containing a page of users with details and next_cursor
+    :rtype: dict
+    """
+    return paginated(get_all_users)
+
+
+@user_api_v1.route("/export")
+def api_export_all_users():
+    """
+    Get all users details as a streamed JSON list.
 
     :returns: list of users with details
     :rtype: list
     """
-    return jsonify(get_all_users())
+    try:
+        cursor = get_all_users_cursor(current_app.config["STREAM_BATCH_SIZE"])
+        if isinstance(cursor, Exception):
+            raise cursor
+        return stream_json(cursor)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
 
 
 @user_api_v1.route("/<id>")
+@conditional(lambda id: version_validators(f"user-{id}", get_user_version(id)))
 def api_get_user_by_id(id):
     """
     Get a particular user details by his id.
@@ -88,36 +119,40 @@ def api_get_user_by_id(id):
     :returns: a dict containing user details
     :rtype: dict
     """
+    if current_app.config["RAW_BSON_READS"]:
+        return raw_json_response(get_user_by_id(id, raw=True))
     return jsonify(get_user_by_id(id))
 
 
 @user_api_v1.route("/student")
 def api_get_all_students():
     """
-    Get all student details.
+    Get all student details, paginated with ``?limit=&after=``.
 
-    :returns: list of students with details
-    :rtype: list
+    :returns: dict containing a page of students with details and next_cursor
+    :rtype: dict
     """
-    return jsonify(get_all_students())
+    return paginated(get_all_students)
 
 
 @user_api_v1.route("/company")
 def api_get_all_companies():
     """
-    Get all student details.
+    Get all company details, paginated with ``?limit=&after=``.
 
-    :returns: a list of companies with details.
-    :rtype: list
+    :returns: dict containing a page of companies with details and next_cursor
+    :rtype: dict
     """
-    return jsonify(get_all_companies())
+    return paginated(get_all_companies)
 
 
 @user_api_v1.route("/<id>/approve", methods=["PUT"])
 def api_approve_user(id):
     try:
-        result = approve_user(id)
-        update_user = get_user_by_id(id)
+        update_user = approve_user(id)
+        if isinstance(update_user, Exception):
+            raise update_user
+        response_cache.invalidate("companies")
         return jsonify({"user": update_user}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
@@ -126,19 +161,53 @@ def api_approve_user(id):
 @user_api_v1.route("/<id>/reject", methods=["PUT"])
 def api_reject_user(id):
     try:
-        result = reject_user(id, request.form["reason"])
-        update_user = get_user_by_id(id)
+        update_user = reject_user(id, request.form["reason"])
+        if isinstance(update_user, Exception):
+            raise update_user
         return jsonify({"user": update_user}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
+@user_api_v1.route("/approve/bulk", methods=["POST"])
+def api_bulk_approve_users():
+    """
+    Approves or rejects a list of users at once.
+    The request contains ``ids``, ``action`` ("approve" or "reject") and the
+    ``reason`` of a rejection.
+
+    :returns: dict of outcome per id and count per outcome
+    :rtype: dict
+    """
+    try:
+        post_data = request.get_json()
+        ids = expect(post_data["ids"], list, "ids")
+        action = expect(post_data.get("action", "approve"), str, "action")
+        if action not in ("approve", "reject"):
+            raise ValueError("action must be approve or reject")
+        reason = post_data.get("reason", "") if action == "reject" else None
+        outcomes = bulk_set_approval(ids, action == "approve", reason)
+        if isinstance(outcomes, Exception):
+            raise outcomes
+        if action == "approve":
+            response_cache.invalidate("companies")
+        counts = {}
+        for outcome in outcomes.values():
+            counts[outcome] = counts.get(outcome, 0) + 1
+        return jsonify({"results": outcomes, "counts": counts}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
 @user_api_v1.route("<id>/create_profile", methods=["PUT"])
 def api_create_profile(id):
     """
     """
     try:
         result = create_profile(id, request.get_json())
+        if isinstance(result, Exception):
+            raise result
+        response_cache.invalidate("companies", "phases")
         return jsonify({"user_id": id}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
@@ -150,6 +219,9 @@ def api_update_profile(id):
     """
     try:
         result = update_profile(id, request.get_json())
+        if isinstance(result, Exception):
+            raise result
+        response_cache.invalidate("companies", "phases")
         return jsonify({"user_id": id}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
@@ -173,10 +245,6 @@ def company_register():
         return jsonify({"error": str(e)})
 
     errors = {}
-    user = get_user_by_email(email)
-    if user:
-        errors["email"] = "A user with the given email already exists."
-
     # add validation
     if len(password) < 8:
         errors["password"] = "Your password must be at least 8 characters."
@@ -190,9 +258,7 @@ def company_register():
         "role": "company",
         "website": website,
         "address": address,
-        "password": bcrypt.generate_password_hash(
-            password=password.encode("utf8")
-        ).decode("utf-8"),
+        "password": hash_password(password),
         "concerned_person": {
             "name": name,
             "position": position,
@@ -202,31 +268,26 @@ def company_register():
         "profile_completed": True,
     }
 
+    # the unique login_email index rejects a second user with the email
     result = create_user(userdata)
+    if isinstance(result, Exception):
+        errors["general"] = "Internal error, please try again later."
+        return make_response(jsonify({"error": errors})), 400
     if "error" in result:
         errors["email"] = result["error"]
-        return jsonify(errors), 400
-
-    userdata = get_user_by_id(result["_id"])
-
-    if not userdata:
-        errors["general"] = "Internal error, please try again later."
+        response_object = {"status": "fail", "error": errors}
+        return jsonify(response_object), 411
 
-    if len(errors.keys()) != 0:
-        response_object = {"error": errors}
-        return make_response(jsonify(response_object)), 400
-    else:
-        userdata = {
-            "id": str(userdata["_id"]),
-            "email": userdata["concerned_person"]["email"],
-            "name": userdata["company_name"],
-            "role": userdata["role"],
-            "is_approved": True if "approved_date" in userdata else False,
-        }
-        user = UserObject(**userdata)
-        jwt = create_access_token(user.to_json())
-        ret = {"access_token": jwt}
-        return jsonify(ret), 200
+    user = UserObject(
+        id=str(result["_id"]),
+        email=email,
+        name=company_name,
+        role="company",
+        is_approved=False,
+    )
+    jwt = create_access_token(user.to_json())
+    ret = {"access_token": jwt}
+    return jsonify(ret), 200
 
 
 @user_api_v1.route("/login", methods=["POST"])
@@ -243,11 +304,16 @@ def login():
     user = get_user_by_email(email)
     if not user:
         errors["email"] = "No user with the given email already exists."
+        return jsonify({"error": errors})
     # add validation
-    if not bcrypt.check_password_hash(user["password"], password):
+    valid, new_hash = check_password(user["password"], password)
+    if not valid:
         errors["password"] = "Invalid password!"
     if len(errors) != 0:
         return jsonify({"error": errors})
+    if new_hash is not None:
+        # the cost factor changed since the password was hashed
+        update_password_hash(user["_id"], user["password"], new_hash)
     print(user)
     if user["role"] == "company":
         userdata = {
@@ -272,29 +338,24 @@ def login():
 
 
 @user_api_v1.route("/company/approved")
+@cached(300, "companies")
 def api_get_approved_companies():
-    return jsonify(get_approved_companies())
+    return paginated(get_approved_companies)
 
 
 @user_api_v1.route("/company/unapproved")
 def api_get_unapproved_companies():
-    limit = request.args.get("limit", None)
-    if limit:
-        return jsonify(get_unapproved_companies()[: int(limit)])
-    return jsonify(get_unapproved_companies())
+    return paginated(get_unapproved_companies)
 
 
 @user_api_v1.route("/student/approved")
 def api_get_approved_students():
-    return jsonify(get_approved_students())
+    return paginated(get_approved_students)
 
 
 @user_api_v1.route("/student/unapproved")
 def api_get_unapproved_students():
-    limit = request.args.get("limit", None)
-    if limit:
-        return jsonify(get_unapproved_students()[: int(limit)])
-    return jsonify(get_unapproved_students())
+    return paginated(get_unapproved_students)
 
 
 @user_api_v1.route("/student/<id>/eligible_companies")
@@ -313,6 +374,42 @@ def api_get_not_eligible_companies(id):
         return jsonify({"error": str(e)}), 400
 
 
+@user_api_v1.route("/student/<id>/eligibility")
+def api_get_eligibility(id):
+    """
+    Get eligible and not eligible companies of a student in one request.
+    Every not eligible company contains the failed criteria in ``reasons``.
+
+    :param id: Id of the student
+    :type id: str
+    :returns: dict containing eligible_companies & not_eligible_companies
+    :rtype: dict
+    """
+    try:
+        return jsonify(get_eligibility(id)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@user_api_v1.route("/student/<id>/registrations")
+def api_get_student_registrations(id):
+    """
+    Get the placements a student registered for.
+
+    :param id: Id of the student
+    :type id: str
+    :returns: list of placements with company_id, domain, year & registered_at
+    :rtype: list
+    """
+    try:
+        registrations = get_student_registrations(id)
+        if isinstance(registrations, Exception):
+            raise registrations
+        return jsonify(registrations), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
 @user_api_v1.route("/company/<id>/current_placement_details")
 def api_current_placement_details(id):
     try:
@@ -331,10 +428,6 @@ def student_register():
         return jsonify({"error": str(e)})
 
     errors = {}
-    user = get_user_by_email(email)
-    if user:
-        errors["email"] = "A user with the given email already exists."
-
     # add validation
     if len(password) < 8:
         errors["password"] = "Your password must be at least 8 characters."
@@ -345,38 +438,27 @@ def student_register():
 
     userdata = {
         "role": "student",
-        "password": bcrypt.generate_password_hash(
-            password=password.encode("utf8")
-        ).decode("utf-8"),
+        "password": hash_password(password),
         "email": email,
         "profile_completed": False,
     }
 
+    # the unique login_email index rejects a second user with the email
     result = create_user(userdata)
+    if isinstance(result, Exception):
+        errors["general"] = "Internal error, please try again later."
+        return make_response(jsonify({"error": errors})), 400
     if "error" in result:
         errors["email"] = result["error"]
-        return jsonify(errors), 400
-
-    userdata = get_user_by_id(result["_id"])
-
-    if not userdata:
-        errors["general"] = "Internal error, please try again later."
+        response_object = {"status": "fail", "error": errors}
+        return jsonify(response_object), 411
 
-    if len(errors.keys()) != 0:
-        response_object = {"error": errors}
-        return make_response(jsonify(response_object)), 400
-    else:
-        userdata = {
-            "id": str(userdata["_id"]),
-            "email": userdata["email"],
-            "role": userdata["role"],
-            "name": userdata.get("full_name", ""),
-            "is_approved": True if "approved_date" in userdata else False,
-        }
-        user = UserObject(**userdata)
-        jwt = create_access_token(user.to_json())
-        ret = {"access_token": jwt}
-        return jsonify(ret), 200
+    user = UserObject(
+        id=str(result["_id"]), email=email, name="", role="student", is_approved=False
+    )
+    jwt = create_access_token(user.to_json())
+    ret = {"access_token": jwt}
+    return jsonify(ret), 200
 
 
 @user_api_v1.route("/student/qrcode", methods=["POST", "GET"])
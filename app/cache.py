@@ -0,0 +1,188 @@
+"""
+This module contains an in-process cache of GET responses for read-heavy
+endpoints.
+
+Views opt in with the `cached` decorator, giving a TTL and the tags of the
+data they read. Writes call `response_cache.invalidate` with the tags they
+change. Entries are evicted in LRU order once ``RESPONSE_CACHE_MAX_ENTRIES``
+is reached.
+
+The cache lives in each worker process, so a write only invalidates the
+entries of the process which served it; other workers serve their copy until
+its TTL expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, request
+
+
+class ResponseCache(object):
+    """
+    Bounded LRU cache of response bodies with per-entry expiry and tags.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+        self.invalidations = 0
+        # bumped by every invalidation, so that a response computed before
+        # an invalidation is not stored after it
+        self.generation = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, max_entries, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        """
+        Removes every entry having one of ``tags``.
+
+        :param tags: tags of the changed data
+        :type tags: str
+        """
+        tags = set(tags)
+        with self._lock:
+            self.generation += 1
+            for key in [k for k, e in self._entries.items() if e["tags"] & tags]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def count(self, counter, endpoint):
+        with self._lock:
+            counter[endpoint] = counter.get(endpoint, 0) + 1
+
+    def stats(self):
+        """
+        Returns hit & miss counters per endpoint and cache size.
+
+        :returns: dictionary of cache statistics
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": sum(self.hits.values()),
+                "misses": sum(self.misses.values()),
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "endpoints": {
+                    endpoint: {
+                        "hits": self.hits.get(endpoint, 0),
+                        "misses": self.misses.get(endpoint, 0),
+                    }
+                    for endpoint in set(self.hits) | set(self.misses)
+                },
+            }
+
+
+response_cache = ResponseCache()
+
+
+def _tee(chunks, on_complete, max_bytes):
+    """
+    Yields ``chunks`` of a streamed body and passes the whole body to
+    ``on_complete`` once it is sent, unless it is larger than ``max_bytes``.
+    """
+    body = []
+    size = 0
+    for chunk in chunks:
+        yield chunk
+        if body is not None:
+            data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            size += len(data)
+            if size > max_bytes:
+                body = None
+            else:
+                body.append(data)
+    if body is not None:
+        on_complete(b"".join(body))
+
+
+def cached(ttl, *tags, unless=None):
+    """
+    Caches the 200 OK responses of a GET view for ``ttl`` seconds, keyed by
+    path & query string. Streamed responses are stored once fully sent.
+
+    :param ttl: seconds a response is served from the cache
+    :type ttl: int
+    :param tags: tags of the data read by the view, used by invalidation
+    :type tags: str
+    :param unless: function returning True for requests not to be cached
+    :type unless: function
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            config = current_app.config
+            if (
+                not config["RESPONSE_CACHE_ENABLED"]
+                or request.method != "GET"
+                or (unless is not None and unless())
+            ):
+                return view(*args, **kwargs)
+            key = request.full_path
+            entry = response_cache.get(key)
+            if entry is not None:
+                response_cache.count(response_cache.hits, request.endpoint)
+                return Response(entry["body"], mimetype=entry["mimetype"])
+            response_cache.count(response_cache.misses, request.endpoint)
+            generation = response_cache.generation
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            mimetype = response.mimetype
+
+            def store(body):
+                response_cache.set(
+                    key,
+                    {
+                        "expires_at": time.monotonic() + ttl,
+                        "tags": set(tags),
+                        "body": body,
+                        "mimetype": mimetype,
+                    },
+                    config["RESPONSE_CACHE_MAX_ENTRIES"],
+                    generation,
+                )
+
+            if response.is_streamed:
+                response.response = _tee(
+                    response.response, store, config["RESPONSE_CACHE_MAX_BODY_BYTES"]
+                )
+            else:
+                body = response.get_data()
+                if len(body) <= config["RESPONSE_CACHE_MAX_BODY_BYTES"]:
+                    store(body)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,80 @@
+"""
+This module answers conditional GET requests (``If-None-Match`` and
+``If-Modified-Since``) with 304 Not Modified before the view runs.
+
+The validators come from a cheap query (for example the latest ``updated_at``
+and the number of documents) instead of the full response, so an unchanged
+resource costs neither the full query nor its serialization.
+"""
+from datetime import timezone
+from functools import wraps
+
+from flask import current_app, request
+
+
+def conditional(validator, unless=None):
+    """
+    Decorates a GET view with conditional request handling.
+
+    ``validator`` is called with the view arguments and returns a tuple of an
+    etag and a last modified (naive UTC) datetime, or None when the resource
+    has no validators, in which case the view is always run.
+
+    :param validator: function returning the validators of the resource
+    :type validator: function
+    :param unless: function returning True for requests not to be handled
+    :type unless: function
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET" or (unless is not None and unless()):
+                return view(*args, **kwargs)
+            validators = validator(*args, **kwargs)
+            if validators is None or isinstance(validators, Exception):
+                return view(*args, **kwargs)
+            etag, last_modified = validators
+            if last_modified is not None:
+                # HTTP dates have a resolution of one second
+                last_modified = last_modified.replace(microsecond=0)
+            not_modified = False
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            elif request.if_modified_since and last_modified is not None:
+                not_modified = last_modified <= request.if_modified_since
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def version_validators(name, version):
+    """
+    Builds the validators of a resource from its version, a dictionary of
+    ``count`` and latest ``updated_at`` as returned by the DAO.
+
+    :param name: name of the resource, part of the etag
+    :type name: str
+    :param version: version of the resource, None or an exception
+    :type version: dict
+    :returns: tuple of etag & last modified datetime, or None
+    :rtype: tuple
+    """
+    if version is None or isinstance(version, Exception):
+        return None
+    updated_at = version.get("updated_at")
+    stamp = 0
+    if updated_at is not None:
+        stamp = int(updated_at.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    return f"{name}-{version.get('count', 0)}-{stamp}", updated_at
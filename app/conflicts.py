@@ -0,0 +1,331 @@
+"""
+This module detects date conflicts between phases with an in-memory
+interval tree of the scheduled phases.
+
+The tree is a treap ordered by ``scheduled_date`` where every node also keeps
+the latest ``ends_at`` of its subtree, so the phases overlapping a period are
+found in O(log n + k) for k conflicts.
+
+Each process loads the scheduled phases once and then applies the phases
+updated since its last load (``updated_at``) before every lookup, so writes
+of other workers are seen without reloading the whole tree. Lookups and
+updates of the tree hold the same lock, as a rotation during a lookup could
+hide a subtree from it.
+"""
+import random
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app.dao.placementsDAO import SCHEDULED_PHASE_STATUSES, get_phase_intervals_since
+
+
+class _Node(object):
+    __slots__ = ("key", "start", "end", "max_end", "priority", "value", "left", "right")
+
+    def __init__(self, key, start, end, value):
+        self.key = key
+        self.start = start
+        self.end = end
+        self.max_end = end
+        self.priority = random.random()
+        self.value = value
+        self.left = None
+        self.right = None
+
+
+def _update(node):
+    node.max_end = node.end
+    if node.left is not None and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+
+def _rotate_right(node):
+    left = node.left
+    node.left = left.right
+    _update(node)
+    left.right = node
+    _update(left)
+    return left
+
+
+def _rotate_left(node):
+    right = node.right
+    node.right = right.left
+    _update(node)
+    right.left = node
+    _update(right)
+    return right
+
+
+def _insert(node, new):
+    if node is None:
+        return new
+    if new.key < node.key:
+        node.left = _insert(node.left, new)
+        if node.left.priority > node.priority:
+            return _rotate_right(node)
+    else:
+        node.right = _insert(node.right, new)
+        if node.right.priority > node.priority:
+            return _rotate_left(node)
+    _update(node)
+    return node
+
+
+def _merge(left, right):
+    # every key of ``left`` is smaller than the keys of ``right``
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def _remove(node, key):
+    if node is None:
+        return None
+    if key < node.key:
+        node.left = _remove(node.left, key)
+    elif node.key < key:
+        node.right = _remove(node.right, key)
+    else:
+        return _merge(node.left, node.right)
+    _update(node)
+    return node
+
+
+def _overlapping(node, start, end, out):
+    # intervals are half-open, [start, end)
+    while node is not None and node.max_end > start:
+        _overlapping(node.left, start, end, out)
+        if node.start >= end:
+            return
+        if node.end > start:
+            out.append(node.value)
+        node = node.right
+
+
+class IntervalTree(object):
+    """
+    Treap of half-open intervals keyed by an id, with the maximum end of
+    every subtree.
+    """
+
+    def __init__(self):
+        self._root = None
+        self._nodes = {}
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, id):
+        return id in self._nodes
+
+    def add(self, id, start, end, value):
+        """
+        Adds the interval [start, end) with ``value``, replacing the interval
+        having the same id.
+
+        :param id: id of the interval
+        :type id: str
+        :param start: start of the interval
+        :type start: `datetime.datetime`
+        :param end: end of the interval, after ``start``
+        :type end: `datetime.datetime`
+        :param value: value returned by `overlapping`
+        :type value: object
+        """
+        self.discard(id)
+        node = _Node((start, id), start, end, value)
+        self._nodes[id] = node
+        self._root = _insert(self._root, node)
+
+    def discard(self, id):
+        """
+        Removes the interval having ``id`` if there is one.
+
+        :param id: id of the interval
+        :type id: str
+        """
+        node = self._nodes.pop(id, None)
+        if node is not None:
+            self._root = _remove(self._root, node.key)
+
+    def overlapping(self, start, end):
+        """
+        Returns the values of the intervals overlapping [start, end), sorted
+        by start.
+
+        :param start: start of the period
+        :type start: `datetime.datetime`
+        :param end: end of the period
+        :type end: `datetime.datetime`
+        :returns: list of values
+        :rtype: list
+        """
+        out = []
+        _overlapping(self._root, start, end, out)
+        return out
+
+
+def _day(value):
+    return datetime.combine(value.date(), datetime.min.time())
+
+
+class PhaseSchedule(object):
+    """
+    Interval tree of the scheduled phases, kept up to date from the
+    ``updated_at`` of the phases.
+
+    :param default_minutes: duration of the phases approved without ends_at
+    :type default_minutes: int
+    :param lag_seconds: how far behind the last load updates are read again
+    :type lag_seconds: int
+    """
+
+    def __init__(self, default_minutes, lag_seconds):
+        self.tree = IntervalTree()
+        self.default_duration = timedelta(minutes=default_minutes)
+        self.lag = timedelta(seconds=lag_seconds)
+        self.loaded_until = None
+        self._lock = threading.Lock()
+
+    def apply(self, phase):
+        """
+        Adds a scheduled phase to the tree, or removes it when it is not
+        scheduled (anymore).
+
+        :param phase: phase document
+        :type phase: dict
+        """
+        id = str(phase["_id"])
+        start = phase.get("scheduled_date")
+        if phase.get("status") not in SCHEDULED_PHASE_STATUSES or start is None:
+            self.tree.discard(id)
+            return
+        end = phase.get("ends_at") or start + self.default_duration
+        self.tree.add(
+            id,
+            start,
+            end,
+            {
+                "phase_id": id,
+                "placement_id": str(phase["placement_id"]),
+                "company_id": phase.get("company_id"),
+                "company_name": (phase.get("company") or {}).get("company_name"),
+                "phase_title": phase.get("title"),
+                "scheduled_date": start,
+                "ends_at": end,
+                "venue": phase.get("venue"),
+            },
+        )
+
+    def refresh(self):
+        """
+        Applies the phases updated since the last load, or loads all the
+        scheduled phases on the first call.
+
+        :raises PyMongoError: if the phases cannot be read
+        """
+        with self._lock:
+            since = None
+            if self.loaded_until is not None:
+                # a write may commit after a later one, read a bit of it again
+                since = self.loaded_until - self.lag
+            started_at = datetime.utcnow()
+            phases = get_phase_intervals_since(since)
+            if isinstance(phases, Exception):
+                raise phases
+            for phase in phases:
+                self.apply(phase)
+            self.loaded_until = started_at
+
+    def conflicts(self, start, end, company_id=None, venue=None):
+        """
+        Returns the scheduled phases of other companies overlapping
+        [start, end), with ``same_venue`` = True for those at ``venue``.
+
+        :param start: start of the period
+        :type start: `datetime.datetime`
+        :param end: end of the period
+        :type end: `datetime.datetime`
+        :param company_id: company whose own phases are not conflicts
+        :type company_id: `bson.ObjectId`
+        :param venue: venue of the new phase
+        :type venue: str
+        :returns: list of conflicting phases
+        :rtype: list
+        """
+        with self._lock:
+            overlapping = self.tree.overlapping(start, end)
+        conflicts = []
+        for phase in overlapping:
+            if company_id is not None and phase["company_id"] == company_id:
+                continue
+            conflict = {k: v for k, v in phase.items() if k != "company_id"}
+            conflict["same_venue"] = venue is not None and phase["venue"] == venue
+            conflicts.append(conflict)
+        return conflicts
+
+    def free_days(self, start, end):
+        """
+        Returns the days in [start, end) on which no phase is scheduled.
+
+        :param start: first day
+        :type start: `datetime.datetime`
+        :param end: day after the last day
+        :type end: `datetime.datetime`
+        :returns: list of free days ("YYYY-mm-dd")
+        :rtype: list
+        """
+        start, end = _day(start), _day(end)
+        busy = set()
+        one_day = timedelta(days=1)
+        with self._lock:
+            overlapping = self.tree.overlapping(start, end)
+        for phase in overlapping:
+            day = max(_day(phase["scheduled_date"]), start)
+            while day < phase["ends_at"] and day < end:
+                busy.add(day)
+                day += one_day
+        days = []
+        day = start
+        while day < end:
+            if day not in busy:
+                days.append(day.strftime("%Y-%m-%d"))
+            day += one_day
+        return days
+
+
+_schedule = None
+_schedule_lock = threading.Lock()
+
+
+def get_phase_schedule():
+    """
+    Returns the phase schedule of this process, brought up to date with the
+    phases updated since its last use.
+
+    :returns: schedule of the phases
+    :rtype: `PhaseSchedule`
+    """
+    global _schedule
+    with _schedule_lock:
+        if _schedule is None:
+            config = current_app.config
+            _schedule = PhaseSchedule(
+                config["PHASE_DEFAULT_DURATION_MINUTES"],
+                config["DELTA_SYNC_LAG_SECONDS"],
+            )
+    _schedule.refresh()
+    return _schedule
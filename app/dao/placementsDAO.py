@@ -1,16 +1,395 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta
 
 from werkzeug.local import LocalProxy
 
 from bson import ObjectId
 
-from pymongo.errors import PyMongoError
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateMany, UpdateOne
+from pymongo.errors import PyMongoError, DuplicateKeyError
 
 from app.db import get_db
 
 # Use LocalProxy to read the global db instance with just `db`
 db = LocalProxy(get_db)
 
+# Indexes needed by the queries of this module, created by app/indexes.py
+INDEXES = {
+    "placements": [
+        IndexModel(
+            [("company_id", ASCENDING), ("year", ASCENDING)], name="company_id_year"
+        ),
+        IndexModel([("year", ASCENDING)], name="year"),
+    ],
+    # one document per phase of a placement, the queues read status & date
+    "phases": [
+        IndexModel(
+            [("placement_id", ASCENDING), ("title", ASCENDING)],
+            name="placement_title",
+            unique=True,
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("scheduled_date", ASCENDING)],
+            name="status_scheduled_date",
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("requested_date", ASCENDING)],
+            name="status_requested_date",
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("suggested_date", ASCENDING)],
+            name="status_suggested_date",
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("updated_at", ASCENDING)],
+            name="status_updated_at",
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("ends_at", ASCENDING)],
+            name="status_ends_at",
+        ),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+        IndexModel([("company_id", ASCENDING)], name="company_id"),
+    ],
+    # one document per student registered for a placement
+    "registrations": [
+        IndexModel(
+            [("placement_id", ASCENDING), ("student_id", ASCENDING)],
+            name="placement_student",
+            unique=True,
+        ),
+        IndexModel([("student_id", ASCENDING)], name="student_id"),
+    ],
+    # one document per student per phase, see save_phase_results
+    "phase_results": [
+        IndexModel(
+            [
+                ("placement_id", ASCENDING),
+                ("phase_title", ASCENDING),
+                ("student_id", ASCENDING),
+            ],
+            name="placement_phase_student",
+            unique=True,
+        ),
+        IndexModel(
+            [
+                ("placement_id", ASCENDING),
+                ("status", ASCENDING),
+                ("student_id", ASCENDING),
+            ],
+            name="placement_status_student",
+        ),
+        IndexModel(
+            [("student_id", ASCENDING), ("placement_id", ASCENDING)],
+            name="student_placement",
+        ),
+    ],
+    # one document per student per phase with an allocated interview slot
+    # an allocation is written under a new allocation_id, which the phase
+    # then points to (``slot_allocation_id``), see save_interview_slots
+    "interview_slots": [
+        IndexModel(
+            [
+                ("phase_id", ASCENDING),
+                ("allocation_id", ASCENDING),
+                ("student_id", ASCENDING),
+            ],
+            name="phase_allocation_student",
+            unique=True,
+        ),
+        IndexModel(
+            [
+                ("phase_id", ASCENDING),
+                ("allocation_id", ASCENDING),
+                ("starts_at", ASCENDING),
+                ("panel", ASCENDING),
+            ],
+            name="phase_allocation_starts_at_panel",
+        ),
+        IndexModel(
+            [("student_id", ASCENDING), ("starts_at", ASCENDING)],
+            name="student_starts_at",
+        ),
+        IndexModel([("allocation_id", ASCENDING)], name="allocation_id"),
+    ],
+    # one document per day with an interview slot allocation in progress
+    "slot_locks": [
+        IndexModel(
+            [("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0
+        ),
+    ],
+}
+
+# Representative shape of every query of this module, checked with explain()
+# by ``flask indexes coverage``. ``full_scan`` marks intended full exports.
+QUERY_SHAPES = [
+    {
+        "name": "get_placements_eligibility",
+        "collection": "placements",
+        "filter": {"year": 2020},
+    },
+    {
+        "name": "approve_phase",
+        "collection": "phases",
+        "filter": {"placement_id": ObjectId(), "title": "title"},
+    },
+    {
+        "name": "get_unapproved_phases",
+        "collection": "phases",
+        "filter": {"status": "unapproved"},
+        "sort": [("requested_date", ASCENDING), ("_id", ASCENDING)],
+    },
+    {
+        "name": "get_pending_phases",
+        "collection": "phases",
+        "filter": {"status": "pending"},
+        "sort": [("suggested_date", ASCENDING), ("_id", ASCENDING)],
+    },
+    {
+        "name": "get_upcoming_phases",
+        "collection": "phases",
+        "filter": {"status": "upcoming"},
+        "sort": [("scheduled_date", ASCENDING), ("_id", ASCENDING)],
+    },
+    {
+        "name": "get_upcoming_phases_since",
+        "collection": "phases",
+        "filter": {
+            "status": {"$in": ["upcoming", "ongoing", "completed"]},
+            "updated_at": {"$gt": datetime(2020, 5, 8)},
+        },
+        "sort": [("updated_at", ASCENDING), ("_id", ASCENDING)],
+    },
+    {
+        "name": "advance_phase_statuses_completed",
+        "collection": "phases",
+        "filter": {
+            "status": {"$in": ["upcoming", "ongoing"]},
+            "ends_at": {"$lte": datetime(2020, 5, 8)},
+        },
+    },
+    {
+        "name": "advance_phase_statuses_ongoing",
+        "collection": "phases",
+        "filter": {
+            "status": "upcoming",
+            "scheduled_date": {"$lte": datetime(2020, 5, 8)},
+        },
+    },
+    {
+        "name": "get_phases_between",
+        "collection": "phases",
+        "filter": {
+            "status": {"$in": ["upcoming", "ongoing", "completed"]},
+            "scheduled_date": {
+                "$gte": datetime(2020, 5, 8),
+                "$lt": datetime(2020, 5, 15),
+            },
+        },
+        "sort": [("scheduled_date", ASCENDING), ("_id", ASCENDING)],
+    },
+    {
+        "name": "get_placement_phases",
+        "collection": "phases",
+        "filter": {"placement_id": ObjectId()},
+    },
+    {
+        "name": "update_company_snapshot",
+        "collection": "phases",
+        "filter": {"company_id": ObjectId()},
+    },
+    {
+        "name": "get_all_registered_students",
+        "collection": "registrations",
+        "pipeline": [{"$sort": {"placement_id": 1, "student_id": 1}}],
+        "full_scan": True,
+    },
+    {
+        "name": "get_registrants",
+        "collection": "registrations",
+        "filter": {"placement_id": ObjectId(), "student_id": {"$gt": ObjectId()}},
+        "sort": [("student_id", ASCENDING)],
+    },
+    {
+        "name": "get_student_registrations",
+        "collection": "registrations",
+        "filter": {"student_id": ObjectId()},
+    },
+    {
+        "name": "backfill_company_snapshots",
+        "collection": "placements",
+        "filter": {"company": {"$exists": False}, "_id": {"$gt": ObjectId()}},
+        "sort": [("_id", ASCENDING)],
+        "full_scan": True,
+    },
+    {
+        "name": "migrate_phases",
+        "collection": "placements",
+        "filter": {"phases": {"$exists": True}},
+        "sort": [("_id", ASCENDING)],
+        "full_scan": True,
+    },
+    {
+        "name": "get_phases_version",
+        "collection": "phases",
+        "filter": {},
+        "sort": [("updated_at", DESCENDING)],
+    },
+    {
+        "name": "get_phase",
+        "collection": "phases",
+        "filter": {"placement_id": ObjectId(), "title": "Interview"},
+    },
+    {
+        "name": "get_phase_intervals",
+        "collection": "phases",
+        "filter": {"status": {"$in": ["upcoming", "ongoing", "completed"]}},
+    },
+    {
+        "name": "get_phase_intervals_since",
+        "collection": "phases",
+        "filter": {
+            "status": {
+                "$in": ["unapproved", "pending", "upcoming", "ongoing", "completed"]
+            },
+            "updated_at": {"$gte": datetime(2020, 5, 8)},
+        },
+    },
+    {
+        "name": "get_phase_candidates",
+        "collection": "phase_results",
+        "filter": {
+            "placement_id": ObjectId(),
+            "phase_title": "Aptitude",
+            "status": {"$in": ["passed", "placed"]},
+        },
+        "sort": [("student_id", ASCENDING)],
+    },
+    {
+        "name": "get_busy_intervals",
+        "collection": "interview_slots",
+        "filter": {
+            "student_id": {"$in": [ObjectId(), ObjectId()]},
+            "starts_at": {"$lt": datetime(2020, 5, 9)},
+            "ends_at": {"$gt": datetime(2020, 5, 8)},
+            "phase_id": {"$ne": ObjectId()},
+        },
+    },
+    {
+        "name": "get_interview_slots",
+        "collection": "interview_slots",
+        "filter": {"phase_id": ObjectId(), "allocation_id": ObjectId()},
+        "sort": [("starts_at", ASCENDING), ("panel", ASCENDING)],
+    },
+    {
+        "name": "save_interview_slots_cleanup",
+        "collection": "interview_slots",
+        "filter": {"phase_id": ObjectId(), "allocation_id": {"$ne": ObjectId()}},
+    },
+    {
+        "name": "get_offer_candidates_placements",
+        "collection": "placements",
+        "filter": {"year": 2020},
+    },
+    {
+        "name": "get_offer_candidates_registrations",
+        "collection": "registrations",
+        "filter": {"placement_id": {"$in": [ObjectId(), ObjectId()]}},
+    },
+    {
+        "name": "get_offer_candidates_results",
+        "collection": "phase_results",
+        "filter": {
+            "placement_id": {"$in": [ObjectId(), ObjectId()]},
+            "status": "placed",
+        },
+    },
+    {
+        "name": "backfill_phase_ends",
+        "collection": "phases",
+        "filter": {
+            "status": {"$in": ["upcoming", "ongoing", "completed"]},
+            "ends_at": {"$exists": False},
+        },
+        "full_scan": True,
+    },
+    {
+        "name": "migrate_registrations",
+        "collection": "placements",
+        "filter": {"registered_students": {"$exists": True}},
+        "sort": [("_id", ASCENDING)],
+        "full_scan": True,
+    },
+    {
+        "name": "get_latest_placement",
+        "collection": "placements",
+        "filter": {"company_id": ObjectId()},
+        "sort": [("year", DESCENDING)],
+    },
+    {
+        "name": "get_phase_result",
+        "collection": "phase_results",
+        "pipeline": [{"$match": {"placement_id": ObjectId(), "phase_title": "title"}}],
+    },
+    {
+        "name": "count_passed_students",
+        "collection": "phase_results",
+        "pipeline": [
+            {
+                "$match": {
+                    "placement_id": ObjectId(),
+                    "status": {"$in": ["passed", "placed"]},
+                }
+            }
+        ],
+    },
+    {
+        "name": "migrate_phase_results",
+        "collection": "placements",
+        "filter": {"phases.results": {"$exists": True}},
+        "sort": [("_id", ASCENDING)],
+        "full_scan": True,
+    },
+]
+
+
+def _company_snapshot(company):
+    """
+    Returns the copy of the company details kept in its placements, so that
+    the phase queues do not look up the company.
+    """
+    return {
+        "company_name": company.get("company_name"),
+        "email": (company.get("concerned_person") or {}).get("email"),
+    }
+
+
+def update_company_snapshot(company_id, profile_data):
+    """
+    Copies the changed company_name & concerned_person.email of a company
+    profile to all placements & phases of the company with one update each.
+
+    :param company_id: id of the company
+    :type company_id: str
+    :param profile_data: updated fields of the company profile
+    :type profile_data: dict
+    """
+    snapshot = _company_snapshot(profile_data)
+    if snapshot["email"] is None:
+        snapshot["email"] = profile_data.get("concerned_person.email")
+    changes = {
+        f"company.{field}": value
+        for field, value in snapshot.items()
+        if value is not None
+    }
+    if changes:
+        db["placements"].update_many(
+            {"company_id": ObjectId(company_id)}, {"$set": changes}
+        )
+        db["phases"].update_many(
+            {"company_id": ObjectId(company_id)},
+            {"$set": {**changes, "updated_at": datetime.utcnow()}},
+        )
+
 
 def start_placement(placement_data):
     """
@@ -25,18 +404,26 @@ def start_placement(placement_data):
     :rtype: dict
     """
     try:
+        company = db["users"].find_one(
+            {"_id": ObjectId(placement_data["company_id"]), "role": "company"},
+            {"company_name": 1, "concerned_person.email": 1},
+        )
+        if company is None:
+            raise ValueError("No such company with that id")
         result = db["placements"].insert_one(
             {
                 "year": datetime.now().year,
-                "company_id": placement_data["company_id"],
+                "company_id": company["_id"],
+                "company": _company_snapshot(company),
                 "domain": placement_data["domain"],
                 "requirement": placement_data["requirement"],
                 "eligibility": {
-                    "sgpa": placement_data["spga"],
+                    "sgpa": placement_data["sgpa"],
                     "live_backlog": placement_data["live_backlog"],
                     "gender": placement_data["gender"],
                 },
                 "positions": placement_data["positions"],
+                "dream": placement_data.get("dream", False),
             }
         )
         return {"success": True, "_id": result.inserted_id}
@@ -44,10 +431,61 @@ def start_placement(placement_data):
         return e
 
 
+def get_placement_eligibility(placement_id):
+    """
+    Returns the _id, company_id & eligibility of a placement.
+
+    In case of a PyMongoError it returns the exception
+
+    :param placement_id: id of the placement
+    :type placement_id: str
+    :returns: dictionary containing _id, company_id & eligibility or None
+    :rtype: dict
+    """
+    try:
+        return db["placements"].find_one(
+            {"_id": ObjectId(placement_id)}, {"company_id": 1, "eligibility": 1}
+        )
+    except PyMongoError as e:
+        return e
+
+
+def get_placements_eligibility(year):
+    """
+    Returns the _id, company_id & eligibility of all placements of a year.
+
+    In case of a PyMongoError it returns the exception
+
+    :param year: year of the placements
+    :type year: int
+    :returns: list of dictionaries containing _id, company_id & eligibility
+    :rtype: list
+    """
+    try:
+        return list(
+            db["placements"].find(
+                {"year": year}, {"company_id": 1, "eligibility": 1}
+            )
+        )
+    except PyMongoError as e:
+        return e
+
+
+# statuses of a phase: created with a requested date ("unapproved"), given
+# another date by the TPO ("pending"), scheduled ("upcoming"), started
+# ("ongoing") and finished ("completed"), see advance_phase_statuses
+PHASE_STATUSES = ("unapproved", "pending", "upcoming", "ongoing", "completed")
+
+# statuses of the phases having a scheduled_date
+SCHEDULED_PHASE_STATUSES = ["upcoming", "ongoing", "completed"]
+
+
 def create_phase(phase_data):
     """
-    Inserts a phase in the array of phases in a particular placement.
-    This phase contains a title, description & requested_date.
+    Inserts a phase of a particular placement in the phases collection.
+    This phase contains a title, description, requested_date and optionally a
+    duration_minutes & venue, together with the company & requirement of the
+    placement shown in the phase queues.
     Returns a dictionary with success = True.
 
     In case of a ValueError an exception is returned.
@@ -58,33 +496,78 @@ def create_phase(phase_data):
     :rtype: dict
     """
     try:
-        result = db["placements"].update_one(
+        placement = db["placements"].find_one(
             {"_id": ObjectId(phase_data["_id"])},
-            {
-                "$push": {
-                    "phases": {
-                        "title": phase_data["title"],
-                        "description": phase_data["description"],
-                        "requested_date": datetime.strptime(
-                            phase_data["date"], "%Y-%m-%d"
-                        ),
-                    }
-                }
-            },
+            {"company_id": 1, "company": 1, "requirement": 1},
         )
-        if result.matched_count == 0:
+        if placement is None:
             raise ValueError("No such placement with that id")
-        if result.modified_count == 0:
-            raise ValueError("No document updated")
+        try:
+            db["phases"].insert_one(
+                {
+                    "placement_id": placement["_id"],
+                    "title": phase_data["title"],
+                    "description": phase_data["description"],
+                    "requested_date": datetime.strptime(
+                        phase_data["date"], "%Y-%m-%d"
+                    ),
+                    "duration_minutes": phase_data.get("duration_minutes"),
+                    "venue": phase_data.get("venue"),
+                    "status": "unapproved",
+                    "company_id": placement.get("company_id"),
+                    "company": placement.get("company"),
+                    "requirement": placement.get("requirement"),
+                    "updated_at": datetime.utcnow(),
+                }
+            )
+        except DuplicateKeyError:
+            raise ValueError("A phase with that title already exists")
         return {"success": True}
     except PyMongoError as e:
         return e
 
 
-def approve_phase(placement_id, phase_title):
+def get_phase(placement_id, phase_title):
+    """
+    Returns the dates, ends_at, duration_minutes, venue, status, company_id
+    & slot_allocation_id of the phase of a placement, or None if there is no
+    such phase.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param placement_id: id of the placement
+    :type placement_id: str
+    :param phase_title: title of the phase
+    :type phase_title: str
+    :returns: phase
+    :rtype: dict
+    """
+    try:
+        return db["phases"].find_one(
+            {"placement_id": ObjectId(placement_id), "title": phase_title},
+            {
+                "placement_id": 1,
+                "company_id": 1,
+                "title": 1,
+                "requested_date": 1,
+                "suggested_date": 1,
+                "scheduled_date": 1,
+                "ends_at": 1,
+                "duration_minutes": 1,
+                "venue": 1,
+                "status": 1,
+                "slot_allocation_id": 1,
+            },
+        )
+    except PyMongoError as e:
+        return e
+
+
+def approve_phase(placement_id, phase_title, duration_minutes=24 * 60):
     """
     Approves the requested date for the phase of a placement.
-    Adds a field ``scheduled_date`` = ``requested_date`` in the phase.
+    Adds a field ``scheduled_date`` = ``requested_date`` in the phase and
+    ``ends_at`` ``duration_minutes`` later.
     Returns a dictionary with success = True.
 
     In case of a ValueError an exception is returned.
@@ -93,24 +576,32 @@ def approve_phase(placement_id, phase_title):
     :type placement_id: str
     :param phase_title: title of the phase to be approved.
     :type phase_title: str
+    :param duration_minutes: duration of a phase not having its own
+    :type duration_minutes: int
     :returns: Dictionary containing success = True
     :rtype: dict
     """
     try:
-        # type of requested_date is datetime.datetime
-        requested_date = list(
-            db["placements"].find(
-                {"_id": ObjectId(placement_id), "phases.title": phase_title},
-                {"phases.$": 1},
-            )
-        )[0]["phases"][0]["requested_date"]
-
-        result = db["placements"].update_one(
-            {"_id": ObjectId(placement_id), "phases.title": phase_title},
-            {"$set": {"phases.$.scheduled_date": requested_date}},
+        phase = db["phases"].find_one(
+            {"placement_id": ObjectId(placement_id), "title": phase_title},
+            {"requested_date": 1, "status": 1, "duration_minutes": 1},
         )
-        if result.matched_count == 0:
+        if phase is None:
             raise ValueError("No such phase")
+        # type of requested_date is datetime.datetime
+        scheduled_date = phase["requested_date"]
+        duration = timedelta(minutes=phase.get("duration_minutes") or duration_minutes)
+        result = db["phases"].update_one(
+            {"_id": phase["_id"], "status": {"$in": ["unapproved", "pending"]}},
+            {
+                "$set": {
+                    "scheduled_date": scheduled_date,
+                    "ends_at": scheduled_date + duration,
+                    "status": "upcoming",
+                    "updated_at": datetime.utcnow(),
+                }
+            },
+        )
         if result.modified_count == 0:
             raise ValueError("No document updated(Phase is already approved)")
         return {"success": True}
@@ -120,7 +611,7 @@ def approve_phase(placement_id, phase_title):
 
 def suggest_date_phase(placement_id, phase_title, suggested_date):
     """
-    Suggest a date for a phase of the placement.
+    Suggest a date for a phase of the placement which is not approved yet.
     Sets the suggested_date field of given phase.
     Returns a dictionary with success = True.
 
@@ -136,13 +627,17 @@ def suggest_date_phase(placement_id, phase_title, suggested_date):
     :rtype: dict
     """
     try:
-        result = db["placements"].update_one(
-            {"_id": ObjectId(placement_id), "phases.title": phase_title},
+        result = db["phases"].update_one(
+            {
+                "placement_id": ObjectId(placement_id),
+                "title": phase_title,
+                "status": {"$in": ["unapproved", "pending"]},
+            },
             {
                 "$set": {
-                    "phases.$.suggested_date": datetime.strptime(
-                        suggested_date, "%Y-%m-%d"
-                    )
+                    "suggested_date": datetime.strptime(suggested_date, "%Y-%m-%d"),
+                    "status": "pending",
+                    "updated_at": datetime.utcnow(),
                 }
             },
         )
@@ -155,306 +650,1415 @@ def suggest_date_phase(placement_id, phase_title, suggested_date):
         return e
 
 
-def get_unapproved_phases():
+def _phase_queue_pipeline(phase_match, date_field, sort, offset, limit, project):
+    """
+    Builds the aggregation pipeline of a phase queue.
+
+    ``phase_match`` starts with the ``status`` of the queue, so the phases
+    are read in order of ``date_field`` from the ``status_<date_field>``
+    index. The company details come from the ``company`` snapshot of the
+    phase.
+
+    :param phase_match: conditions on a phase
+    :type phase_match: dict
+    :param date_field: date field of the phase the queue is sorted on
+    :type date_field: str
+    :param sort: ``ASCENDING`` or ``DESCENDING``
+    :type sort: int
+    :param offset: number of phases to skip
+    :type offset: int
+    :param limit: maximum number of phases to return, all if None
+    :type limit: int
+    :param project: fields of the returned phases
+    :type project: dict
+    :returns: aggregation pipeline
+    :rtype: list
+    """
+    pipeline = [
+        {"$match": phase_match},
+        {"$sort": {date_field: sort, "_id": ASCENDING}},
+    ]
+    if offset:
+        pipeline.append({"$skip": offset})
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$project": project})
+    return pipeline
+
+
+def get_unapproved_phases(limit=None, offset=0, sort=ASCENDING):
     """
     This function returns the list of unapproved phases of all placements
+    sorted by requested_date.
     These phases are dictionary containining _id, email, requested_date,
     phase and phase_description.
 
     In case of a PyMongoError it returns the exception.
 
+    :param limit: maximum number of phases to return, all if None
+    :type limit: int
+    :param offset: number of phases to skip
+    :type offset: int
+    :param sort: ``ASCENDING`` or ``DESCENDING`` order of requested_date
+    :type sort: int
     :returns: list of unapproved phases of all placements.
     :rtype: list
     """
     try:
         return list(
-            db["placements"].aggregate(
-                [
-                    {"$unwind": {"path": "$phases"}},
-                    {
-                        "$match": {
-                            "phases.scheduled_date": {"$exists": False},
-                            "phases.requested_date": {"$exists": True},
-                            "phases.suggested_date": {"$exists": False},
-                        }
-                    },
-                    {
-                        "$lookup": {
-                            "from": "users",
-                            "localField": "company_id",
-                            "foreignField": "_id",
-                            "as": "company_details",
-                        }
-                    },
-                    {"$unwind": {"path": "$company_details"}},
+            db["phases"].aggregate(
+                _phase_queue_pipeline(
+                    {"status": "unapproved"},
+                    "requested_date",
+                    sort,
+                    offset,
+                    limit,
                     {
-                        "$project": {
-                            "_id": 1,
-                            "company_name": "$company_details.company_name",
-                            "email": "$company_details.concerned_person.email",
-                            "requested_date": "$phases.requested_date",
-                            "phase": "$phases.title",
-                            "phase_description": "$phases.phase_description",
-                        }
+                        "_id": "$placement_id",
+                        "company_name": "$company.company_name",
+                        "email": "$company.email",
+                        "requested_date": 1,
+                        "phase": "$title",
+                        "phase_description": "$description",
                     },
-                ]
+                )
             )
         )
     except PyMongoError as e:
         return e
 
 
-def get_pending_phases():
+def get_pending_phases(limit=None, offset=0, sort=ASCENDING):
     """
     This function returns the list of pending phases of all placements
+    sorted by suggested_date.
     These phases are dictionary containining company_name, email, requested_date,
     suggested_date and phase.
 
     In case of a PyMongoError it returns the exception.
 
+    :param limit: maximum number of phases to return, all if None
+    :type limit: int
+    :param offset: number of phases to skip
+    :type offset: int
+    :param sort: ``ASCENDING`` or ``DESCENDING`` order of suggested_date
+    :type sort: int
     :returns: list of pending phases of all placements.
     :rtype: list
     """
     try:
         return list(
-            db["placements"].aggregate(
-                [
-                    {"$unwind": {"path": "$phases"}},
-                    {
-                        "$match": {
-                            "$and": [
-                                {"phases.scheduled_date": {"$exists": False}},
-                                {"phases.suggested_date": {"$exists": True}},
-                            ]
-                        }
-                    },
-                    {
-                        "$lookup": {
-                            "from": "users",
-                            "localField": "company_id",
-                            "foreignField": "_id",
-                            "as": "company_details",
-                        }
-                    },
-                    {"$unwind": {"path": "$company_details"}},
+            db["phases"].aggregate(
+                _phase_queue_pipeline(
+                    {"status": "pending"},
+                    "suggested_date",
+                    sort,
+                    offset,
+                    limit,
                     {
-                        "$project": {
-                            "company_name": "$company_details.company_name",
-                            "email": "$company_details.concerned_person.email",
-                            "requested_date": "$phases.requested_date",
-                            "suggested_date": "$phases.suggested_date",
-                            "phase": "$phases.title",
-                        }
+                        "_id": "$placement_id",
+                        "company_name": "$company.company_name",
+                        "email": "$company.email",
+                        "requested_date": 1,
+                        "suggested_date": 1,
+                        "phase": "$title",
                     },
-                ]
+                )
             )
         )
     except PyMongoError as e:
         return e
 
 
-def get_upcoming_phases():
+_UPCOMING_PHASE_MATCH = {"status": "upcoming"}
+
+_UPCOMING_PHASE_PROJECT = {
+    "_id": "$placement_id",
+    "company_name": "$company.company_name",
+    "email": "$company.email",
+    "date": "$scheduled_date",
+    "phase_title": "$title",
+    "phase_description": "$description",
+    "requirement": 1,
+}
+
+
+def get_upcoming_phases(limit=None, offset=0, sort=ASCENDING):
     """
     This function returns the list of upcoming phases of all placements
+    sorted by scheduled_date.
     These phases are dictionary containing company_name, email, date,
     phase_title, phase_description and requirement.
 
     In case of a PyMongoError it returns the exception.
 
+    :param limit: maximum number of phases to return, all if None
+    :type limit: int
+    :param offset: number of phases to skip
+    :type offset: int
+    :param sort: ``ASCENDING`` or ``DESCENDING`` order of scheduled_date
+    :type sort: int
     :returns: list of upcoming phases of all placements.
     :rtype: list
     """
     try:
         return list(
-            db["placements"].aggregate(
-                [
-                    {"$unwind": {"path": "$phases"}},
-                    {
-                        "$match": {
-                            "phases.scheduled_date": {
-                                "$gt": datetime(
-                                    2020, 5, 8, 0, 0, 0, tzinfo=timezone.utc
-                                )
-                            }
-                        }
-                    },
-                    {
-                        "$lookup": {
-                            "from": "users",
-                            "localField": "company_id",
-                            "foreignField": "_id",
-                            "as": "company_details",
-                        }
-                    },
-                    {"$unwind": {"path": "$company_details"}},
-                    {
-                        "$project": {
-                            "company_name": "$company_details.company_name",
-                            "email": "$company_details.concerned_person.email",
-                            "date": "$phases.scheduled_date",
-                            "phase_title": "$phases.title",
-                            "phase_description": "$phases.phase_description",
-                            "requirement": 1,
-                        }
-                    },
-                ]
+            db["phases"].aggregate(
+                _phase_queue_pipeline(
+                    _UPCOMING_PHASE_MATCH,
+                    "scheduled_date",
+                    sort,
+                    offset,
+                    limit,
+                    _UPCOMING_PHASE_PROJECT,
+                )
             )
         )
     except PyMongoError as e:
         return e
 
 
-# not used
-def get_registered_students(company_id):
+def get_upcoming_phases_since(since):
     """
-    Returns a list of registered students of a particular company.
-    This list contains dictionaries of students id of student and profile
-    of student containing email & full_name.
+    This function returns the upcoming phases created or updated after
+    ``since`` (all if None), sorted by updated_at, and the phases which
+    stopped being upcoming since then with ``deleted`` = True.
+    These phases are dictionary containing _id (of the phase), placement_id,
+    company_name, email, date, phase_title, phase_description, requirement
+    and updated_at.
 
     In case of a PyMongoError it returns the exception.
 
-    :returns: list of registered students of a particular company.
+    :param since: naive UTC datetime of the previous sync or None
+    :type since: `datetime.datetime`
+    :returns: list of changed upcoming phases.
     :rtype: list
     """
+    if since is None:
+        phase_match = dict(_UPCOMING_PHASE_MATCH)
+    else:
+        phase_match = {
+            "status": {"$in": SCHEDULED_PHASE_STATUSES},
+            "updated_at": {"$gt": since},
+        }
     try:
         return list(
-            db["placements"].aggregate(
-                [
-                    {"$unwind": {"path": "$registered_students"}},
-                    {"$match": {"company_id": ObjectId(company_id)}},
-                    {"$project": {"id": "$registered_students", "_id": 0}},
+            db["phases"].aggregate(
+                _phase_queue_pipeline(
+                    phase_match,
+                    "updated_at",
+                    ASCENDING,
+                    0,
+                    None,
                     {
-                        "$lookup": {
-                            "from": "users",
-                            "let": {"id": "$id"},
-                            "pipeline": [
-                                {"$match": {"$expr": {"$eq": ["$$id", "$_id"]}}},
-                                {"$project": {"full_name": 1, "email": 1, "_id": 0}},
-                            ],
-                            "as": "profile",
-                        }
+                        **_UPCOMING_PHASE_PROJECT,
+                        # phases of a placement share its id
+                        "_id": 1,
+                        "placement_id": 1,
+                        "updated_at": 1,
+                        "deleted": {"$ne": ["$status", "upcoming"]},
                     },
-                    {"$unwind": {"path": "$profile"}},
-                ]
+                )
             )
         )
     except PyMongoError as e:
         return e
 
 
-def get_all_registered_students():
+def advance_phase_statuses(now):
     """
-    Returns a list of all registered students for every company(placement).
-    This list contains dictionaries of students having various details.
+    Moves the phases whose ``ends_at`` has passed to "completed" and then the
+    upcoming phases whose ``scheduled_date`` has passed to "ongoing", with one
+    update of all such phases each.
 
     In case of a PyMongoError it returns the exception.
 
-    :returns: list of all registered students for every company(placement).
+    :param now: naive UTC datetime
+    :type now: `datetime.datetime`
+    :returns: dictionary containing the number of phases moved to each status
+    :rtype: dict
+    """
+    try:
+        completed = db["phases"].update_many(
+            {"status": {"$in": ["upcoming", "ongoing"]}, "ends_at": {"$lte": now}},
+            {"$set": {"status": "completed", "updated_at": now}},
+        )
+        ongoing = db["phases"].update_many(
+            {"status": "upcoming", "scheduled_date": {"$lte": now}},
+            {"$set": {"status": "ongoing", "updated_at": now}},
+        )
+        return {
+            "ongoing": ongoing.modified_count,
+            "completed": completed.modified_count,
+        }
+    except PyMongoError as e:
+        return e
+
+
+def get_phases_version():
+    """
+    Returns the number of phases and the latest ``updated_at`` of a phase,
+    which change with every write of a phase.
+
+    In case of a PyMongoError it returns the exception.
+
+    :returns: dictionary containing count & updated_at
+    :rtype: dict
+    """
+    try:
+        latest = db["phases"].find_one(
+            {}, {"updated_at": 1}, sort=[("updated_at", DESCENDING)]
+        )
+        return {
+            "count": db["phases"].estimated_document_count(),
+            "updated_at": latest.get("updated_at") if latest else None,
+        }
+    except PyMongoError as e:
+        return e
+
+
+def get_phases_between(start, end):
+    """
+    This function returns the scheduled phases of all placements with a
+    scheduled_date in [start, end), sorted by scheduled_date.
+    These phases are dictionary containing company_name, email, date,
+    phase_title, phase_description, requirement and status.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param start: naive UTC start of the window
+    :type start: `datetime.datetime`
+    :param end: naive UTC end of the window
+    :type end: `datetime.datetime`
+    :returns: list of phases in the window.
     :rtype: list
     """
     try:
         return list(
-            db["placements"].aggregate(
-                [
-                    {
-                        "$lookup": {
-                            "from": "users",
-                            "localField": "registered_students",
-                            "foreignField": "_id",
-                            "as": "registered_students",
-                        }
-                    },
-                    {"$project": {"registered_students": 1, "company_id": 1, "_id": 0}},
+            db["phases"].aggregate(
+                _phase_queue_pipeline(
                     {
-                        "$project": {
-                            "registered_students.password": 0,
-                            "registered_students.sem_marks": 0,
-                            "registered_students.other_qualifications": 0,
-                            "registered_students.projects": 0,
-                            "registered_students.role": 0,
-                            "registered_students.extra_activities": 0,
-                        }
+                        "status": {"$in": SCHEDULED_PHASE_STATUSES},
+                        "scheduled_date": {"$gte": start, "$lt": end},
                     },
-                ]
+                    "scheduled_date",
+                    ASCENDING,
+                    0,
+                    None,
+                    {**_UPCOMING_PHASE_PROJECT, "status": 1},
+                )
             )
         )
     except PyMongoError as e:
         return e
 
 
-def get_phase_result(company_id, phase_title):
+_PHASE_INTERVAL_PROJECTION = {
+    "placement_id": 1,
+    "company_id": 1,
+    "company.company_name": 1,
+    "title": 1,
+    "status": 1,
+    "scheduled_date": 1,
+    "ends_at": 1,
+    "venue": 1,
+    "updated_at": 1,
+}
+
+
+def get_phase_intervals_since(since):
     """
-    Returns list of results of a particular company_id having a particular phase_title
-    containing _id, class, department, name, rollno & status of students.
+    This function returns the scheduled phases when ``since`` is None, else
+    the phases of any status updated at or after ``since``, with their
+    placement_id, company_id, company, title, status, scheduled_date,
+    ends_at, venue and updated_at.
 
-    In case of an PyMongoError it returns the exception
+    In case of a PyMongoError it returns the exception.
 
-    :returns: list of results
+    :param since: naive UTC datetime of the previous load or None
+    :type since: `datetime.datetime`
+    :returns: list of phases
     :rtype: list
     """
-    print(company_id, phase_title)
+    if since is None:
+        query = {"status": {"$in": SCHEDULED_PHASE_STATUSES}}
+    else:
+        query = {
+            "status": {"$in": list(PHASE_STATUSES)},
+            "updated_at": {"$gte": since},
+        }
     try:
-        return list(
-            db["placements"].aggregate(
-                [
-                    {
-                        "$match": {
-                            # "year": str(datetime.now().year),
-                            "year": "2021",
-                            "company_id": ObjectId(company_id),
-                        }
-                    },
-                    {
-                        "$project": {
-                            "phase": {
-                                "$arrayElemAt": [
-                                    {
-                                        "$filter": {
-                                            "input": "$phases",
-                                            "as": "phase",
-                                            "cond": {
-                                                "$eq": ["$$phase.title", phase_title]
-                                            },
-                                        }
-                                    },
-                                    0,
-                                ]
-                            }
-                        }
-                    },
-                    {"$project": {"results": "$phase.results"}},
-                    {"$unwind": {"path": "$results"}},
-                    {
-                        "$project": {
-                            "student_id": "$results.student_id",
-                            "status": "$results.status",
-                        }
-                    },
-                    {
-                        "$lookup": {
-                            "from": "users",
-                            "localField": "student_id",
-                            "foreignField": "_id",
-                            "as": "profile",
-                        }
-                    },
-                    {
-                        "$project": {
-                            "profile": {"$arrayElemAt": ["$profile", 0]},
-                            "status": 1,
-                        }
-                    },
-                    {
-                        "$project": {
-                            "name": "$profile.full_name",
-                            "class": "$profile.class",
-                            "department": "$profile.department",
-                            "rollno": "$profile.roll_number",
-                            "status": "$status",
-                        }
-                    },
-                ]
+        return list(db["phases"].find(query, _PHASE_INTERVAL_PROJECTION))
+    except PyMongoError as e:
+        return e
+
+
+# fields of the students returned in the registrant listings
+_REGISTRANT_PROJECTION = {
+    "password": 0,
+    "sem_marks": 0,
+    "other_qualifications": 0,
+    "projects": 0,
+    "role": 0,
+    "extra_activities": 0,
+    "login_email": 0,
+}
+
+
+def register_student(placement_id, student_id, preference=None):
+    """
+    Registers a student for a placement. Registering again only updates the
+    ``preference`` (lower is preferred) of the student for the placement,
+    used by the offer allocation.
+    Returns a dictionary with success = True & registered = False if the
+    student was already registered.
+
+    In case of a ValueError an exception is returned.
+
+    :param placement_id: id of the placement
+    :type placement_id: str
+    :param student_id: id of the student
+    :type student_id: str
+    :param preference: rank of the placement among those of the student
+    :type preference: int
+    :returns: dictionary containing success & registered
+    :rtype: dict
+    """
+    try:
+        placement = db["placements"].find_one({"_id": ObjectId(placement_id)}, {"_id": 1})
+        if placement is None:
+            raise ValueError("No such placement with that id")
+        student = {"_id": ObjectId(student_id), "role": "student"}
+        if db["users"].count_documents(student, limit=1) == 0:
+            raise ValueError("No such student with that id")
+        update = {"$setOnInsert": {"registered_at": datetime.utcnow()}}
+        if preference is not None:
+            update["$set"] = {"preference": preference}
+        try:
+            result = db["registrations"].update_one(
+                {
+                    "placement_id": ObjectId(placement_id),
+                    "student_id": ObjectId(student_id),
+                },
+                update,
+                upsert=True,
             )
-        )
+        except DuplicateKeyError:
+            # a concurrent request registered the student first
+            return {"success": True, "registered": False}
+        return {"success": True, "registered": result.upserted_id is not None}
     except PyMongoError as e:
         return e
+
+
+def unregister_student(placement_id, student_id):
+    """
+    Removes the registration of a student for a placement, if any.
+    Returns a dictionary with success = True & unregistered = False if the
+    student was not registered.
+
+    :param placement_id: id of the placement
+    :type placement_id: str
+    :param student_id: id of the student
+    :type student_id: str
+    :returns: dictionary containing success & unregistered
+    :rtype: dict
+    """
+    try:
+        result = db["registrations"].delete_one(
+            {"placement_id": ObjectId(placement_id), "student_id": ObjectId(student_id)}
+        )
+        return {"success": True, "unregistered": result.deleted_count == 1}
+    except PyMongoError as e:
+        return e
+
+
+def count_registrations(placement_id):
+    """
+    Returns the number of students registered for a placement.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param placement_id: id of the placement
+    :type placement_id: `bson.ObjectId`
+    :rtype: int
+    """
+    try:
+        return db["registrations"].count_documents({"placement_id": placement_id})
+    except PyMongoError as e:
+        return e
+
+
+def get_registrants(placement_id, limit=None, after=None):
+    """
+    Returns a page of the students registered for a placement in order of
+    their _id, starting after the student id ``after``, without reading the
+    placement document. A registration of a deleted student is returned as
+    ``{"_id": student_id, "deleted": True}``, so that pages keep ``limit``
+    documents.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param placement_id: id of the placement
+    :type placement_id: str
+    :returns: list of students
+    :rtype: list
+    """
+    try:
+        query = {"placement_id": ObjectId(placement_id)}
+        if after is not None:
+            query["student_id"] = {"$gt": after}
+        pipeline = [{"$match": query}, {"$sort": {"student_id": 1}}]
+        if limit:
+            pipeline.append({"$limit": limit})
+        pipeline += [
+            {
+                "$lookup": {
+                    "from": "users",
+                    "localField": "student_id",
+                    "foreignField": "_id",
+                    "as": "student",
+                }
+            },
+            {"$unwind": {"path": "$student", "preserveNullAndEmptyArrays": True}},
+            {
+                "$replaceRoot": {
+                    "newRoot": {
+                        "$ifNull": [
+                            "$student",
+                            {"_id": "$student_id", "deleted": True},
+                        ]
+                    }
+                }
+            },
+            {"$project": _REGISTRANT_PROJECTION},
+        ]
+        return list(db["registrations"].aggregate(pipeline))
+    except PyMongoError as e:
+        return e
+
+
+def get_student_registrations(student_id):
+    """
+    Returns the placements a student registered for, containing _id,
+    company_id, domain, year & registered_at.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param student_id: id of the student
+    :type student_id: str
+    :returns: list of placements
+    :rtype: list
+    """
+    try:
+        return list(
+            db["registrations"].aggregate(
+                [
+                    {"$match": {"student_id": ObjectId(student_id)}},
+                    {
+                        "$lookup": {
+                            "from": "placements",
+                            "localField": "placement_id",
+                            "foreignField": "_id",
+                            "as": "placement",
+                        }
+                    },
+                    {"$unwind": {"path": "$placement"}},
+                    {
+                        "$project": {
+                            "_id": "$placement_id",
+                            "company_id": "$placement.company_id",
+                            "domain": "$placement.domain",
+                            "year": "$placement.year",
+                            "registered_at": 1,
+                        }
+                    },
+                ]
+            )
+        )
+    except PyMongoError as e:
+        return e
+
+
+def _registered_students_pipeline():
+    return [
+        {"$sort": {"placement_id": 1, "student_id": 1}},
+        {
+            "$lookup": {
+                "from": "users",
+                "localField": "student_id",
+                "foreignField": "_id",
+                "as": "student",
+            }
+        },
+        {"$unwind": {"path": "$student"}},
+        {"$project": {"student." + field: 0 for field in _REGISTRANT_PROJECTION}},
+        {
+            "$group": {
+                "_id": "$placement_id",
+                "registered_students": {"$push": "$student"},
+            }
+        },
+        {
+            "$lookup": {
+                "from": "placements",
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "placement",
+            }
+        },
+        {
+            "$project": {
+                "company_id": {"$arrayElemAt": ["$placement.company_id", 0]},
+                "registered_students": 1,
+                "_id": 0,
+            }
+        },
+    ]
+
+
+def get_all_registered_students():
+    """
+    Returns a list of all registered students for every company(placement).
+    This list contains dictionaries of students having various details.
+
+    In case of a PyMongoError it returns the exception.
+
+    :returns: list of all registered students for every company(placement).
+    :rtype: list
+    """
+    try:
+        return list(
+            db["registrations"].aggregate(
+                _registered_students_pipeline(), allowDiskUse=True
+            )
+        )
+    except PyMongoError as e:
+        return e
+
+
+def get_all_registered_students_cursor(batch_size):
+    """
+    Same as `get_all_registered_students` but returns the aggregation cursor,
+    fetching ``batch_size`` placements per round trip, so the result can be
+    streamed.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param batch_size: number of placements fetched per batch
+    :type batch_size: int
+    :returns: cursor of all registered students for every company(placement).
+    :rtype: `pymongo.command_cursor.CommandCursor`
+    """
+    try:
+        return db["registrations"].aggregate(
+            _registered_students_pipeline(), batchSize=batch_size, allowDiskUse=True
+        )
+    except PyMongoError as e:
+        return e
+
+
+# statuses of a student in the results of a phase
+PHASE_RESULT_STATUSES = ("passed", "failed", "placed")
+
+
+def save_phase_results(placement_id, phase_title, results):
+    """
+    Saves the results of many students in a phase of a placement in the
+    ``phase_results`` collection with one bulk write, replacing earlier
+    results of the same students.
+
+    Students who were placed are added to ``placed_students`` of the
+    placement, and a student whose result is now anything else is removed
+    from it.
+
+    In case of a ValueError an exception is returned.
+
+    :param placement_id: id of the placement
+    :type placement_id: str
+    :param phase_title: title of the phase
+    :type phase_title: str
+    :param results: list of dictionaries containing student_id & status
+    :type results: list
+    :returns: dictionary containing success = True & count of results
+    :rtype: dict
+    """
+    try:
+        now = datetime.utcnow()
+        phase = {"placement_id": ObjectId(placement_id), "title": phase_title}
+        if db["phases"].count_documents(phase, limit=1) == 0:
+            raise ValueError("No such placement with that phase")
+        db["phase_results"].bulk_write(
+            [
+                UpdateOne(
+                    {
+                        "placement_id": ObjectId(placement_id),
+                        "phase_title": phase_title,
+                        "student_id": r["student_id"],
+                    },
+                    {"$set": {"status": r["status"], "updated_at": now}},
+                    upsert=True,
+                )
+                for r in results
+            ],
+            ordered=False,
+        )
+        # placed_students follows the results, once they are all written
+        placement = {"_id": ObjectId(placement_id)}
+        placed = [r["student_id"] for r in results if r["status"] == "placed"]
+        not_placed = [r["student_id"] for r in results if r["status"] != "placed"]
+        db["placements"].bulk_write(
+            [
+                UpdateOne(
+                    placement, {"$addToSet": {"placed_students": {"$each": placed}}}
+                ),
+                UpdateOne(
+                    placement, {"$pull": {"placed_students": {"$in": not_placed}}}
+                ),
+            ]
+        )
+        return {"success": True, "count": len(results)}
+    except PyMongoError as e:
+        return e
+
+
+def get_placement_phases(placement_id):
+    """
+    Returns the title, status, scheduled_date & completed flag of the phases
+    of a placement.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param placement_id: id of the placement
+    :type placement_id: `bson.ObjectId`
+    :rtype: list
+    """
+    try:
+        return list(
+            db["phases"].find(
+                {"placement_id": placement_id},
+                {"title": 1, "status": 1, "scheduled_date": 1, "completed": 1},
+            ).sort("_id", ASCENDING)
+        )
+    except PyMongoError as e:
+        return e
+
+
+def get_latest_placement(company_id):
+    """
+    Returns the _id & year of the latest placement of a company, or None.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param company_id: id of the company
+    :type company_id: str
+    :rtype: dict
+    """
+    try:
+        return db["placements"].find_one(
+            {"company_id": ObjectId(company_id)},
+            {"year": 1},
+            sort=[("year", DESCENDING)],
+        )
+    except PyMongoError as e:
+        return e
+
+
+def count_passed_students(placement_id):
+    """
+    Returns the number of students who passed (or were placed in) at least
+    one phase of a placement.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param placement_id: id of the placement
+    :type placement_id: `bson.ObjectId`
+    :rtype: int
+    """
+    try:
+        result = list(
+            db["phase_results"].aggregate(
+                [
+                    {
+                        "$match": {
+                            "placement_id": placement_id,
+                            "status": {"$in": ["passed", "placed"]},
+                        }
+                    },
+                    {"$group": {"_id": "$student_id"}},
+                    {"$count": "total"},
+                ]
+            )
+        )
+        return result[0]["total"] if result else 0
+    except PyMongoError as e:
+        return e
+
+
+def get_phase_result(company_id, phase_title):
+    """
+    Returns list of results of the latest placement of a company_id having a
+    particular phase_title containing _id, class, department, name, rollno &
+    status of students.
+
+    In case of an PyMongoError it returns the exception
+
+    :returns: list of results
+    :rtype: list
+    """
+    try:
+        placement = get_latest_placement(company_id)
+        if isinstance(placement, Exception):
+            raise placement
+        if placement is None:
+            return []
+        return list(
+            db["phase_results"].aggregate(
+                [
+                    {
+                        "$match": {
+                            "placement_id": placement["_id"],
+                            "phase_title": phase_title,
+                        }
+                    },
+                    {
+                        "$lookup": {
+                            "from": "users",
+                            "localField": "student_id",
+                            "foreignField": "_id",
+                            "as": "profile",
+                        }
+                    },
+                    {
+                        "$project": {
+                            "_id": "$student_id",
+                            "profile": {"$arrayElemAt": ["$profile", 0]},
+                            "status": 1,
+                        }
+                    },
+                    {
+                        "$project": {
+                            "name": "$profile.full_name",
+                            "class": "$profile.class",
+                            "department": "$profile.department",
+                            "rollno": "$profile.roll_number",
+                            "status": "$status",
+                        }
+                    },
+                ]
+            )
+        )
+    except PyMongoError as e:
+        return e
+
+
+def get_phase_candidates(placement_id, phase_title):
+    """
+    Returns the ids of the students who passed the phase before
+    ``phase_title`` (in order of scheduled_date, then of creation), or of the
+    students registered for the placement if it is the first phase.
+
+    It raises a ValueError if the phase does not exist or a phase created
+    before it is not scheduled. In case of a PyMongoError the exception is
+    returned.
+
+    :param placement_id: id of the placement
+    :type placement_id: str
+    :param phase_title: title of the phase
+    :type phase_title: str
+    :returns: list of student ids
+    :rtype: list
+    """
+    try:
+        phases = get_placement_phases(ObjectId(placement_id))
+        if isinstance(phases, Exception):
+            raise phases
+        phase = next((p for p in phases if p["title"] == phase_title), None)
+        if phase is None:
+            raise ValueError("No such placement with that phase")
+        # an unscheduled phase created before this one has no place in the order
+        for p in phases:
+            if p["_id"] < phase["_id"] and p.get("scheduled_date") is None:
+                raise ValueError(f"The phase {p['title']} is not scheduled")
+        titles = [
+            p["title"]
+            for p in sorted(
+                (p for p in phases if p.get("scheduled_date") is not None),
+                key=lambda p: (p["scheduled_date"], p["_id"]),
+            )
+        ]
+        position = titles.index(phase_title)
+        if position == 0:
+            cursor = db["registrations"].find(
+                {"placement_id": ObjectId(placement_id)}, {"student_id": 1}
+            )
+        else:
+            cursor = db["phase_results"].find(
+                {
+                    "placement_id": ObjectId(placement_id),
+                    "phase_title": titles[position - 1],
+                    "status": {"$in": ["passed", "placed"]},
+                },
+                {"student_id": 1},
+            )
+        return [r["student_id"] for r in cursor.sort("student_id", ASCENDING)]
+    except PyMongoError as e:
+        return e
+
+
+def lock_slot_days(days, owner, seconds):
+    """
+    Locks the days of an interview slot allocation for ``seconds``, so that
+    allocations of phases on the same days run one after the other. Days are
+    locked in order; a lock left by a crashed allocation is taken over once
+    it has expired.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param days: days of the allocation ("YYYY-mm-dd")
+    :type days: list
+    :param owner: id of the allocation
+    :type owner: `bson.ObjectId`
+    :param seconds: time after which a lock may be taken over
+    :type seconds: int
+    :returns: True if all the days were locked, False if one is locked by
+        another allocation (none is kept locked then)
+    :rtype: bool
+    """
+    try:
+        now = datetime.utcnow()
+        lock = {"owner": owner, "expires_at": now + timedelta(seconds=seconds)}
+        locked = []
+        for day in sorted(days):
+            try:
+                db["slot_locks"].insert_one({"_id": day, **lock})
+            except DuplicateKeyError:
+                expired = db["slot_locks"].find_one_and_update(
+                    {"_id": day, "expires_at": {"$lt": now}}, {"$set": lock}
+                )
+                if expired is None:
+                    unlock_slot_days(locked, owner)
+                    return False
+            locked.append(day)
+        return True
+    except PyMongoError as e:
+        return e
+
+
+def unlock_slot_days(days, owner):
+    """
+    Releases the days locked by an interview slot allocation.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param days: days of the allocation ("YYYY-mm-dd")
+    :type days: list
+    :param owner: id of the allocation
+    :type owner: `bson.ObjectId`
+    """
+    try:
+        db["slot_locks"].delete_many({"_id": {"$in": list(days)}, "owner": owner})
+    except PyMongoError as e:
+        return e
+
+
+def get_busy_intervals(student_ids, start, end, phase_id):
+    """
+    Returns the interview slots of the current allocations of other phases
+    overlapping [start, end) of the students, as a dictionary of student id
+    to list of (starts_at, ends_at) tuples.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param student_ids: ids of the students
+    :type student_ids: list
+    :param start: start of the period
+    :type start: `datetime.datetime`
+    :param end: end of the period
+    :type end: `datetime.datetime`
+    :param phase_id: id of the phase whose own slots are ignored
+    :type phase_id: `bson.ObjectId`
+    :rtype: dict
+    """
+    try:
+        slots = list(
+            db["interview_slots"].find(
+                {
+                    "student_id": {"$in": student_ids},
+                    "starts_at": {"$lt": end},
+                    "ends_at": {"$gt": start},
+                    "phase_id": {"$ne": phase_id},
+                },
+                {
+                    "_id": 0,
+                    "phase_id": 1,
+                    "allocation_id": 1,
+                    "student_id": 1,
+                    "starts_at": 1,
+                    "ends_at": 1,
+                },
+            )
+        )
+        # slots of an allocation being written or replaced do not count
+        current = {
+            p.get("slot_allocation_id")
+            for p in db["phases"].find(
+                {"_id": {"$in": list({slot["phase_id"] for slot in slots})}},
+                {"slot_allocation_id": 1},
+            )
+        }
+        busy = {}
+        for slot in slots:
+            if slot["allocation_id"] in current:
+                busy.setdefault(slot["student_id"], []).append(
+                    (slot["starts_at"], slot["ends_at"])
+                )
+        return busy
+    except PyMongoError as e:
+        return e
+
+
+def save_interview_slots(phase, slots):
+    """
+    Replaces the interview slots of a phase with ``slots``.
+
+    The slots are inserted in one bulk insert under a new allocation_id,
+    then the phase is pointed to it and the slots of the previous allocation
+    are deleted. Readers only see the allocation of the phase, so they never
+    see a mix of both, and a failed insert leaves the previous allocation in
+    place.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param phase: phase containing _id, placement_id & title
+    :type phase: dict
+    :param slots: list of dictionaries containing student_id, panel,
+        starts_at & ends_at
+    :type slots: list
+    :returns: dictionary containing success = True, allocation_id & count
+        of slots
+    :rtype: dict
+    """
+    allocation_id = ObjectId()
+    try:
+        now = datetime.utcnow()
+        if slots:
+            db["interview_slots"].insert_many(
+                [
+                    {
+                        "phase_id": phase["_id"],
+                        "allocation_id": allocation_id,
+                        "placement_id": phase["placement_id"],
+                        "phase_title": phase["title"],
+                        "created_at": now,
+                        **slot,
+                    }
+                    for slot in slots
+                ],
+                ordered=False,
+            )
+    except PyMongoError as e:
+        db["interview_slots"].delete_many({"allocation_id": allocation_id})
+        return e
+    try:
+        db["phases"].update_one(
+            {"_id": phase["_id"]}, {"$set": {"slot_allocation_id": allocation_id}}
+        )
+        db["interview_slots"].delete_many(
+            {"phase_id": phase["_id"], "allocation_id": {"$ne": allocation_id}}
+        )
+        return {"success": True, "allocation_id": allocation_id, "count": len(slots)}
+    except PyMongoError as e:
+        return e
+
+
+def get_interview_slots(phase):
+    """
+    Returns the interview slots of the current allocation of a phase sorted
+    by starts_at & panel, with the student_id, panel, starts_at & ends_at of
+    each.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param phase: phase containing _id & slot_allocation_id
+    :type phase: dict
+    :rtype: list
+    """
+    try:
+        return list(
+            db["interview_slots"]
+            .find(
+                {
+                    "phase_id": phase["_id"],
+                    "allocation_id": phase.get("slot_allocation_id"),
+                },
+                {"_id": 0, "student_id": 1, "panel": 1, "starts_at": 1, "ends_at": 1},
+            )
+            .sort([("starts_at", ASCENDING), ("panel", ASCENDING)])
+        )
+    except PyMongoError as e:
+        return e
+
+
+def get_offer_candidates(year):
+    """
+    Returns the placements of a year with their dream flag, positions and
+    offers, and the students with a "placed" result in them with
+    the preference & registered_at of their registration.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param year: year of the placements
+    :type year: int
+    :returns: dictionary containing the lists of placements & candidates
+    :rtype: dict
+    """
+    try:
+        placements = list(
+            db["placements"].find(
+                {"year": year}, {"dream": 1, "positions": 1, "offers": 1}
+            )
+        )
+        ids = [p["_id"] for p in placements]
+        registrations = {
+            (r["placement_id"], r["student_id"]): r
+            for r in db["registrations"].find(
+                {"placement_id": {"$in": ids}},
+                {
+                    "_id": 0,
+                    "placement_id": 1,
+                    "student_id": 1,
+                    "preference": 1,
+                    "registered_at": 1,
+                },
+            )
+        }
+        candidates = []
+        for result in db["phase_results"].find(
+            {"placement_id": {"$in": ids}, "status": "placed"},
+            {"_id": 0, "placement_id": 1, "student_id": 1},
+        ):
+            registration = registrations.get(
+                (result["placement_id"], result["student_id"]), {}
+            )
+            candidates.append(
+                {
+                    "placement_id": result["placement_id"],
+                    "student_id": result["student_id"],
+                    "preference": registration.get("preference"),
+                    "registered_at": registration.get("registered_at"),
+                }
+            )
+        return {"placements": placements, "candidates": candidates}
+    except PyMongoError as e:
+        return e
+
+
+def save_offer_allocation(allocation):
+    """
+    Replaces the ``offers`` of the placements of an allocation with one bulk
+    write. ``placed_students`` is left to the phase results, so uploading
+    results again does not undo an allocation.
+
+    In case of a PyMongoError it returns the exception.
+
+    :param allocation: dictionary of placement id to list of student ids
+    :type allocation: dict
+    :returns: dictionary containing success = True & count of the modified
+        placements
+    :rtype: dict
+    """
+    try:
+        if not allocation:
+            return {"success": True, "modified": 0}
+        now = datetime.utcnow()
+        result = db["placements"].bulk_write(
+            [
+                UpdateOne(
+                    {"_id": id},
+                    {"$set": {"offers": students, "offers_allocated_at": now}},
+                )
+                for id, students in allocation.items()
+            ],
+            ordered=False,
+        )
+        return {"success": True, "modified": result.modified_count}
+    except PyMongoError as e:
+        return e
+
+
+def migrate_phase_results(batch_size=500):
+    """
+    Moves the results embedded in ``placements.phases[].results`` to the
+    ``phase_results`` collection, writing ``batch_size`` results per bulk
+    write, and removes them from the placements once copied.
+
+    :returns: dictionary containing the count of placements & results moved
+    :rtype: dict
+    """
+    report = {"placements": 0, "results": 0}
+    cursor = (
+        db["placements"]
+        .find(
+            {"phases.results": {"$exists": True}},
+            {"phases.title": 1, "phases.results": 1},
+        )
+        .sort("_id", ASCENDING)
+    )
+    for placement in cursor:
+        requests = []
+        for phase in placement.get("phases", []):
+            for result in phase.get("results") or []:
+                requests.append(
+                    UpdateOne(
+                        {
+                            "placement_id": placement["_id"],
+                            "phase_title": phase["title"],
+                            "student_id": result["student_id"],
+                        },
+                        {
+                            "$setOnInsert": {
+                                "status": result.get("status"),
+                                "updated_at": datetime.utcnow(),
+                            }
+                        },
+                        upsert=True,
+                    )
+                )
+        for start in range(0, len(requests), batch_size):
+            db["phase_results"].bulk_write(
+                requests[start : start + batch_size], ordered=False
+            )
+        db["placements"].update_one(
+            {"_id": placement["_id"]}, {"$unset": {"phases.$[].results": ""}}
+        )
+        report["placements"] += 1
+        report["results"] += len(requests)
+    return report
+
+
+def migrate_registrations(batch_size=500):
+    """
+    Copies the ``registered_students`` arrays of the placements to the
+    ``registrations`` collection, writing ``batch_size`` registrations per
+    bulk write, and removes the arrays once copied.
+
+    :returns: dictionary containing the count of placements & registrations
+    :rtype: dict
+    """
+    report = {"placements": 0, "registrations": 0}
+    cursor = (
+        db["placements"]
+        .find({"registered_students": {"$exists": True}}, {"registered_students": 1})
+        .sort("_id", ASCENDING)
+    )
+    for placement in cursor:
+        # the registration time was not recorded, the placement start is used
+        registered_at = placement["_id"].generation_time.replace(tzinfo=None)
+        requests = [
+            UpdateOne(
+                {"placement_id": placement["_id"], "student_id": student_id},
+                {"$setOnInsert": {"registered_at": registered_at}},
+                upsert=True,
+            )
+            for student_id in placement.get("registered_students") or []
+        ]
+        for start in range(0, len(requests), batch_size):
+            db["registrations"].bulk_write(
+                requests[start : start + batch_size], ordered=False
+            )
+        db["placements"].update_one(
+            {"_id": placement["_id"]}, {"$unset": {"registered_students": ""}}
+        )
+        report["placements"] += 1
+        report["registrations"] += len(requests)
+    return report
+
+
+def backfill_company_snapshots(batch_size=500):
+    """
+    Sets the ``company`` snapshot of the placements created before it
+    existed and of their phases, reading the companies with one query per
+    ``batch_size`` placements. Company ids stored as strings are converted to
+    ObjectIds.
+
+    :returns: dictionary containing the count of updated placements & the
+        ids of placements whose company does not exist or whose company_id is
+        not a valid id
+    :rtype: dict
+    """
+    report = {"updated": 0, "missing_company": []}
+    query = {"company": {"$exists": False}}
+    last_id = None
+    while True:
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        placements = list(
+            db["placements"]
+            .find(query, {"company_id": 1})
+            .sort("_id", ASCENDING)
+            .limit(batch_size)
+        )
+        if not placements:
+            return report
+        last_id = placements[-1]["_id"]
+        for placement in placements:
+            company_id = placement.get("company_id")
+            valid = isinstance(company_id, ObjectId) or ObjectId.is_valid(company_id)
+            placement["company_id"] = ObjectId(company_id) if valid else None
+        company_ids = {p["company_id"] for p in placements if p["company_id"]}
+        companies = {
+            company["_id"]: company
+            for company in db["users"].find(
+                {"_id": {"$in": list(company_ids)}},
+                {"company_name": 1, "concerned_person.email": 1},
+            )
+        }
+        requests, phase_requests = [], []
+        for placement in placements:
+            company = companies.get(placement["company_id"])
+            if company is None:
+                report["missing_company"].append(placement["_id"])
+                continue
+            snapshot = {
+                "company_id": company["_id"],
+                "company": _company_snapshot(company),
+            }
+            requests.append(UpdateOne({"_id": placement["_id"]}, {"$set": snapshot}))
+            # phases moved by `migrate_phases` before this ran
+            phase_requests.append(
+                UpdateMany(
+                    {"placement_id": placement["_id"]},
+                    {"$set": {**snapshot, "updated_at": datetime.utcnow()}},
+                )
+            )
+        if requests:
+            db["phases"].bulk_write(phase_requests, ordered=False)
+            report["updated"] += db["placements"].bulk_write(
+                requests, ordered=False
+            ).modified_count
+
+
+def _phase_status(phase):
+    """Returns the status of a phase embedded in a placement."""
+    if phase.get("completed"):
+        return "completed"
+    if "scheduled_date" in phase:
+        return "upcoming"
+    if "suggested_date" in phase:
+        return "pending"
+    return "unapproved"
+
+
+def _write_phases(requests, copied):
+    """
+    Writes the phases copied from placements, then removes the embedded
+    phases of the placements of ``copied``.
+    """
+    if requests:
+        db["phases"].bulk_write(requests, ordered=False)
+    if copied:
+        db["placements"].update_many(
+            {"_id": {"$in": copied}}, {"$unset": {"phases": ""}}
+        )
+
+
+def migrate_phases(batch_size=500):
+    """
+    Moves the phases embedded in ``placements.phases`` to the ``phases``
+    collection, writing ``batch_size`` phases per bulk write, and removes
+    them from the placements once copied. The results must have been moved
+    with `migrate_phase_results` first.
+
+    A placement having many phases with the same title has its first one
+    copied and keeps all of them embedded, so that no date is lost; the
+    duplicates are reported and can be renamed before running this again.
+
+    :returns: dictionary containing the count of placements & phases moved
+        and the duplicated (placement id, title) pairs
+    :rtype: dict
+    """
+    if db["placements"].count_documents({"phases.results": {"$exists": True}}, limit=1):
+        raise ValueError("Move the phase results first (flask migrate phase-results)")
+    report = {"placements": 0, "phases": 0, "duplicates": []}
+    cursor = (
+        db["placements"]
+        .find(
+            {"phases": {"$exists": True}},
+            {"phases": 1, "company_id": 1, "company": 1, "requirement": 1},
+        )
+        .sort("_id", ASCENDING)
+    )
+    requests, copied = [], []
+    for placement in cursor:
+        titles = set()
+        duplicated = False
+        for phase in placement.get("phases") or []:
+            if phase.get("title") in titles:
+                report["duplicates"].append((placement["_id"], phase.get("title")))
+                duplicated = True
+                continue
+            titles.add(phase.get("title"))
+            title = phase.pop("title", None)
+            requests.append(
+                UpdateOne(
+                    {"placement_id": placement["_id"], "title": title},
+                    {
+                        "$setOnInsert": {
+                            **phase,
+                            "status": _phase_status(phase),
+                            "company_id": placement.get("company_id"),
+                            "company": placement.get("company"),
+                            "requirement": placement.get("requirement"),
+                            "updated_at": phase.get("updated_at", datetime.utcnow()),
+                        }
+                    },
+                    upsert=True,
+                )
+            )
+            report["phases"] += 1
+        if not duplicated:
+            copied.append(placement["_id"])
+        if len(requests) >= batch_size or len(copied) >= batch_size:
+            _write_phases(requests, copied)
+            requests, copied = [], []
+        report["placements"] += 1
+    _write_phases(requests, copied)
+    return report
+
+
+def backfill_phase_ends(duration_minutes, batch_size=500):
+    """
+    Sets ``ends_at`` of the scheduled phases approved before it existed to
+    ``duration_minutes`` after their ``scheduled_date``, writing
+    ``batch_size`` phases per bulk write.
+
+    :returns: dictionary containing the count of updated phases
+    :rtype: dict
+    """
+    report = {"updated": 0}
+    query = {
+        "status": {"$in": SCHEDULED_PHASE_STATUSES},
+        "ends_at": {"$exists": False},
+    }
+    requests = []
+    for phase in db["phases"].find(query, {"scheduled_date": 1, "duration_minutes": 1}):
+        duration = timedelta(minutes=phase.get("duration_minutes") or duration_minutes)
+        requests.append(
+            UpdateOne(
+                {"_id": phase["_id"], "ends_at": {"$exists": False}},
+                {
+                    "$set": {
+                        "ends_at": phase["scheduled_date"] + duration,
+                        # seen by the delta sync & the phase schedules
+                        "updated_at": datetime.utcnow(),
+                    }
+                },
+            )
+        )
+        if len(requests) == batch_size:
+            report["updated"] += db["phases"].bulk_write(requests).modified_count
+            requests = []
+    if requests:
+        report["updated"] += db["phases"].bulk_write(requests).modified_count
+    return report
@@ -1,21 +1,131 @@
+from datetime import datetime
+
 from werkzeug.local import LocalProxy
 
 from bson import ObjectId
 
-from app.db import get_db
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from app.db import get_db, RAW_BSON_CODEC_OPTIONS
 
 db = LocalProxy(get_db)
 
+# Deleted posts & notices are kept as tombstones (deleted: True) so that
+# delta sync clients learn about deletions. They expire after this long;
+# clients with an older watermark get a full list instead.
+TOMBSTONE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+# filter of posts & notices which are not deleted
+LIVE = {"deleted": {"$ne": True}}
+
+# Indexes needed by the queries of this module, created by app/indexes.py
+INDEXES = {
+    "posts": [
+        IndexModel(
+            [("company_id", ASCENDING), ("updated_at", DESCENDING)],
+            name="company_id_updated_at",
+        ),
+        IndexModel([("updated_at", DESCENDING)], name="updated_at"),
+        IndexModel(
+            [("deleted_at", ASCENDING)],
+            name="deleted_at_ttl",
+            expireAfterSeconds=TOMBSTONE_TTL_SECONDS,
+        ),
+    ],
+    "notices": [
+        IndexModel([("updated_at", DESCENDING)], name="updated_at"),
+        IndexModel(
+            [("deleted_at", ASCENDING)],
+            name="deleted_at_ttl",
+            expireAfterSeconds=TOMBSTONE_TTL_SECONDS,
+        ),
+    ],
+}
+
+# Representative shape of every query of this module, checked with explain()
+# by ``flask indexes coverage``. ``full_scan`` marks intended full exports.
+QUERY_SHAPES = [
+    {
+        "name": "get_all_posts",
+        "collection": "posts",
+        "filter": {"deleted": {"$ne": True}},
+        "sort": [("updated_at", DESCENDING)],
+    },
+    {
+        "name": "get_posts_since",
+        "collection": "posts",
+        "filter": {"updated_at": {"$gt": datetime(2020, 5, 8)}},
+        "sort": [("updated_at", ASCENDING)],
+    },
+    {
+        "name": "get_post_by_id",
+        "collection": "posts",
+        "filter": {"company_id": ObjectId(), "deleted": {"$ne": True}},
+        "sort": [("updated_at", DESCENDING)],
+    },
+    {"name": "delete_post", "collection": "posts", "filter": {"_id": ObjectId()}},
+    {
+        "name": "get_all_notices",
+        "collection": "notices",
+        "filter": {"deleted": {"$ne": True}},
+        "sort": [("updated_at", DESCENDING)],
+    },
+    {
+        "name": "get_notices_since",
+        "collection": "notices",
+        "filter": {"updated_at": {"$gt": datetime(2020, 5, 8)}},
+        "sort": [("updated_at", ASCENDING)],
+    },
+    {"name": "delete_notice", "collection": "notices", "filter": {"_id": ObjectId()}},
+]
+
+def _tombstone():
+    now = datetime.utcnow()
+    return {"$set": {"deleted": True, "deleted_at": now, "updated_at": now}}
+
+def _changed_since(collection, since):
+    if since is None:
+        return list(db[collection].find(LIVE).sort("updated_at", 1))
+    return list(db[collection].find({"updated_at": {"$gt": since}}).sort("updated_at", 1))
+
 def get_all_posts():
     try:
-        posts = list(db["posts"].find()).sort({"updated_at":-1})
+        posts = list(db["posts"].find(LIVE).sort("updated_at", -1))
         return posts
     except Exception as e:
         return e
 
+def get_posts_since(since):
+    try:
+        return _changed_since("posts", since)
+    except Exception as e:
+        return e
+
+def _collection_version(collection):
+    latest = db[collection].find_one({}, {"updated_at": 1}, sort=[("updated_at", -1)])
+    return {
+        "count": db[collection].estimated_document_count(),
+        "updated_at": latest.get("updated_at") if latest else None,
+    }
+
+def get_posts_version():
+    try:
+        return _collection_version("posts")
+    except Exception as e:
+        return e
+
+def get_all_posts_cursor(batch_size, raw=False):
+    try:
+        posts = db["posts"]
+        if raw:
+            posts = posts.with_options(codec_options=RAW_BSON_CODEC_OPTIONS)
+        return posts.find(LIVE).sort("updated_at", -1).batch_size(batch_size)
+    except Exception as e:
+        return e
+
 def get_post_by_id(company_id):
     try:        
-        posts = list(db["posts"].find({"company_id":ObjectId(company_id)})).sort({"updated_at":-1})
+        posts = list(db["posts"].find({"company_id":ObjectId(company_id), **LIVE}).sort("updated_at", -1))
         return posts
     except Exception as e:
         return e
@@ -29,38 +139,53 @@ def add_post(post_details):
 
 def delete_post(post_id):
     try:
-        return db["posts"].remove({"_id":ObjectId(post_id)},True)
+        return db["posts"].update_one({"_id":ObjectId(post_id), **LIVE}, _tombstone())
     except Exception as e:
         return e
 
 def delete_post_by_company_id(company_id):
     try:
-        return db["posts"].remove({"company_id":ObjectId(company_id)},True)
+        return db["posts"].update_many({"company_id":ObjectId(company_id), **LIVE}, _tombstone())
     except Exception as e:
         return e
 
 def delete_all_posts():
     try:
-        return db["posts"].remove({})
+        return db["posts"].update_many(LIVE, _tombstone())
     except Exception as e:
         return e
 
 def update_post(post_details):
     try:
-        query = {"_id":ObjectId(post_details["post_id"])}
+        query = {"_id":ObjectId(post_details["post_id"]), **LIVE}
         para = {"$set":{"description":post_details["description"],"title":post_details["title"],"updated_at":post_details["updated_at"]}}
         return db["posts"].update_one(query,para)
     except Exception as e:
         return e
 
     
-def get_all_notices():
+def get_notices_version():
+    try:
+        return _collection_version("notices")
+    except Exception as e:
+        return e
+
+def get_all_notices(raw=False):
     try:
-        notices = list(db["notices"].find()).sort({"updated_at":-1})
+        notices = db["notices"]
+        if raw:
+            notices = notices.with_options(codec_options=RAW_BSON_CODEC_OPTIONS)
+        notices = list(notices.find(LIVE).sort("updated_at", -1))
         return notices
     except Exception as e:
         return e
 
+def get_notices_since(since):
+    try:
+        return _changed_since("notices", since)
+    except Exception as e:
+        return e
+
 def add_notice(notice_details):
     try:
         return db["notices"].insert_one(notice_details)
@@ -69,19 +194,19 @@ def add_notice(notice_details):
 
 def delete_notice(notice_id):
     try:
-        return db["notices"].remove({"_id":ObjectId(notice_id)},True)
+        return db["notices"].update_one({"_id":ObjectId(notice_id), **LIVE}, _tombstone())
     except Exception as e:
         return e
 
 def delete_all_notices():
     try:
-        return db["notices"].remove({})
+        return db["notices"].update_many(LIVE, _tombstone())
     except Exception as e:
         return e
 
 def update_notice(notice_details):
     try:
-        query = {"_id":ObjectId(notice_details["notice_id"])}
+        query = {"_id":ObjectId(notice_details["notice_id"]), **LIVE}
         para = {"$set":{"description":notice_details["description"],"title":notice_details["title"],"updated_at":notice_details["updated_at"]}}
         return db["notices"].update_one(query,para)
     except Exception as e:
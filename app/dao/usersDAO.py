@@ -1,95 +1,399 @@
-from datetime import datetime, timezone
+from datetime import datetime
 
 from werkzeug.local import LocalProxy
 
 from bson import ObjectId
 
-from app.db import get_db
+from app.db import get_db, RAW_BSON_CODEC_OPTIONS
+from app.dao.placementsDAO import (
+    count_passed_students,
+    count_registrations,
+    get_placement_phases,
+    update_company_snapshot,
+)
 
-from pymongo.errors import PyMongoError, DuplicateKeyError
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import PyMongoError, DuplicateKeyError, BulkWriteError
 
 db = LocalProxy(get_db)
 
+# Indexes needed by the queries of this module, created by app/indexes.py
+INDEXES = {
+    "users": [
+        # login_email is missing until `backfill_login_email` has run
+        IndexModel(
+            [("login_email", ASCENDING)],
+            name="login_email",
+            unique=True,
+            partialFilterExpression={"login_email": {"$exists": True}},
+        ),
+        # listings are paginated on _id, so it follows the equality fields
+        IndexModel([("role", ASCENDING), ("_id", ASCENDING)], name="role_id"),
+        IndexModel(
+            [("role", ASCENDING), ("profile_completed", ASCENDING), ("_id", ASCENDING)],
+            name="role_profile_completed_id",
+        ),
+        IndexModel(
+            [("role", ASCENDING), ("company_name", ASCENDING)],
+            name="role_company_name",
+        ),
+        IndexModel([("roll_number", ASCENDING)], name="roll_number"),
+    ]
+}
 
-def get_all_users():
+# Representative shape of every query of this module, checked with explain()
+# by ``flask indexes coverage``. ``full_scan`` marks intended full exports.
+QUERY_SHAPES = [
+    {
+        "name": "get_all_users",
+        "collection": "users",
+        "filter": {"_id": {"$gt": ObjectId()}},
+        "sort": [("_id", ASCENDING)],
+    },
+    {"name": "get_user_by_id", "collection": "users", "filter": {"_id": ObjectId()}},
+    {
+        "name": "get_all_students",
+        "collection": "users",
+        "filter": {"role": "student", "_id": {"$gt": ObjectId()}},
+        "sort": [("_id", ASCENDING)],
+    },
+    {
+        "name": "get_all_companies",
+        "collection": "users",
+        "filter": {"role": "company", "_id": {"$gt": ObjectId()}},
+        "sort": [("_id", ASCENDING)],
+    },
+    {
+        "name": "get_students_by_ids_or_roll_numbers",
+        "collection": "users",
+        "filter": {
+            "role": "student",
+            "$or": [
+                {"_id": {"$in": [ObjectId()]}},
+                {"roll_number": {"$in": ["17CE1001"]}},
+            ],
+        },
+    },
+    {
+        "name": "get_user_by_email",
+        "collection": "users",
+        "filter": {"login_email": "a@b.c"},
+    },
+    {
+        "name": "get_approved_companies",
+        "collection": "users",
+        "filter": {"role": "company", "approved_date": {"$exists": True}},
+        "sort": [("_id", ASCENDING)],
+    },
+    {
+        "name": "get_unapproved_companies",
+        "collection": "users",
+        "filter": {
+            "role": "company",
+            "approved_date": {"$exists": False},
+            "profile_completed": True,
+        },
+        "sort": [("_id", ASCENDING)],
+    },
+    {
+        "name": "get_approved_students",
+        "collection": "users",
+        "filter": {"role": "student", "approved_date": {"$exists": True}},
+        "sort": [("_id", ASCENDING)],
+    },
+    {
+        "name": "get_unapproved_students",
+        "collection": "users",
+        "filter": {
+            "role": "student",
+            "approved_date": {"$exists": False},
+            "profile_completed": True,
+        },
+        "sort": [("_id", ASCENDING)],
+    },
+    {
+        "name": "get_comapany_id_by_name",
+        "collection": "users",
+        "filter": {"role": "company", "company_name": "name"},
+    },
+    {
+        "name": "current_placement_details",
+        "collection": "placements",
+        "filter": {"company_id": ObjectId()},
+        "sort": [("year", DESCENDING)],
+    },
+]
+
+# fields of a user needed to log in and build the access token
+LOGIN_PROJECTION = {
+    "role": 1,
+    "password": 1,
+    "email": 1,
+    "full_name": 1,
+    "company_name": 1,
+    "concerned_person.email": 1,
+    "approved_date": 1,
+}
+
+
+def normalize_email(email):
+    """
+    Returns the form of an email stored in ``login_email``.
+
+    :param email: email address
+    :type email: str
+    :rtype: str
+    """
+    return email.strip().lower()
+
+
+def _login_email(userdata):
+    """
+    Returns the normalized login email of a user document or profile update,
+    students have ``email`` and companies ``concerned_person.email`` (nested
+    or as a dotted key).
+    """
+    email = (
+        userdata.get("email")
+        or (userdata.get("concerned_person") or {}).get("email")
+        or userdata.get("concerned_person.email")
+    )
+    return normalize_email(email) if isinstance(email, str) else None
+
+
+def _find_users_page(query, projection, limit=None, after=None):
+    """
+    Returns a page of users matching ``query`` ordered by ``_id``.
+    Sort, limit and projection are executed by the server, so only the
+    requested page is transferred.
+
+    :param query: filter of the users
+    :type query: dict
+    :param projection: projection of the users
+    :type projection: dict
+    :param limit: maximum number of users to return, all if None
+    :type limit: int
+    :param after: ``_id`` of the last user of the previous page
+    :type after: str
+    :returns: list of users
+    :rtype: list
+    """
+    if after is not None:
+        query = {**query, "_id": {"$gt": ObjectId(after)}}
+    cursor = db["users"].find(query, projection).sort("_id", ASCENDING)
+    if limit:
+        cursor = cursor.limit(limit)
+    return list(cursor)
+
+
+def get_all_users(limit=None, after=None):
     try:
-        return list(db["users"].find({}, {"password": 0}))
+        return _find_users_page({}, {"password": 0}, limit, after)
     except Exception as e:
         return e
 
 
-def get_user_by_id(id):
+def get_all_users_cursor(batch_size):
     try:
-        return db["users"].find_one({"_id": ObjectId(id)})
+        return (
+            db["users"]
+            .find({}, {"password": 0})
+            .sort("_id", ASCENDING)
+            .batch_size(batch_size)
+        )
+    except Exception as e:
+        return e
+
+
+def get_students_eligibility_cursor(batch_size):
+    try:
+        return (
+            db["users"]
+            .find(
+                {"role": "student"},
+                {"sem_marks": 1, "gender": 1, "live_backlog": 1},
+            )
+            .batch_size(batch_size)
+        )
     except Exception as e:
         return e
 
 
-def get_all_students():
+def get_user_by_id(id, raw=False):
     try:
-        return list(db["users"].find({"role": "student"}, {"password": 0}))
+        users = db["users"]
+        if raw:
+            users = users.with_options(codec_options=RAW_BSON_CODEC_OPTIONS)
+        return users.find_one({"_id": ObjectId(id)})
     except Exception as e:
         return e
 
 
-def get_all_companies():
+def get_user_version(id):
     try:
-        return list(db["users"].find({"role": "company"}, {"password": 0}))
+        user = db["users"].find_one({"_id": ObjectId(id)}, {"updated_at": 1})
+        if user is None or "updated_at" not in user:
+            return None
+        return {"count": 1, "updated_at": user["updated_at"]}
     except Exception as e:
         return e
 
 
+def get_all_students(limit=None, after=None):
+    try:
+        return _find_users_page({"role": "student"}, {"password": 0}, limit, after)
+    except Exception as e:
+        return e
+
+
+def get_all_companies(limit=None, after=None):
+    try:
+        return _find_users_page({"role": "company"}, {"password": 0}, limit, after)
+    except Exception as e:
+        return e
+
+
+# precondition of approving or rejecting a user
+NOT_APPROVED = {"approved_date": {"$exists": False}}
+
+
+def _approval_error(id):
+    """
+    Returns the error of an approval whose precondition did not match.
+    """
+    if db["users"].find_one({"_id": ObjectId(id)}, {"_id": 1}) is None:
+        return ValueError("No such user found!")
+    return Exception("User is already approved")
+
+
+# every approval or rejection writes the id of its call (``batch``), which
+# tells a bulk approval the documents it wrote from those of concurrent calls
+def _approve_update(now, batch):
+    return {"$set": {"approved_date": now, "approval_batch": batch, "updated_at": now}}
+
+
+def _reject_update(now, reason, batch):
+    return {
+        "$set": {"profile_completed": False, "updated_at": now},
+        "$push": {"rejected": {"rejected_date": now, "reason": reason, "batch": batch}},
+    }
+
+
 def approve_user(id):
+    """
+    Approves a user which is not approved yet and returns the updated user.
+    """
     try:
-        user = db["users"].find_one({"_id": ObjectId(id)})
-        if user is None:
-            raise ValueError("No such user found!")
-        if "approved_date" in user:
-            raise Exception("User is already approved")
-        result = db["users"].update_one(
-            {"_id": ObjectId(id)}, {"$set": {"approved_date": datetime.utcnow()}}
+        user = db["users"].find_one_and_update(
+            {"_id": ObjectId(id), **NOT_APPROVED},
+            _approve_update(datetime.utcnow(), ObjectId()),
+            return_document=ReturnDocument.AFTER,
         )
-        if result.matched_count == 0:
-            raise ValueError("No such user found")
-        if result.modified_count == 0:
-            raise ValueError("No document updated")
-        return result
+        if user is None:
+            raise _approval_error(id)
+        return user
     except PyMongoError as e:
         return e
 
 
 def reject_user(id, reason):
+    """
+    Rejects a user which is not approved yet and returns the updated user.
+    """
     try:
-        user = db["users"].find_one({"_id": ObjectId(id)})
-        if user is None:
-            raise ValueError("No such user found!")
-        if "approved_date" in user:
-            raise Exception("User is already approved")
-        result = db["users"].update(
-            {"_id": ObjectId(id)},
-            {
-                "$set": {"profile_completed": False},
-                "$push": {
-                    "rejected": {"rejected_date": datetime.utcnow(), "reason": reason}
-                },
-            },
+        user = db["users"].find_one_and_update(
+            {"_id": ObjectId(id), **NOT_APPROVED},
+            _reject_update(datetime.utcnow(), reason, ObjectId()),
+            return_document=ReturnDocument.AFTER,
         )
-        print("result", result)
-        return result
+        if user is None:
+            raise _approval_error(id)
+        return user
+    except PyMongoError as e:
+        return e
+
+
+def bulk_set_approval(ids, approve, reason=None):
+    """
+    Approves (or rejects with ``reason``) the users of ``ids`` which are not
+    approved yet with one bulk write, and returns the outcome of every id:
+    "approved" or "rejected", "already_approved", "not_found" or "invalid_id".
+    """
+    try:
+        now = datetime.utcnow()
+        batch = ObjectId()
+        if approve:
+            update = _approve_update(now, batch)
+        else:
+            update = _reject_update(now, reason, batch)
+        outcomes, object_ids = {}, []
+        for id in ids:
+            if isinstance(id, str) and ObjectId.is_valid(id):
+                object_ids.append(ObjectId(id))
+            else:
+                outcomes[str(id)] = "invalid_id"
+        if object_ids:
+            db["users"].bulk_write(
+                [UpdateOne({"_id": id, **NOT_APPROVED}, update) for id in object_ids],
+                ordered=False,
+            )
+        users = {
+            user["_id"]: user
+            for user in db["users"].find(
+                {"_id": {"$in": object_ids}}, {"approval_batch": 1, "rejected.batch": 1}
+            )
+        }
+        for id in object_ids:
+            user = users.get(id)
+            if user is None:
+                outcomes[str(id)] = "not_found"
+            elif approve and user.get("approval_batch") == batch:
+                outcomes[str(id)] = "approved"
+            elif not approve and any(
+                r.get("batch") == batch for r in user.get("rejected", [])
+            ):
+                outcomes[str(id)] = "rejected"
+            else:
+                outcomes[str(id)] = "already_approved"
+        return outcomes
     except PyMongoError as e:
         return e
 
 
+def _with_login_email(data):
+    """
+    Returns a profile update with the ``login_email`` of its email, if it
+    has one.
+    """
+    login_email = _login_email(data)
+    if login_email is None:
+        return data
+    return {**data, "login_email": login_email}
+
+
+EMAIL_TAKEN = "A user with the given email already exists."
+
+
 def create_profile(id, profile_data):
     try:
+        profile_data = _with_login_email(profile_data)
         result = db["users"].update_one(
-            {"_id": ObjectId(id)}, {"$set": {"profile_completed": True, **profile_data}}
+            {"_id": ObjectId(id)},
+            {
+                "$set": {
+                    "profile_completed": True,
+                    **profile_data,
+                    "updated_at": datetime.utcnow(),
+                }
+            },
         )
         if result.matched_count == 0:
             raise ValueError("No such user found")
         if result.modified_count == 0:
             raise ValueError("No document updated")
         return result
+    except DuplicateKeyError:
+        return ValueError(EMAIL_TAKEN)
     except PyMongoError as e:
         return e
 
@@ -101,92 +405,211 @@ def update_profile(id, data):
         but for now let it be
     """
     try:
+        data = _with_login_email(data)
         result = db["users"].update_one(
-            {"_id": ObjectId(id)}, {"$set": {"profile_completed": True, **data}}
+            {"_id": ObjectId(id)},
+            {
+                "$set": {
+                    "profile_completed": True,
+                    **data,
+                    "updated_at": datetime.utcnow(),
+                }
+            },
         )
         if result.matched_count == 0:
             raise ValueError("No such user found")
         if result.modified_count == 0:
             raise ValueError("No document updated")
+        # placements keep a copy of the company name & email
+        update_company_snapshot(id, data)
         return result
+    except DuplicateKeyError:
+        return ValueError(EMAIL_TAKEN)
     except PyMongoError as e:
         return e
 
 
 def create_user(userdata):
     try:
-        result = db["users"].insert_one({**userdata})
+        result = db["users"].insert_one(
+            {
+                **userdata,
+                "login_email": _login_email(userdata),
+                "updated_at": datetime.utcnow(),
+            }
+        )
         return {"success": True, "_id": result.inserted_id}
+    except DuplicateKeyError:
+        return {"error": EMAIL_TAKEN}
+    except PyMongoError as e:
+        return e
+
+
+def get_students_by_ids_or_roll_numbers(ids, roll_numbers):
+    """
+    Returns the _id & roll_number of the students having one of ``ids`` or
+    ``roll_numbers``, in one query.
+
+    :param ids: list of `bson.ObjectId`
+    :type ids: list
+    :param roll_numbers: list of roll numbers
+    :type roll_numbers: list
+    :returns: list of students
+    :rtype: list
+    """
+    try:
+        return list(
+            db["users"].find(
+                {
+                    "role": "student",
+                    "$or": [
+                        {"_id": {"$in": ids}},
+                        {"roll_number": {"$in": roll_numbers}},
+                    ],
+                },
+                {"roll_number": 1},
+            )
+        )
+    except PyMongoError as e:
+        return e
+
+
+def update_password_hash(id, old_hash, new_hash):
+    """
+    Replaces the password hash of a user, unless the password was changed
+    since ``old_hash`` was read.
+    """
+    try:
+        return db["users"].update_one(
+            {"_id": ObjectId(id), "password": old_hash},
+            {"$set": {"password": new_hash}},
+        )
     except PyMongoError as e:
         return e
 
 
 def get_user_by_email(email):
+    """
+    Returns the login fields (`LOGIN_PROJECTION`) of the user with an email,
+    compared case-insensitively.
+    """
     try:
         return db["users"].find_one(
-            {"$or": [{"email": email}, {"concerned_person.email": email}]}
+            {"login_email": normalize_email(email)}, LOGIN_PROJECTION
         )
     except Exception as e:
         return e
 
 
-def get_approved_companies():
-    try:
-        return list(
-            db["users"].find(
-                {"role": "company", "approved_date": {"$exists": True}},
-                {
-                    "company_name": 1,
-                    "concerned_person": 1,
-                    "contact": 1,
-                    "email": 1,
-                    "approved_date": 1,
-                },
+def backfill_login_email(batch_size=500):
+    """
+    Sets ``login_email`` of the users created before it existed, in batches
+    of ``batch_size`` updates.
+
+    Users whose normalized email is already taken by another user are left
+    without ``login_email`` and reported as conflicts.
+
+    :returns: dictionary of updated count, conflicting & missing email ids
+    :rtype: dict
+    """
+    report = {"updated": 0, "conflicts": [], "missing_email": []}
+    query = {"login_email": {"$exists": False}}
+    last_id = None
+    while True:
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        users = list(
+            db["users"]
+            .find(query, {"email": 1, "concerned_person.email": 1})
+            .sort("_id", ASCENDING)
+            .limit(batch_size)
+        )
+        if not users:
+            return report
+        last_id = users[-1]["_id"]
+        requests, ids = [], []
+        for user in users:
+            login_email = _login_email(user)
+            if login_email is None:
+                report["missing_email"].append(user["_id"])
+                continue
+            requests.append(
+                UpdateOne(
+                    {"_id": user["_id"], "login_email": {"$exists": False}},
+                    {"$set": {"login_email": login_email}},
+                )
             )
+            ids.append(user["_id"])
+        if not requests:
+            continue
+        try:
+            result = db["users"].bulk_write(requests, ordered=False)
+            report["updated"] += result.modified_count
+        except BulkWriteError as e:
+            report["updated"] += e.details["nModified"]
+            for error in e.details["writeErrors"]:
+                if error["code"] != 11000:
+                    raise
+                report["conflicts"].append(ids[error["index"]])
+
+
+def get_approved_companies(limit=None, after=None):
+    try:
+        return _find_users_page(
+            {"role": "company", "approved_date": {"$exists": True}},
+            {
+                "company_name": 1,
+                "concerned_person": 1,
+                "contact": 1,
+                "email": 1,
+                "approved_date": 1,
+            },
+            limit,
+            after,
         )
     except Exception as e:
         return e
 
 
-def get_unapproved_companies():
+def get_unapproved_companies(limit=None, after=None):
     try:
-        return list(
-            db["users"].find(
-                {
-                    "role": "company",
-                    "approved_date": {"$exists": False},
-                    "profile_completed": True,
-                },
-                {"company_name": 1, "concerned_person": 1, "contact": 1, "email": 1},
-            )
+        return _find_users_page(
+            {
+                "role": "company",
+                "approved_date": {"$exists": False},
+                "profile_completed": True,
+            },
+            {"company_name": 1, "concerned_person": 1, "contact": 1, "email": 1},
+            limit,
+            after,
         )
     except Exception as e:
         return e
 
 
-def get_approved_students():
+def get_approved_students(limit=None, after=None):
     try:
-        return list(
-            db["users"].find(
-                {"role": "student", "approved_date": {"$exists": True}},
-                {"full_name": 1, "class": 1, "roll_number": 1, "department": 1},
-            )
+        return _find_users_page(
+            {"role": "student", "approved_date": {"$exists": True}},
+            {"full_name": 1, "class": 1, "roll_number": 1, "department": 1},
+            limit,
+            after,
         )
     except Exception as e:
         return e
 
 
-def get_unapproved_students():
+def get_unapproved_students(limit=None, after=None):
     try:
-        return list(
-            db["users"].find(
-                {
-                    "role": "student",
-                    "approved_date": {"$exists": False},
-                    "profile_completed": True,
-                },
-                {"full_name": 1, "class": 1, "roll_number": 1, "department": 1},
-            )
+        return _find_users_page(
+            {
+                "role": "student",
+                "approved_date": {"$exists": False},
+                "profile_completed": True,
+            },
+            {"full_name": 1, "class": 1, "roll_number": 1, "department": 1},
+            limit,
+            after,
         )
     except Exception as e:
         return e
@@ -459,83 +882,242 @@ def get_not_eligible_companies(student_id):
         return e
 
 
-def current_placement_details(company_id):
+# strings read as true in the eligibility, as in app/shortlist.py
+_TRUE_STRINGS = ["true", "yes", "y", "1"]
+
+
+def _to_double(value):
+    """
+    Returns an aggregation expression converting ``value`` (like "7.5") to a
+    double, or null when it is missing or not a number.
+    """
+    return {
+        "$convert": {"input": value, "to": "double", "onError": None, "onNull": None}
+    }
+
+
+def _to_bool(value):
+    """
+    Returns an aggregation expression reading ``value`` as a boolean like
+    ``app.shortlist``: strings are true if "true", "yes", "y" or "1", other
+    values by their truthiness.
+    """
+    return {
+        "$cond": [
+            {"$eq": [{"$type": value}, "string"]},
+            {"$in": [{"$toLower": {"$trim": {"input": value}}}, _TRUE_STRINGS]},
+            {"$and": [value]},
+        ]
+    }
+
+
+def get_eligibility(student_id):
+    """
+    Splits all placements into the ones the student is eligible and not
+    eligible for, in a single aggregation. Every placement is evaluated once
+    and every not eligible placement carries the failed criteria in
+    ``reasons`` ("sgpa", "live_backlog" and/or "gender").
+
+    In case of a PyMongoError it returns the exception.
+
+    :param student_id: id of the student
+    :type student_id: str
+    :returns: dictionary containing eligible_companies & not_eligible_companies
+    :rtype: dict
+    """
     try:
         return (
-            db["placements"].aggregate(
+            db["users"]
+            .aggregate(
                 [
-                    {"$match": {"company_id": ObjectId(company_id)}},
+                    {"$match": {"_id": ObjectId(student_id)}},
                     {
                         "$project": {
-                            "result": {
-                                "$map": {
-                                    "input": "$phases",
-                                    "as": "phase",
-                                    "in": {
-                                        "title": "$$phase.title",
-                                        "status": {
-                                            "$switch": {
-                                                "branches": [
-                                                    {
-                                                        "case": {
-                                                            "$eq": [
-                                                                "$$phase.completed",
-                                                                True,
-                                                            ]
-                                                        },
-                                                        "then": "Completed",
-                                                    },
-                                                    {
-                                                        "case": {
-                                                            "$gt": [
-                                                                "$$phase.scheduled_date",
-                                                                datetime(
-                                                                    2020,
-                                                                    5,
-                                                                    8,
-                                                                    0,
-                                                                    0,
-                                                                    0,
-                                                                    tzinfo=timezone.utc,
-                                                                ),
-                                                            ]
-                                                        },
-                                                        "then": "upcoming",
-                                                    },
-                                                    {
-                                                        "case": {
-                                                            "$eq": [
-                                                                {
-                                                                    "$ifNull": [
-                                                                        "$$phase.scheduled_date",
-                                                                        False,
-                                                                    ]
-                                                                },
-                                                                False,
-                                                            ]
-                                                        },
-                                                        "then": "pending",
-                                                    },
-                                                ],
-                                                "default": "ongoing",
+                            "gender": {"$toLower": {"$ifNull": ["$gender", ""]}},
+                            "sgpa": {
+                                "$avg": {
+                                    "$map": {
+                                        "input": {"$ifNull": ["$sem_marks", []]},
+                                        "in": _to_double("$$this"),
+                                    }
+                                }
+                            },
+                            "live_backlog": _to_bool("$live_backlog"),
+                        }
+                    },
+                    {
+                        "$lookup": {
+                            "from": "placements",
+                            "let": {
+                                "gender": "$gender",
+                                "sgpa": "$sgpa",
+                                "live_backlog": "$live_backlog",
+                            },
+                            "pipeline": [
+                                {
+                                    "$project": {
+                                        "company_id": 1,
+                                        "sgpa": _to_double("$eligibility.sgpa"),
+                                        "live_backlog": {
+                                            "$ifNull": [
+                                                "$eligibility.live_backlog",
+                                                None,
+                                            ]
+                                        },
+                                        "gender": {
+                                            "$toLower": {
+                                                "$ifNull": [
+                                                    "$eligibility.gender",
+                                                    "any",
+                                                ]
                                             }
                                         },
-                                        "date": {
-                                            "$ifNull": [
-                                                "$$phase.scheduled_date",
-                                                "pending",
+                                    }
+                                },
+                                # the criteria of StudentColumns.mask: a missing
+                                # criterion does not restrict the student
+                                {
+                                    "$project": {
+                                        "company_id": 1,
+                                        "sgpa": {
+                                            "$or": [
+                                                {"$eq": ["$sgpa", None]},
+                                                {
+                                                    "$and": [
+                                                        {"$ne": ["$$sgpa", None]},
+                                                        {"$gte": ["$$sgpa", "$sgpa"]},
+                                                    ]
+                                                },
+                                            ]
+                                        },
+                                        "live_backlog": {
+                                            "$or": [
+                                                {"$eq": ["$live_backlog", None]},
+                                                _to_bool("$live_backlog"),
+                                                {"$not": ["$$live_backlog"]},
+                                            ]
+                                        },
+                                        "gender": {
+                                            "$or": [
+                                                {"$eq": ["$gender", "any"]},
+                                                {"$eq": ["$gender", "$$gender"]},
+                                            ]
+                                        },
+                                    }
+                                },
+                                {
+                                    "$lookup": {
+                                        "from": "users",
+                                        "localField": "company_id",
+                                        "foreignField": "_id",
+                                        "as": "company",
+                                    }
+                                },
+                                {
+                                    "$project": {
+                                        "_id": "$company_id",
+                                        "placement_id": "$_id",
+                                        "company_name": {
+                                            "$arrayElemAt": ["$company.company_name", 0]
+                                        },
+                                        "reasons": {
+                                            "$concatArrays": [
+                                                {"$cond": ["$sgpa", [], ["sgpa"]]},
+                                                {
+                                                    "$cond": [
+                                                        "$live_backlog",
+                                                        [],
+                                                        ["live_backlog"],
+                                                    ]
+                                                },
+                                                {"$cond": ["$gender", [], ["gender"]]},
                                             ]
                                         },
+                                    }
+                                },
+                            ],
+                            "as": "placements",
+                        }
+                    },
+                    {
+                        "$project": {
+                            "eligible_companies": {
+                                "$map": {
+                                    "input": {
+                                        "$filter": {
+                                            "input": "$placements",
+                                            "cond": {
+                                                "$eq": [{"$size": "$$this.reasons"}, 0]
+                                            },
+                                        }
+                                    },
+                                    "in": {
+                                        "_id": "$$this._id",
+                                        "placement_id": "$$this.placement_id",
+                                        "company_name": "$$this.company_name",
                                     },
                                 }
                             },
-                            "total_appeared": {"$size": "$registered_students"},
-                            "total_passed": {"$size": "$passed_students"},
-                            "total_placed": {"$size": "$placed_students"},
+                            "not_eligible_companies": {
+                                "$filter": {
+                                    "input": "$placements",
+                                    "cond": {"$gt": [{"$size": "$$this.reasons"}, 0]},
+                                }
+                            },
                         }
                     },
                 ]
             )
-        ).next()
+            .next()
+        )
+    except PyMongoError as e:
+        return e
+
+
+# status of a phase shown in the placement details
+_PHASE_DETAIL_STATUS = {
+    "unapproved": "pending",
+    "pending": "pending",
+    "upcoming": "upcoming",
+    "ongoing": "ongoing",
+    "completed": "Completed",
+}
+
+
+def current_placement_details(company_id):
+    try:
+        placement = db["placements"].find_one(
+            {"company_id": ObjectId(company_id)},
+            {"placed_students": 1, "offers": 1},
+            sort=[("year", DESCENDING)],
+        )
+        if placement is None:
+            raise ValueError("No placement of that company")
+        phases = get_placement_phases(placement["_id"])
+        total_appeared = count_registrations(placement["_id"])
+        total_passed = count_passed_students(placement["_id"])
+        for value in (phases, total_appeared, total_passed):
+            if isinstance(value, Exception):
+                raise value
+        return {
+            "_id": placement["_id"],
+            "result": [
+                {
+                    "title": phase.get("title"),
+                    "status": _PHASE_DETAIL_STATUS.get(phase.get("status"), "ongoing"),
+                    "date": phase.get("scheduled_date", "pending"),
+                }
+                for phase in phases
+            ],
+            # the offers of the allocation replace the "placed" results
+            "total_placed": len(
+                placement["offers"]
+                if "offers" in placement
+                else placement.get("placed_students") or []
+            ),
+            # registrations & results are counted from their own collections
+            "total_appeared": total_appeared,
+            "total_passed": total_passed,
+        }
     except PyMongoError as e:
         return e
@@ -1,7 +1,146 @@
+import os
+import threading
+
 from flask import current_app, g
 from werkzeug.local import LocalProxy
 from bson import ObjectId
-from pymongo import MongoClient
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import MongoClient, monitoring
+
+# One MongoClient per process. pymongo clients are not fork-safe, so the pid
+# that created the client is remembered and a new one is built after a fork.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+# codec options of collections read without decoding documents into dicts,
+# see app/rawjson.py
+RAW_BSON_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Counts connection pool events of the process-wide client so the pool
+    size and the number of workers can be tuned.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.pools = 0
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.checked_out = 0
+            self.checkout_failures = 0
+            self.checkout_timeouts = 0
+
+    def _incr(self, name, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def pool_created(self, event):
+        self._incr("pools")
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        self._incr("pools", -1)
+
+    def connection_created(self, event):
+        self._incr("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr("connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incr("checkout_failures")
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            self._incr("checkout_timeouts")
+
+    def connection_checked_out(self, event):
+        self._incr("checked_out")
+
+    def connection_checked_in(self, event):
+        self._incr("checked_out", -1)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "pools": self.pools,
+                "open_connections": self.connections_created - self.connections_closed,
+                "connections_created": self.connections_created,
+                "connections_closed": self.connections_closed,
+                "checked_out": self.checked_out,
+                "checkout_failures": self.checkout_failures,
+                "checkout_timeouts": self.checkout_timeouts,
+            }
+
+
+pool_stats = PoolStatsListener()
+
+
+def get_client():
+    """
+    Returns the process-wide ``MongoClient``, creating it on first use
+    (and again in a child process after a fork).
+
+    The pool is configured from ``MONGO_MAX_POOL_SIZE``, ``MONGO_MIN_POOL_SIZE``,
+    ``MONGO_WAIT_QUEUE_TIMEOUT_MS`` and ``MONGO_MAX_IDLE_TIME_MS``.
+
+    :returns: ``client`` shared by all requests of this process
+    :rtype: `pymongo.mongo_client.MongoClient`_
+    .. _pymongo.mongo_client.MongoClient: https://pymongo.readthedocs.io/en/stable/api/pymongo/mongo_client.html
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            config = current_app.config
+            if _client_pid != pid:
+                # sockets inherited from the parent must not be used here
+                pool_stats.reset()
+            _client = MongoClient(
+                config["DB_URI"],
+                maxPoolSize=config["MONGO_MAX_POOL_SIZE"],
+                minPoolSize=config["MONGO_MIN_POOL_SIZE"],
+                waitQueueTimeoutMS=config["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+                maxIdleTimeMS=config["MONGO_MAX_IDLE_TIME_MS"],
+                event_listeners=[pool_stats],
+                connect=False,
+            )
+            _client_pid = pid
+    return _client
+
+
+def get_pool_stats():
+    """
+    Returns connection pool statistics of the process-wide client.
+
+    :returns: dictionary containing pid, pool options and event counters
+    :rtype: dict
+    """
+    config = current_app.config
+    return {
+        "pid": os.getpid(),
+        "max_pool_size": config["MONGO_MAX_POOL_SIZE"],
+        "min_pool_size": config["MONGO_MIN_POOL_SIZE"],
+        "wait_queue_timeout_ms": config["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+        "max_idle_time_ms": config["MONGO_MAX_IDLE_TIME_MS"],
+        **pool_stats.to_dict(),
+    }
 
 
 def get_db():
@@ -13,8 +152,7 @@ def get_db():
     .. _pymongo.database.Database: https://pymongo.readthedocs.io/en/stable/api/pymongo/database.html?highlight=Database#pymongo.database.Database
     """
     db = getattr(g, "_database", None)
-    DB_URI = current_app.config["DB_URI"]
     DB_NAME = current_app.config["DB_NAME"]
     if db is None:
-        db = g._database = MongoClient(DB_URI,)[DB_NAME]
+        db = g._database = get_client()[DB_NAME]
     return db
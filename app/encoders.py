@@ -0,0 +1,64 @@
+"""
+This module contains the JSON encoders of the app. The encoder is selected
+with the ``JSON_ENCODER`` configuration ("canonical" or "fast").
+"""
+import base64
+import uuid
+from datetime import date, datetime, timezone
+
+from flask.json import JSONEncoder
+
+from bson import json_util, ObjectId, Decimal128
+
+
+class MongoJsonEncoder(JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        return json_util.default(obj, json_util.CANONICAL_JSON_OPTIONS)
+
+
+def _encode_datetime(obj):
+    # dates read from MongoDB are naive and in UTC
+    if obj.tzinfo is not None:
+        obj = obj.astimezone(timezone.utc).replace(tzinfo=None)
+    return obj.isoformat(timespec="milliseconds") + "Z"
+
+
+def _encode_bytes(obj):
+    return base64.b64encode(obj).decode("ascii")
+
+
+class FastMongoJsonEncoder(JSONEncoder):
+    """
+    JSON encoder which converts BSON types with a dispatch table on the exact
+    type instead of going through ``json_util``. Dates are written as compact
+    ISO 8601 strings (``2020-05-08T10:00:00.000Z``) instead of
+    ``{"$date": {"$numberLong": ...}}``.
+
+    Types missing from ``dispatch`` are looked up by their base classes and
+    finally handed to ``json_util``.
+    """
+
+    dispatch = {
+        ObjectId: str,
+        datetime: _encode_datetime,
+        date: date.isoformat,
+        Decimal128: str,
+        bytes: _encode_bytes,
+        uuid.UUID: str,
+    }
+
+    def default(self, obj):
+        encode = self.dispatch.get(type(obj))
+        if encode is None:
+            for base in type(obj).__mro__[1:]:
+                encode = self.dispatch.get(base)
+                if encode is not None:
+                    break
+            else:
+                return json_util.default(obj, json_util.CANONICAL_JSON_OPTIONS)
+        return encode(obj)
+
+
+JSON_ENCODERS = {"canonical": MongoJsonEncoder, "fast": FastMongoJsonEncoder}
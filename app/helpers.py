@@ -1,3 +1,12 @@
+import base64
+from datetime import datetime, timedelta
+
+from flask import current_app, jsonify, request
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
 def expect(input, expectedType, field):
     """
     Checks if the input field is of the expectedType
@@ -16,3 +25,166 @@ def expect(input, expectedType, field):
         return input
     else:
         raise AssertionError(f"No {field}!")
+
+
+def encode_cursor(id):
+    """
+    Encodes the ``_id`` of the last document of a page into an opaque cursor.
+
+    :param id: ``_id`` of the last document of a page
+    :type id: `bson.ObjectId`
+    :returns: url safe cursor
+    :rtype: str
+    """
+    return base64.urlsafe_b64encode(ObjectId(id).binary).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor made by `encode_cursor`.
+
+    :param cursor: cursor of the previous page
+    :type cursor: str
+    :returns: ``_id`` of the last document of the previous page
+    :rtype: `bson.ObjectId`
+    :raises AssertionError: if the cursor is not valid
+    """
+    try:
+        return ObjectId(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError, InvalidId):
+        raise AssertionError("Invalid cursor!")
+
+
+def get_page_args(args, default_limit, max_limit):
+    """
+    Reads ``limit`` & ``after`` of a paginated request.
+
+    :param args: query arguments of the request
+    :type args: dict
+    :param default_limit: limit used if no limit is passed
+    :type default_limit: int
+    :param max_limit: largest allowed limit
+    :type max_limit: int
+    :returns: tuple of limit and ``_id`` after which the page starts (or None)
+    :rtype: tuple
+    :raises AssertionError: if limit or cursor is not valid
+    """
+    try:
+        limit = int(args.get("limit", default_limit))
+    except ValueError:
+        raise AssertionError("Invalid limit!")
+    if limit < 1:
+        raise AssertionError("Invalid limit!")
+    after = args.get("after", None)
+    if after:
+        after = decode_cursor(after)
+    return min(limit, max_limit), after or None
+
+
+def paginated(fetch, keep=None):
+    """
+    Returns a page of a listing as a JSON response containing ``data`` and
+    ``next_cursor``. ``next_cursor`` is None on the last page.
+
+    One document more than ``limit`` is fetched to know if a next page exists.
+    Documents for which ``keep`` returns False count for the page & cursor
+    but are left out of ``data``.
+
+    :param fetch: DAO listing function taking ``limit`` & ``after``
+    :type fetch: function
+    :param keep: function returning False for documents not to return
+    :type keep: function
+    :returns: tuple of response and status code
+    :rtype: tuple
+    """
+    try:
+        limit, after = get_page_args(
+            request.args,
+            current_app.config["PAGE_SIZE_DEFAULT"],
+            current_app.config["PAGE_SIZE_MAX"],
+        )
+        items = fetch(limit=limit + 1, after=after)
+        if isinstance(items, Exception):
+            raise items
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(items[-1]["_id"])
+        if keep is not None:
+            items = [item for item in items if keep(item)]
+        return jsonify({"data": items, "next_cursor": next_cursor}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_watermark(moment):
+    """
+    Encodes the time up to which a client has synced into an opaque token.
+
+    :param moment: naive UTC datetime
+    :type moment: `datetime.datetime`
+    :returns: url safe token
+    :rtype: str
+    """
+    millis = (moment - _EPOCH) // timedelta(milliseconds=1)
+    token = millis.to_bytes(8, "big", signed=True)
+    return base64.urlsafe_b64encode(token).decode("ascii").rstrip("=")
+
+
+def decode_watermark(token):
+    """
+    Decodes a token made by `encode_watermark`. "0" stands for a client which
+    has not synced yet.
+
+    :param token: token of the previous sync
+    :type token: str
+    :returns: naive UTC datetime or None for "0"
+    :rtype: `datetime.datetime`
+    :raises AssertionError: if the token is not valid
+    """
+    if token == "0":
+        return None
+    try:
+        data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        if len(data) != 8:
+            raise ValueError
+        millis = int.from_bytes(data, "big", signed=True)
+        return _EPOCH + timedelta(milliseconds=millis)
+    except (ValueError, TypeError, OverflowError):
+        raise AssertionError("Invalid since token!")
+
+
+def split_changes(documents, since, lag):
+    """
+    Splits the documents changed after ``since`` into live documents and ids
+    of deleted documents (tombstones), and computes the next watermark.
+
+    The watermark is held back ``lag`` from now, so that a document written
+    with a slightly older timestamp by another worker is sent again rather
+    than missed.
+
+    :param documents: documents sorted by ``updated_at``
+    :type documents: list
+    :param since: watermark of the previous sync or None
+    :type since: `datetime.datetime`
+    :param lag: how far the watermark is kept behind now
+    :type lag: `datetime.timedelta`
+    :returns: tuple of changed documents, deleted ids & next watermark
+    :rtype: tuple
+    """
+    changed, deleted = [], []
+    latest = since or _EPOCH
+    for document in documents:
+        if document.get("deleted"):
+            deleted.append(document["_id"])
+        else:
+            changed.append(document)
+        if document.get("updated_at") and document["updated_at"] > latest:
+            latest = document["updated_at"]
+    watermark = min(latest, datetime.utcnow() - lag)
+    if since is not None:
+        watermark = max(watermark, since)
+    return changed, deleted, watermark
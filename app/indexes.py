@@ -0,0 +1,234 @@
+"""
+This module creates the indexes declared by the DAO modules and checks that
+the DAO queries are served by them.
+
+Every DAO module declares ``INDEXES`` (collection name to list of
+`pymongo.IndexModel`) and ``QUERY_SHAPES`` next to the queries that use them.
+The ``flask indexes`` command group exposes ``ensure``, ``drift`` and
+``coverage``.
+"""
+import threading
+
+import click
+from flask.cli import AppGroup, with_appcontext
+from werkzeug.local import LocalProxy
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.db import get_db
+from app.dao import usersDAO, placementsDAO, postsDAO
+
+db = LocalProxy(get_db)
+
+DAO_MODULES = (usersDAO, placementsDAO, postsDAO)
+
+
+def declared_indexes():
+    """
+    Returns the indexes declared by all DAO modules.
+
+    :returns: dictionary of collection name to list of `pymongo.IndexModel`
+    :rtype: dict
+    """
+    indexes = {}
+    for module in DAO_MODULES:
+        for collection, models in getattr(module, "INDEXES", {}).items():
+            indexes.setdefault(collection, []).extend(models)
+    return indexes
+
+
+def declared_query_shapes():
+    """
+    Returns the query shapes declared by all DAO modules.
+
+    :returns: list of query shapes
+    :rtype: list
+    """
+    shapes = []
+    for module in DAO_MODULES:
+        for shape in getattr(module, "QUERY_SHAPES", []):
+            shapes.append({"module": module.__name__, **shape})
+    return shapes
+
+
+def ensure_indexes():
+    """
+    Creates the declared indexes which are missing. Existing indexes with the
+    same name and key are left alone, so this can be run on every start.
+
+    :returns: dictionary of collection name to created index names or error
+    :rtype: dict
+    """
+    report = {}
+    for collection, models in declared_indexes().items():
+        try:
+            for model in models:
+                model.document.setdefault("background", True)
+            report[collection] = db[collection].create_indexes(models)
+        except OperationFailure as e:
+            # an index with the same name or key but other options exists
+            report[collection] = {"error": str(e)}
+    return report
+
+
+def ensure_indexes_in_background(app):
+    """
+    Runs `ensure_indexes` in a daemon thread so that the app starts serving
+    requests without waiting for the index builds.
+
+    :param app: Flask app object
+    :type app: `flask.Flask`
+    :returns: the started thread
+    :rtype: `threading.Thread`
+    """
+
+    def run():
+        with app.app_context():
+            try:
+                report = ensure_indexes()
+                app.logger.info("ensure indexes: %s", report)
+            except PyMongoError as e:
+                app.logger.error("ensure indexes failed: %s", e)
+
+    thread = threading.Thread(target=run, name="ensure-indexes", daemon=True)
+    thread.start()
+    return thread
+
+
+def index_drift():
+    """
+    Compares the declared indexes with the ones present in the database.
+
+    ``missing`` indexes are declared but not present, ``changed`` indexes have
+    the declared name but another key or uniqueness and ``extra`` indexes are present but
+    not declared.
+
+    :returns: dictionary of collection name to missing, changed & extra index names
+    :rtype: dict
+    """
+    report = {}
+    for collection, models in declared_indexes().items():
+        existing = db[collection].index_information()
+        existing.pop("_id_", None)
+        missing, changed = [], []
+        for model in models:
+            name = model.document["name"]
+            key = list(model.document["key"].items())
+            if name not in existing:
+                missing.append(name)
+            elif _normalize_key(existing[name]["key"]) != _normalize_key(key):
+                changed.append(name)
+            elif existing[name].get("unique", False) != model.document.get(
+                "unique", False
+            ):
+                changed.append(name)
+        declared_names = {model.document["name"] for model in models}
+        extra = sorted(set(existing) - declared_names)
+        report[collection] = {"missing": missing, "changed": changed, "extra": extra}
+    return report
+
+
+def _normalize_key(key):
+    """Returns an index key as list of (field, int direction) tuples."""
+    return [
+        (field, int(direction) if isinstance(direction, (int, float)) else direction)
+        for field, direction in key
+    ]
+
+
+def _stages(explain):
+    """Yields every plan stage name found in an explain output."""
+    if isinstance(explain, dict):
+        if "stage" in explain:
+            yield explain["stage"]
+        for value in explain.values():
+            yield from _stages(value)
+    elif isinstance(explain, list):
+        for value in explain:
+            yield from _stages(value)
+
+
+def explain_query_shape(shape):
+    """
+    Runs ``explain`` for a query shape.
+
+    :param shape: query shape declared in a DAO module
+    :type shape: dict
+    :returns: explain output of the server
+    :rtype: dict
+    """
+    collection = db[shape["collection"]]
+    if "pipeline" in shape:
+        return db.command(
+            "aggregate", shape["collection"], pipeline=shape["pipeline"], explain=True
+        )
+    cursor = collection.find(shape["filter"])
+    if "sort" in shape:
+        cursor = cursor.sort(shape["sort"])
+    return cursor.explain()
+
+
+def index_coverage():
+    """
+    Explains every declared query shape and reports the ones which are
+    executed with a collection scan.
+
+    :returns: list of dictionaries containing module, name, stages & status
+    :rtype: list
+    """
+    results = []
+    for shape in declared_query_shapes():
+        stages = sorted(set(_stages(explain_query_shape(shape))))
+        if "COLLSCAN" not in stages:
+            status = "ok"
+        elif shape.get("full_scan"):
+            status = "full_scan"
+        else:
+            status = "COLLSCAN"
+        results.append(
+            {
+                "module": shape["module"],
+                "name": shape["name"],
+                "stages": stages,
+                "status": status,
+            }
+        )
+    return results
+
+
+indexes_cli = AppGroup("indexes", help="Manage the MongoDB indexes of the DAOs.")
+
+
+@indexes_cli.command("ensure")
+@with_appcontext
+def ensure_indexes_command():
+    """Create missing indexes."""
+    for collection, result in ensure_indexes().items():
+        click.echo(f"{collection}: {result}")
+
+
+@indexes_cli.command("drift")
+@with_appcontext
+def index_drift_command():
+    """Report missing, changed and extra indexes."""
+    drifted = False
+    for collection, result in index_drift().items():
+        click.echo(f"{collection}: {result}")
+        drifted = drifted or result["missing"] or result["changed"]
+    if drifted:
+        raise SystemExit(1)
+
+
+@indexes_cli.command("coverage")
+@with_appcontext
+def index_coverage_command():
+    """Explain every DAO query and fail on collection scans."""
+    failed = False
+    for result in index_coverage():
+        click.echo(
+            f"{result['status']:<10} {result['module']}.{result['name']} "
+            f"{','.join(result['stages'])}"
+        )
+        failed = failed or result["status"] == "COLLSCAN"
+    if failed:
+        raise SystemExit(1)
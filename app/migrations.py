@@ -0,0 +1,99 @@
+"""
+This module contains the data migrations of the app, run once per database
+with the ``flask migrate`` command group. Every migration can be run again
+safely: it only touches the documents which are not migrated yet.
+"""
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+
+from app.dao.usersDAO import backfill_login_email
+from app.dao.placementsDAO import (
+    backfill_company_snapshots,
+    backfill_phase_ends,
+    migrate_phase_results,
+    migrate_phases,
+    migrate_registrations,
+)
+
+migrations_cli = AppGroup("migrate", help="Run data migrations.")
+
+
+@migrations_cli.command("login-email")
+@click.option("--batch-size", default=500, show_default=True)
+@with_appcontext
+def login_email_command(batch_size):
+    """Set the normalized login_email of existing users."""
+    report = backfill_login_email(batch_size)
+    click.echo(f"updated: {report['updated']}")
+    for id in report["missing_email"]:
+        click.echo(f"no email: {id}")
+    for id in report["conflicts"]:
+        click.echo(f"duplicate email: {id}")
+    if report["conflicts"]:
+        raise SystemExit(1)
+
+
+@migrations_cli.command("phase-results")
+@click.option("--batch-size", default=500, show_default=True)
+@with_appcontext
+def phase_results_command(batch_size):
+    """Move results embedded in placement phases to phase_results."""
+    report = migrate_phase_results(batch_size)
+    click.echo(
+        f"placements: {report['placements']}, results: {report['results']}"
+    )
+
+
+@migrations_cli.command("registrations")
+@click.option("--batch-size", default=500, show_default=True)
+@with_appcontext
+def registrations_command(batch_size):
+    """Move registered_students of placements to registrations."""
+    report = migrate_registrations(batch_size)
+    click.echo(
+        f"placements: {report['placements']}, "
+        f"registrations: {report['registrations']}"
+    )
+
+
+@migrations_cli.command("company-snapshots")
+@click.option("--batch-size", default=500, show_default=True)
+@with_appcontext
+def company_snapshots_command(batch_size):
+    """Copy company name & email into placements and their phases.
+
+    Run it before phases; phases moved before it ran are updated too.
+    """
+    report = backfill_company_snapshots(batch_size)
+    click.echo(f"updated: {report['updated']}")
+    for id in report["missing_company"]:
+        click.echo(f"no company: {id}")
+
+
+@migrations_cli.command("phases")
+@click.option("--batch-size", default=500, show_default=True)
+@with_appcontext
+def phases_command(batch_size):
+    """Move phases embedded in placements to phases (after phase-results).
+
+    The phases copy the company snapshot of their placement, so run
+    company-snapshots first.
+
+    Placements with duplicate phase titles keep their phases until the
+    duplicates are renamed and this is run again.
+    """
+    report = migrate_phases(batch_size)
+    click.echo(f"placements: {report['placements']}, phases: {report['phases']}")
+    for placement_id, title in report["duplicates"]:
+        click.echo(f"duplicate title: {placement_id} {title}")
+
+
+@migrations_cli.command("phase-ends")
+@click.option("--batch-size", default=500, show_default=True)
+@with_appcontext
+def phase_ends_command(batch_size):
+    """Set ends_at of scheduled phases (after phases)."""
+    duration = current_app.config["PHASE_DEFAULT_DURATION_MINUTES"]
+    report = backfill_phase_ends(duration, batch_size)
+    click.echo(f"updated: {report['updated']}")
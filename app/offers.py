@@ -0,0 +1,159 @@
+"""
+This module allocates the offers of all placements of a year under the
+offer policy: a student holds at most one offer of a regular placement,
+while dream placements may make offers to any student.
+
+The candidates of a placement are the students with a "placed" result in
+one of its phases. When a placement has more candidates than ``positions``,
+the candidates with the highest SGPA (then the lowest id) get the offers.
+Placements whose ``positions`` is not a number are left as they are.
+
+- Every dream placement takes its best candidates, whatever their other
+  offers.
+- Regular placements are allocated by student-proposing deferred
+  acceptance. Students apply in order of their registration ``preference``
+  (then ``registered_at``), and every placement keeps the best candidates
+  which applied so far. The result is stable: no student and placement both
+  prefer each other to what they got.
+"""
+import heapq
+import math
+from datetime import datetime
+
+
+def parse_positions(value):
+    """
+    Returns the number of positions of a placement.
+
+    :param value: ``positions`` of a placement
+    :type value: str or int
+    :rtype: int
+    :raises ValueError: if ``value`` is not a number of positions
+    """
+    try:
+        positions = int(str(value).strip())
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid positions: {value!r}")
+    if positions < 0:
+        raise ValueError(f"Invalid positions: {value!r}")
+    return positions
+
+
+def _rank(sgpa, student):
+    # smaller is better: higher SGPA, then lower id; no marks come last
+    value = sgpa.get(student)
+    if value is None or math.isnan(value):
+        value = -math.inf
+    return (-value, student)
+
+
+def _best(students, positions, sgpa):
+    ranked = sorted(students, key=lambda s: _rank(sgpa, s))
+    return ranked if positions is None else ranked[:positions]
+
+
+def allocate_offers(placements, candidates, sgpa):
+    """
+    Allocates the offers of the placements of a year. Placements whose
+    ``positions`` is not a number are skipped and returned separately.
+
+    :param placements: placements containing _id, dream & positions
+    :type placements: list
+    :param candidates: dictionaries containing placement_id, student_id and
+        optionally preference & registered_at
+    :type candidates: list
+    :param sgpa: dictionary of student id to SGPA
+    :type sgpa: dict
+    :returns: tuple of the dictionary of placement id to list of student ids
+        and the list of the ids of the skipped placements
+    :rtype: tuple
+    """
+    by_id, positions, skipped = {}, {}, []
+    for placement in placements:
+        try:
+            positions[placement["_id"]] = parse_positions(placement.get("positions"))
+        except ValueError:
+            skipped.append(placement["_id"])
+            continue
+        by_id[placement["_id"]] = placement
+    applicants = {id: [] for id in by_id}
+    choices = {}
+    seen = set()
+    for candidate in candidates:
+        placement = by_id.get(candidate["placement_id"])
+        student = candidate["student_id"]
+        # a student may be "placed" in several phases of a placement
+        if placement is None or (placement["_id"], student) in seen:
+            continue
+        seen.add((placement["_id"], student))
+        if placement.get("dream"):
+            applicants[placement["_id"]].append(student)
+            continue
+        preference = candidate.get("preference")
+        choices.setdefault(student, []).append(
+            (
+                math.inf if preference is None else preference,
+                candidate.get("registered_at") or datetime.max,
+                placement["_id"],
+            )
+        )
+
+    allocation = {}
+    for id, placement in by_id.items():
+        if placement.get("dream"):
+            allocation[id] = _best(applicants[id], positions[id], sgpa)
+
+    # deferred acceptance over the regular placements; every placement holds
+    # a heap of its tentative students, the worst one on top
+    order = {s: i for i, s in enumerate(_best(choices, None, sgpa))}
+    for student in choices:
+        choices[student].sort()
+    held = {id: [] for id, p in by_id.items() if not p.get("dream")}
+    next_choice = dict.fromkeys(choices, 0)
+    free = list(choices)
+    while free:
+        student = free.pop()
+        options = choices[student]
+        while next_choice[student] < len(options):
+            placement_id = options[next_choice[student]][2]
+            next_choice[student] += 1
+            limit = positions[placement_id]
+            heap = held[placement_id]
+            if len(heap) < limit:
+                heapq.heappush(heap, (-order[student], student))
+                break
+            if heap and -heap[0][0] > order[student]:
+                _, rejected = heapq.heapreplace(heap, (-order[student], student))
+                free.append(rejected)
+                break
+    for id, heap in held.items():
+        allocation[id] = [s for _, s in sorted(heap, reverse=True)]
+    return allocation, skipped
+
+
+def offer_changes(placements, allocation):
+    """
+    Compares an allocation with the ``offers`` of the placements. Placements
+    missing from the allocation are left out, and placements which were
+    never allocated (without ``offers``) are always changed.
+
+    :param placements: placements containing _id & offers
+    :type placements: list
+    :param allocation: dictionary of placement id to list of student ids
+    :type allocation: dict
+    :returns: dictionary of the ids of the changed placements to dictionaries
+        of the ``added`` & ``removed`` students
+    :rtype: dict
+    """
+    changes = {}
+    for placement in placements:
+        if placement["_id"] not in allocation:
+            continue
+        before = set(placement.get("offers") or [])
+        after = set(allocation[placement["_id"]])
+        if "offers" not in placement or before != after:
+            changes[placement["_id"]] = {
+                "added": sorted(after - before),
+                "removed": sorted(before - after),
+            }
+    return changes
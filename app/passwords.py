@@ -0,0 +1,160 @@
+"""
+This module hashes and verifies passwords with bcrypt on a process pool, so
+that login and registration bursts do not hold every request thread for the
+duration of a bcrypt round.
+
+The pool is capped at ``PASSWORD_POOL_WORKERS`` processes and at most
+``PASSWORD_POOL_MAX_PENDING`` passwords are queued or running at once; further
+requests fail fast with `PasswordPoolBusy` (served as 503) instead of waiting.
+
+The cost factor of new hashes is ``BCRYPT_LOG_ROUNDS``. A successful check of
+a hash with another cost returns a new hash, which the caller stores.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import bcrypt
+from flask import current_app
+
+# One pool per process, rebuilt after a fork like the MongoClient in app/db.py
+_pool = None
+_pool_pid = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {"hashed": 0, "checked": 0, "rehashed": 0, "rejected": 0, "timeouts": 0}
+
+
+class PasswordPoolBusy(Exception):
+    """
+    Raised when the password pool queue is full or a hash takes too long.
+    """
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _cost(hashed):
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def _check(password, hashed, rounds):
+    """
+    Returns a tuple of the check result and a new hash with ``rounds`` if the
+    password matches a hash of another cost, else None.
+    """
+    if not bcrypt.checkpw(password, hashed.encode("utf-8")):
+        return False, None
+    if _cost(hashed) != rounds:
+        return True, _hash(password, rounds)
+    return True, None
+
+
+def _incr(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_pool():
+    """
+    Returns the process pool and the semaphore bounding its queue, creating
+    them on first use (and again in a child process after a fork).
+
+    :returns: tuple of pool & semaphore
+    :rtype: tuple
+    """
+    global _pool, _pool_pid, _pool_slots
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool, _pool_slots
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            config = current_app.config
+            workers = config["PASSWORD_POOL_WORKERS"] or os.cpu_count() or 1
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_slots = threading.BoundedSemaphore(
+                config["PASSWORD_POOL_MAX_PENDING"]
+            )
+            _pool_pid = pid
+    return _pool, _pool_slots
+
+
+def _run(function, *args):
+    pool, slots = get_pool()
+    if not slots.acquire(blocking=False):
+        _incr("rejected")
+        raise PasswordPoolBusy("Too many logins in progress, please retry.")
+    try:
+        future = pool.submit(function, *args)
+    except BaseException:
+        slots.release()
+        raise
+    # a hash which timed out keeps its slot until it leaves the pool
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=current_app.config["PASSWORD_POOL_TIMEOUT"])
+    except FutureTimeoutError:
+        _incr("timeouts")
+        raise PasswordPoolBusy("Too many logins in progress, please retry.")
+
+
+def hash_password(password):
+    """
+    Returns the bcrypt hash of a password with ``BCRYPT_LOG_ROUNDS``.
+
+    :param password: password
+    :type password: str
+    :returns: hash of the password
+    :rtype: str
+    :raises PasswordPoolBusy: if the pool is full
+    """
+    rounds = current_app.config["BCRYPT_LOG_ROUNDS"]
+    hashed = _run(_hash, password.encode("utf-8"), rounds)
+    _incr("hashed")
+    return hashed
+
+
+def check_password(hashed, password):
+    """
+    Checks a password against its bcrypt hash.
+
+    :param hashed: stored hash
+    :type hashed: str
+    :param password: password
+    :type password: str
+    :returns: tuple of the check result and a new hash to store when the cost
+        of ``hashed`` is not ``BCRYPT_LOG_ROUNDS`` (else None)
+    :rtype: tuple
+    :raises PasswordPoolBusy: if the pool is full
+    """
+    rounds = current_app.config["BCRYPT_LOG_ROUNDS"]
+    valid, new_hash = _run(_check, password.encode("utf-8"), hashed, rounds)
+    _incr("checked")
+    if new_hash is not None:
+        _incr("rehashed")
+    return valid, new_hash
+
+
+def get_password_pool_stats():
+    """
+    Returns the options and counters of the password pool of this process.
+
+    :returns: dictionary of pool statistics
+    :rtype: dict
+    """
+    config = current_app.config
+    with _stats_lock:
+        return {
+            "pid": os.getpid(),
+            "workers": config["PASSWORD_POOL_WORKERS"] or os.cpu_count() or 1,
+            "max_pending": config["PASSWORD_POOL_MAX_PENDING"],
+            "log_rounds": config["BCRYPT_LOG_ROUNDS"],
+            **_stats,
+        }
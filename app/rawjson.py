@@ -0,0 +1,144 @@
+"""
+This module converts raw BSON documents (`bson.raw_bson.RawBSONDocument`)
+straight to JSON text in one pass over the bytes, without decoding them into
+Python dicts first.
+
+The output matches the app's JSON encoders: ObjectIds are written as hex
+strings and dates either as ISO 8601 strings (``JSON_ENCODER = "fast"``) or
+as canonical ``{"$date": {"$numberLong": ...}}``. Documents containing a type
+not handled here are decoded and passed to the app's encoder instead.
+"""
+import math
+import struct
+from datetime import datetime, timedelta
+from json.encoder import encode_basestring_ascii
+
+from flask import Response, current_app
+
+import bson
+from bson.raw_bson import RawBSONDocument
+
+_int32 = struct.Struct("<i").unpack_from
+_int64 = struct.Struct("<q").unpack_from
+_double = struct.Struct("<d").unpack_from
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class _UnsupportedType(Exception):
+    pass
+
+
+def _cstring_end(data, position):
+    return data.index(b"\x00", position)
+
+
+def _float_to_json(value):
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "Infinity" if value > 0 else "-Infinity"
+    return float.__repr__(value)
+
+
+def _datetime_to_json(millis, iso_dates):
+    if not iso_dates:
+        return '{"$date":{"$numberLong":"%d"}}' % millis
+    value = _EPOCH + timedelta(milliseconds=millis)
+    return '"' + value.isoformat(timespec="milliseconds") + 'Z"'
+
+
+def _write_document(data, position, out, iso_dates, is_array):
+    """
+    Writes the document starting at ``position`` to ``out`` and returns the
+    position after it.
+    """
+    end = position + _int32(data, position)[0] - 1
+    position += 4
+    out.append("[" if is_array else "{")
+    first = True
+    while position < end:
+        element_type = data[position]
+        name_end = _cstring_end(data, position + 1)
+        if not first:
+            out.append(",")
+        first = False
+        if not is_array:
+            out.append(encode_basestring_ascii(data[position + 1 : name_end].decode()))
+            out.append(":")
+        position = name_end + 1
+        if element_type == 0x02:  # string
+            length = _int32(data, position)[0]
+            start = position + 4
+            out.append(encode_basestring_ascii(data[start : start + length - 1].decode()))
+            position = start + length
+        elif element_type == 0x07:  # ObjectId
+            out.append('"' + data[position : position + 12].hex() + '"')
+            position += 12
+        elif element_type == 0x03 or element_type == 0x04:  # document or array
+            position = _write_document(
+                data, position, out, iso_dates, element_type == 0x04
+            )
+        elif element_type == 0x09:  # UTC datetime
+            out.append(_datetime_to_json(_int64(data, position)[0], iso_dates))
+            position += 8
+        elif element_type == 0x10:  # int32
+            out.append(str(_int32(data, position)[0]))
+            position += 4
+        elif element_type == 0x12:  # int64
+            out.append(str(_int64(data, position)[0]))
+            position += 8
+        elif element_type == 0x01:  # double
+            out.append(_float_to_json(_double(data, position)[0]))
+            position += 8
+        elif element_type == 0x08:  # boolean
+            out.append("true" if data[position] else "false")
+            position += 1
+        elif element_type == 0x0A:  # null
+            out.append("null")
+        else:
+            raise _UnsupportedType(element_type)
+    out.append("]" if is_array else "}")
+    return end + 1
+
+
+def raw_to_json(document, iso_dates=False):
+    """
+    Converts a raw BSON document to JSON text.
+
+    :param document: raw BSON document
+    :type document: `bson.raw_bson.RawBSONDocument`
+    :param iso_dates: write dates as ISO 8601 strings
+    :type iso_dates: bool
+    :returns: JSON text of the document
+    :rtype: str
+    """
+    out = []
+    try:
+        _write_document(document.raw, 0, out, iso_dates, False)
+    except (_UnsupportedType, OverflowError):
+        encoder = current_app.json_encoder(separators=(",", ":"))
+        return encoder.encode(bson.decode(document.raw))
+    return "".join(out)
+
+
+def raw_json_response(documents):
+    """
+    Returns a JSON response of a raw BSON document, a list of raw BSON
+    documents or None.
+
+    :param documents: raw BSON document(s)
+    :type documents: `bson.raw_bson.RawBSONDocument` or list
+    :returns: JSON response
+    :rtype: `flask.Response`
+    """
+    if isinstance(documents, Exception):
+        raise documents
+    iso_dates = current_app.config["JSON_ENCODER"] == "fast"
+    if documents is None:
+        body = "null"
+    elif isinstance(documents, RawBSONDocument):
+        body = raw_to_json(documents, iso_dates)
+    else:
+        body = "[" + ",".join(raw_to_json(d, iso_dates) for d in documents) + "]"
+    return Response(body, mimetype="application/json")
@@ -0,0 +1,72 @@
+"""
+This module keeps the ``status`` of the phases in step with the clock: a
+daemon thread moves upcoming phases to "ongoing" once their
+``scheduled_date`` has passed and to "completed" once their ``ends_at`` has
+passed, every ``PHASE_STATUS_INTERVAL_SECONDS``.
+
+The thread starts with the first request, so that CLI commands like
+``flask migrate`` do not move phases while they run. Every worker process
+runs its own thread; the updates only match phases which still need to move,
+so concurrent runs do not conflict. Each thread then compares the version of
+the phases (count & latest ``updated_at``) with the one it saw last and drops
+the cached phase listings of its process when it changed, whichever worker
+wrote the phases.
+"""
+import threading
+from datetime import datetime
+
+from app.cache import response_cache
+from app.dao.placementsDAO import advance_phase_statuses, get_phases_version
+
+
+def advance_phases(seen_version=None):
+    """
+    Advances the statuses of the phases once and drops the cached phase
+    listings of this process if the phases changed since ``seen_version``.
+
+    :param seen_version: version of the phases at the previous run
+    :type seen_version: dict
+    :returns: tuple of the number of phases moved to each status and the
+        current version of the phases
+    :rtype: tuple
+    :raises PyMongoError: if the phases cannot be updated or read
+    """
+    moved = advance_phase_statuses(datetime.utcnow())
+    if isinstance(moved, Exception):
+        raise moved
+    version = get_phases_version()
+    if isinstance(version, Exception):
+        raise version
+    if version != seen_version:
+        response_cache.invalidate("phases")
+    return moved, version
+
+
+def advance_phases_in_background(app):
+    """
+    Runs `advance_phases` in a daemon thread every
+    ``PHASE_STATUS_INTERVAL_SECONDS``, starting right away.
+
+    :param app: Flask app object
+    :type app: `flask.Flask`
+    :returns: the started thread
+    :rtype: `threading.Thread`
+    """
+    interval = app.config["PHASE_STATUS_INTERVAL_SECONDS"]
+
+    def run():
+        version = None
+        while True:
+            with app.app_context():
+                try:
+                    moved, version = advance_phases(version)
+                    if moved["ongoing"] or moved["completed"]:
+                        app.logger.info("advance phases: %s", moved)
+                except Exception:
+                    # the thread must outlive any failure of a single run
+                    app.logger.exception("advance phases failed")
+            threading.Event().wait(interval)
+
+    thread = threading.Thread(target=run, name="phase-status", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,181 @@
+"""
+This module finds the students eligible for placements with vectorized
+NumPy masks instead of one aggregation per student.
+
+The ``sem_marks``, ``gender`` and ``live_backlog`` of all students are loaded
+once into columnar arrays (`StudentColumns`), cached per process for
+``SHORTLIST_CACHE_SECONDS``, and the ``eligibility`` block of a placement is
+evaluated as boolean masks over these columns.
+"""
+import threading
+import time
+
+import numpy as np
+from flask import current_app
+
+from app.dao.usersDAO import get_students_eligibility_cursor
+
+_TRUE_STRINGS = {"true", "yes", "y", "1"}
+
+_cache = {"columns": None, "loaded_at": 0.0}
+_cache_lock = threading.Lock()
+
+
+def _as_bool(value):
+    """
+    Normalizes the ``live_backlog`` values stored by the app. Strings like
+    "true"/"false" come from the API, numbers are counts of backlogs.
+    """
+    if isinstance(value, str):
+        return value.strip().lower() in _TRUE_STRINGS
+    return bool(value)
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class StudentColumns(object):
+    """
+    Columnar arrays of the eligibility fields of students.
+
+    :param ids: ids of the students
+    :type ids: `numpy.ndarray`
+    :param sgpa: average of ``sem_marks`` (NaN if there are no marks)
+    :type sgpa: `numpy.ndarray`
+    :param gender: lower case gender
+    :type gender: `numpy.ndarray`
+    :param live_backlog: True if the student has a live backlog
+    :type live_backlog: `numpy.ndarray`
+    """
+
+    def __init__(self, ids, sgpa, gender, live_backlog):
+        self.ids = ids
+        self.sgpa = sgpa
+        self.gender = gender
+        self.live_backlog = live_backlog
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_documents(cls, students):
+        """
+        Builds the columns from student documents containing ``_id``,
+        ``sem_marks``, ``gender`` & ``live_backlog``.
+
+        :param students: iterable of student documents
+        :type students: iterable
+        :returns: columns of the students
+        :rtype: `StudentColumns`
+        """
+        ids, genders, backlogs, marks, counts = [], [], [], [], []
+        for student in students:
+            ids.append(student["_id"])
+            genders.append(str(student.get("gender") or "").lower())
+            backlogs.append(_as_bool(student.get("live_backlog")))
+            sem_marks = student.get("sem_marks") or []
+            marks.extend(_as_float(m) for m in sem_marks)
+            counts.append(len(sem_marks))
+        counts = np.array(counts, dtype=np.int64)
+        marks = np.array(marks, dtype=np.float64)
+        # average of the ragged sem_marks lists: sum per student / count
+        sums = np.zeros(len(counts))
+        has_marks = counts > 0
+        if marks.size:
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            sums[has_marks] = np.add.reduceat(marks, starts[has_marks])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sgpa = np.where(has_marks, sums / np.maximum(counts, 1), np.nan)
+        return cls(
+            np.array(ids, dtype=object),
+            sgpa,
+            np.array(genders, dtype=str),
+            np.array(backlogs, dtype=bool),
+        )
+
+    def mask(self, eligibility):
+        """
+        Evaluates the ``eligibility`` block of a placement (``sgpa``,
+        ``live_backlog`` & ``gender``) for all students.
+
+        A missing criterion does not restrict the students.
+
+        :param eligibility: eligibility block of a placement
+        :type eligibility: dict
+        :returns: boolean array, True for eligible students
+        :rtype: `numpy.ndarray`
+        """
+        eligibility = eligibility or {}
+        mask = np.ones(len(self), dtype=bool)
+        sgpa = _as_float(eligibility.get("sgpa"))
+        if not np.isnan(sgpa):
+            # NaN (no marks) compares False, as in the aggregation
+            mask &= self.sgpa >= sgpa
+        live_backlog = eligibility.get("live_backlog")
+        if live_backlog is not None and not _as_bool(live_backlog):
+            mask &= ~self.live_backlog
+        gender = str(eligibility.get("gender") or "any").lower()
+        if gender != "any":
+            mask &= self.gender == gender
+        return mask
+
+    def shortlist(self, eligibility):
+        """
+        Returns the ids of the students eligible for a placement.
+
+        :param eligibility: eligibility block of a placement
+        :type eligibility: dict
+        :returns: list of student ids
+        :rtype: list
+        """
+        return self.ids[self.mask(eligibility)].tolist()
+
+    def shortlist_all(self, placements):
+        """
+        Returns the ids of the eligible students of every placement.
+
+        :param placements: placements containing ``_id`` & ``eligibility``
+        :type placements: list
+        :returns: dictionary of placement id to list of student ids
+        :rtype: dict
+        """
+        return {
+            str(placement["_id"]): self.shortlist(placement.get("eligibility"))
+            for placement in placements
+        }
+
+
+def load_student_columns():
+    """
+    Loads the columns of all students from the database.
+
+    :returns: columns of all students
+    :rtype: `StudentColumns`
+    """
+    cursor = get_students_eligibility_cursor(current_app.config["STREAM_BATCH_SIZE"])
+    if isinstance(cursor, Exception):
+        raise cursor
+    return StudentColumns.from_documents(cursor)
+
+
+def get_student_columns():
+    """
+    Returns the cached columns of all students, reloading them when they are
+    older than ``SHORTLIST_CACHE_SECONDS``.
+
+    :returns: columns of all students
+    :rtype: `StudentColumns`
+    """
+    max_age = current_app.config["SHORTLIST_CACHE_SECONDS"]
+    with _cache_lock:
+        if (
+            _cache["columns"] is None
+            or time.monotonic() - _cache["loaded_at"] > max_age
+        ):
+            _cache["columns"] = load_student_columns()
+            _cache["loaded_at"] = time.monotonic()
+        return _cache["columns"]
@@ -0,0 +1,118 @@
+"""
+This module allocates the candidates of a phase to interview panels and
+time slots.
+
+The window of the phase is cut into slots of equal length, each offered by
+every panel. A union-find over the slots points every slot to the next one
+with a free panel, so a student gets the earliest slot they are free in
+after O(k) near constant time finds, k being the number of their busy slots
+(interviews of other phases at the same time).
+"""
+from datetime import timedelta
+
+
+class SlotGrid(object):
+    """
+    Free panels of every slot of a phase.
+
+    :param slot_count: number of slots
+    :type slot_count: int
+    :param panels: number of panels interviewing in every slot
+    :type panels: int
+    """
+
+    def __init__(self, slot_count, panels):
+        self.slot_count = slot_count
+        self.panels = panels
+        self.free = [panels] * slot_count
+        # slot_count is the sentinel "no free slot"
+        self._next = list(range(slot_count + 1))
+
+    def find(self, slot):
+        """
+        Returns the first slot from ``slot`` on with a free panel, or
+        ``slot_count`` if there is none.
+
+        :param slot: first slot to look at
+        :type slot: int
+        :rtype: int
+        """
+        parent = self._next
+        while parent[slot] != slot:
+            parent[slot] = parent[parent[slot]]
+            slot = parent[slot]
+        return slot
+
+    def take(self, slot):
+        """
+        Books the next free panel of a slot having one.
+
+        :param slot: slot to book
+        :type slot: int
+        :returns: index of the booked panel
+        :rtype: int
+        """
+        self.free[slot] -= 1
+        if self.free[slot] == 0:
+            self._next[slot] = slot + 1
+        return self.panels - self.free[slot] - 1
+
+
+def busy_slots(intervals, start, slot_length, slot_count):
+    """
+    Returns the slots overlapping any of ``intervals``.
+
+    :param intervals: list of (start, end) tuples of datetimes
+    :type intervals: list
+    :param start: start of the first slot
+    :type start: `datetime.datetime`
+    :param slot_length: length of a slot
+    :type slot_length: `datetime.timedelta`
+    :param slot_count: number of slots
+    :type slot_count: int
+    :rtype: set
+    """
+    slots = set()
+    for busy_start, busy_end in intervals:
+        first = max((busy_start - start) // slot_length, 0)
+        # slot of the last instant before busy_end
+        last = (busy_end - start - timedelta.resolution) // slot_length
+        last = min(last, slot_count - 1)
+        slots.update(range(first, last + 1))
+    return slots
+
+
+def allocate_slots(students, slot_count, panels, busy=None):
+    """
+    Gives every student the earliest slot with a free panel in which they
+    are not busy. Students with busy slots are placed first, as they have the
+    fewest choices.
+
+    :param students: ids of the students, in order of preference
+    :type students: list
+    :param slot_count: number of slots
+    :type slot_count: int
+    :param panels: number of panels
+    :type panels: int
+    :param busy: dictionary of student id to set of busy slots
+    :type busy: dict
+    :returns: tuple of the list of (student, slot, panel) tuples and the list
+        of students who did not get a slot
+    :rtype: tuple
+    """
+    busy = busy or {}
+    grid = SlotGrid(slot_count, panels)
+    ordered = [s for s in students if busy.get(s)] + [
+        s for s in students if not busy.get(s)
+    ]
+    allocation, unallocated = [], []
+    for student in ordered:
+        taken = busy.get(student, ())
+        slot = grid.find(0)
+        while slot < slot_count and slot in taken:
+            slot = grid.find(slot + 1)
+        if slot == slot_count:
+            unallocated.append(student)
+            continue
+        allocation.append((student, slot, grid.take(slot)))
+    return allocation, unallocated
@@ -0,0 +1,54 @@
+"""
+This module contains the streaming JSON response used by large list endpoints.
+"""
+from flask import Response, current_app, stream_with_context
+
+from bson.raw_bson import RawBSONDocument
+
+from app.rawjson import raw_to_json
+
+
+def stream_json(cursor):
+    """
+    Returns a response which writes the documents of ``cursor`` as a JSON
+    array while the cursor is iterated, instead of building the whole list
+    and JSON string in memory. At most one batch of documents (the cursor's
+    ``batch_size``) is held in memory at a time.
+
+    The first document is fetched before the response is returned, so that
+    query errors are raised in the view and not in the middle of the body.
+    Raw BSON documents are converted with `app.rawjson.raw_to_json`.
+
+    :param cursor: pymongo cursor or command cursor of the documents
+    :type cursor: `pymongo.cursor.Cursor`
+    :returns: streamed JSON response
+    :rtype: `flask.Response`
+    """
+    encoder = current_app.json_encoder(separators=(",", ":"))
+    documents = iter(cursor)
+    try:
+        first = next(documents)
+    except StopIteration:
+        return Response("[]", mimetype="application/json")
+    batch_size = current_app.config["STREAM_BATCH_SIZE"]
+    if isinstance(first, RawBSONDocument):
+        iso_dates = current_app.config["JSON_ENCODER"] == "fast"
+
+        def encode(document):
+            return raw_to_json(document, iso_dates)
+
+    else:
+        encode = encoder.encode
+
+    def generate():
+        chunk = ["[", encode(first)]
+        for document in documents:
+            chunk.append(",")
+            chunk.append(encode(document))
+            if len(chunk) >= 2 * batch_size:
+                yield "".join(chunk)
+                chunk = []
+        chunk.append("]")
+        yield "".join(chunk)
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
@@ -0,0 +1,66 @@
+"""
+This module contains the delta sync response of list endpoints polled by the
+student app: ``?since=<watermark>`` returns only the documents created,
+updated or deleted after the watermark, and the next watermark.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app, jsonify, request
+
+from app.helpers import decode_watermark, encode_watermark, split_changes
+
+
+def is_delta_request():
+    """
+    Returns True if the request asks for a delta with ``since``.
+
+    :rtype: bool
+    """
+    return "since" in request.args
+
+
+def delta_response(name, fetch, retention=None):
+    """
+    Returns the changes after the ``since`` watermark of the request as JSON
+    containing ``name`` (changed documents), ``deleted`` (ids), ``watermark``
+    and ``full``.
+
+    ``full`` is True when all live documents are returned, which happens for
+    ``since=0`` and for watermarks older than ``retention`` seconds, as the
+    tombstones of older deletions may be gone.
+
+    :param name: key of the changed documents in the response
+    :type name: str
+    :param fetch: DAO function returning documents changed after a datetime
+    :type fetch: function
+    :param retention: seconds deletions are remembered, None if forever
+    :type retention: int
+    :returns: tuple of response and status code
+    :rtype: tuple
+    """
+    try:
+        since = decode_watermark(request.args["since"])
+        if (
+            since is not None
+            and retention is not None
+            and since < datetime.utcnow() - timedelta(seconds=retention)
+        ):
+            since = None
+        documents = fetch(since)
+        if isinstance(documents, Exception):
+            raise documents
+        lag = timedelta(seconds=current_app.config["DELTA_SYNC_LAG_SECONDS"])
+        changed, deleted, watermark = split_changes(documents, since, lag)
+        return (
+            jsonify(
+                {
+                    name: changed,
+                    "deleted": deleted,
+                    "watermark": encode_watermark(watermark),
+                    "full": since is None,
+                }
+            ),
+            200,
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
@@ -0,0 +1,77 @@
+"""
+Compares the JSON encoders of ``app.encoders`` on realistic user and
+placement documents.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_encoder
+"""
+import json
+import timeit
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.encoders import JSON_ENCODERS
+
+
+def make_student(i):
+    return {
+        "_id": ObjectId(),
+        "role": "student",
+        "email": f"student{i}@aissmscoe.com",
+        "full_name": f"Student {i}",
+        "roll_number": f"17CO{i:03d}",
+        "class": "BE",
+        "department": "Computer",
+        "gender": "male" if i % 2 else "female",
+        "live_backlog": False,
+        "sem_marks": [7.5, 8.1, 7.9, 8.4, 8.0, 8.2],
+        "profile_completed": True,
+        "approved_date": datetime(2020, 5, 8) + timedelta(minutes=i),
+        "rejected": [{"rejected_date": datetime(2020, 5, 1), "reason": "photo"}],
+    }
+
+
+def make_placement(i, students):
+    return {
+        "_id": ObjectId(),
+        "year": 2020,
+        "company_id": ObjectId(),
+        "domain": "IT",
+        "requirement": "Software Engineer",
+        "eligibility": {"sgpa": "7", "live_backlog": "false", "gender": "any"},
+        "positions": "10",
+        "registered_students": [s["_id"] for s in students],
+        "phases": [
+            {
+                "title": f"Round {r}",
+                "description": "Aptitude",
+                "requested_date": datetime(2020, 5, 8 + r),
+                "scheduled_date": datetime(2020, 5, 9 + r),
+                "results": [
+                    {"student_id": s["_id"], "status": "passed"} for s in students
+                ],
+            }
+            for r in range(3)
+        ],
+    }
+
+
+def main(number=20):
+    students = [make_student(i) for i in range(500)]
+    placements = [make_placement(i, students[:100]) for i in range(20)]
+    for name, documents in (("users", students), ("placements", placements)):
+        for encoder_name, encoder in JSON_ENCODERS.items():
+            size = len(json.dumps(documents, cls=encoder))
+            seconds = timeit.timeit(
+                lambda: json.dumps(documents, cls=encoder), number=number
+            )
+            print(
+                f"{name:<10} {encoder_name:<10} "
+                f"{seconds / number * 1000:8.2f} ms/dump {size:>10} bytes"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Measures the offer allocation of ``app.offers`` on a generated season.
+
+Every student gets "placed" results in ``--results`` random placements, a
+tenth of the placements are dream placements and positions are scarce
+enough for deferred acceptance to reject students.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_offers --students 8000 --placements 200
+"""
+import argparse
+import random
+import time
+
+from bson import ObjectId
+
+from app.offers import allocate_offers, offer_changes
+
+
+def make_season(students, placements, results):
+    placement_docs = [
+        {
+            "_id": ObjectId(),
+            "dream": random.random() < 0.1,
+            "positions": str(random.randint(5, 60)),
+            "offers": [],
+        }
+        for _ in range(placements)
+    ]
+    student_ids = [ObjectId() for _ in range(students)]
+    sgpa = {id: round(random.uniform(5, 10), 2) for id in student_ids}
+    candidates = [
+        {
+            "placement_id": placement["_id"],
+            "student_id": id,
+            "preference": preference,
+            "registered_at": None,
+        }
+        for id in student_ids
+        for preference, placement in enumerate(
+            random.sample(placement_docs, results), 1
+        )
+    ]
+    return placement_docs, candidates, sgpa
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=8000)
+    parser.add_argument("--placements", type=int, default=200)
+    parser.add_argument("--results", type=int, default=10)
+    args = parser.parse_args()
+    random.seed(1)
+    placements, candidates, sgpa = make_season(
+        args.students, args.placements, args.results
+    )
+    start = time.perf_counter()
+    allocation, _ = allocate_offers(placements, candidates, sgpa)
+    allocated = time.perf_counter()
+    changes = offer_changes(placements, allocation)
+    compared = time.perf_counter()
+    offers = sum(len(students) for students in allocation.values())
+    print(
+        f"{len(candidates)} results of {args.students} students in "
+        f"{args.placements} placements: {offers} offers"
+    )
+    print(f"allocation: {(allocated - start) * 1000:9.1f} ms")
+    print(f"dry-run diff: {(compared - allocated) * 1000:9.1f} ms, {len(changes)} changed")
+
+
+if __name__ == "__main__":
+    main()
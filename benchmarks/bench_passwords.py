@@ -0,0 +1,78 @@
+"""
+Measures password checks per second (the cost of a login) against the
+number of worker processes of the password pool of ``app.passwords``, with
+many request threads checking passwords at once.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_passwords --logins 200 --threads 64 --rounds 12
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from flask import Flask
+
+import app.passwords as passwords
+
+
+def make_app(workers, rounds, max_pending):
+    flask_app = Flask(__name__)
+    flask_app.config.update(
+        BCRYPT_LOG_ROUNDS=rounds,
+        PASSWORD_POOL_WORKERS=workers,
+        PASSWORD_POOL_MAX_PENDING=max_pending,
+        PASSWORD_POOL_TIMEOUT=600,
+    )
+    return flask_app
+
+
+def inline_check(hashed, password):
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+def run(check, flask_app, hashed, logins, threads):
+    def login(_):
+        with flask_app.app_context():
+            return check(hashed, "placement-password")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(login, range(logins)))
+    return logins / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args()
+
+    hashed = bcrypt.hashpw(
+        b"placement-password", bcrypt.gensalt(args.rounds)
+    ).decode("utf-8")
+    cores = os.cpu_count() or 1
+    flask_app = make_app(1, args.rounds, args.logins)
+    rate = run(inline_check, flask_app, hashed, args.logins, args.threads)
+    print(f"inline (request threads): {rate:8.1f} logins/s")
+
+    workers = 1
+    while True:
+        # a new pool for each size
+        passwords._pool = None
+        flask_app = make_app(workers, args.rounds, args.logins)
+        with flask_app.app_context():
+            passwords.get_pool()[0].submit(int).result()  # start a worker
+        rate = run(passwords.check_password, flask_app, hashed, args.logins, args.threads)
+        print(f"pool, {workers:2d} workers:       {rate:8.1f} logins/s")
+        passwords._pool.shutdown()
+        if workers >= cores:
+            break
+        workers = min(workers * 2, cores)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Compares the vectorized shortlist engine of ``app.shortlist`` with the
+per-student ``get_eligible_companies`` aggregation.
+
+The engine is always measured on generated students. The aggregation needs
+a MongoDB server with data; pass ``--db-uri`` & ``--db-name`` to time it on
+a sample of students and extrapolate to all of them.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_shortlist --students 20000 --placements 50
+"""
+import argparse
+import random
+import time
+
+from bson import ObjectId
+
+from app.shortlist import StudentColumns
+
+
+def make_students(count):
+    return [
+        {
+            "_id": ObjectId(),
+            "gender": random.choice(["male", "female"]),
+            "live_backlog": random.random() < 0.1,
+            "sem_marks": [round(random.uniform(5, 10), 2) for _ in range(6)],
+        }
+        for _ in range(count)
+    ]
+
+
+def make_eligibilities(count):
+    return [
+        {
+            "_id": ObjectId(),
+            "eligibility": {
+                "sgpa": str(random.choice([6, 6.5, 7, 7.5, 8])),
+                "live_backlog": random.choice(["true", "false"]),
+                "gender": random.choice(["any", "any", "female"]),
+            },
+        }
+        for _ in range(count)
+    ]
+
+
+def bench_engine(students, placements):
+    start = time.perf_counter()
+    columns = StudentColumns.from_documents(students)
+    built = time.perf_counter()
+    columns.shortlist(placements[0]["eligibility"])
+    one = time.perf_counter()
+    columns.shortlist_all(placements)
+    everything = time.perf_counter()
+    print(f"build columns ({len(students)} students): {(built - start) * 1000:9.1f} ms")
+    print(f"one placement:                      {(one - built) * 1000:9.2f} ms")
+    print(
+        f"all {len(placements)} placements:                {(everything - one) * 1000:9.1f} ms"
+    )
+
+
+def bench_aggregation(db_uri, db_name, sample):
+    from flask import Flask
+
+    from app.dao.usersDAO import get_eligible_companies
+
+    app = Flask(__name__)
+    app.config.update(
+        DB_URI=db_uri,
+        DB_NAME=db_name,
+        MONGO_MAX_POOL_SIZE=10,
+        MONGO_MIN_POOL_SIZE=0,
+        MONGO_WAIT_QUEUE_TIMEOUT_MS=2000,
+        MONGO_MAX_IDLE_TIME_MS=60000,
+    )
+    with app.app_context():
+        from app.db import get_db
+
+        users = get_db()["users"]
+        total = users.count_documents({"role": "student"})
+        ids = [
+            s["_id"] for s in users.find({"role": "student"}, {"_id": 1}).limit(sample)
+        ]
+        start = time.perf_counter()
+        for id in ids:
+            get_eligible_companies(id)
+        seconds = time.perf_counter() - start
+    print(
+        f"aggregation: {seconds / max(len(ids), 1) * 1000:.2f} ms/student, "
+        f"~{seconds / max(len(ids), 1) * total:.1f} s for all {total} students"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--placements", type=int, default=50)
+    parser.add_argument("--db-uri")
+    parser.add_argument("--db-name", default="tpo")
+    parser.add_argument("--sample", type=int, default=200)
+    args = parser.parse_args()
+    random.seed(1)
+    bench_engine(make_students(args.students), make_eligibilities(args.placements))
+    if args.db_uri:
+        bench_aggregation(args.db_uri, args.db_name, args.sample)
+
+
+if __name__ == "__main__":
+    main()
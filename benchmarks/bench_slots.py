@@ -0,0 +1,68 @@
+"""
+Measures the interview slot allocator of ``app.slots`` on generated
+candidates, for growing numbers of students & panels.
+
+A share of the students (``--busy``) has interviews of other phases during
+the phase, each taking one to three consecutive slots.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_slots --busy 0.3
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.slots import allocate_slots, busy_slots
+
+SIZES = [(500, 5), (1000, 10), (5000, 50), (20000, 100), (50000, 200)]
+
+
+def make_busy(students, share, start, slot_length, slot_count):
+    busy = {}
+    for student in students:
+        if random.random() >= share:
+            continue
+        first = random.randrange(slot_count)
+        intervals = [
+            (
+                start + first * slot_length,
+                start + (first + random.randint(1, 3)) * slot_length,
+            )
+        ]
+        busy[student] = busy_slots(intervals, start, slot_length, slot_count)
+    return busy
+
+
+def bench(students, panels, share, slot_minutes):
+    start = datetime(2020, 5, 8, 9)
+    slot_length = timedelta(minutes=slot_minutes)
+    # enough slots for everybody plus a tenth for the busy students
+    slot_count = -(-students * 11 // (panels * 10))
+    ids = [ObjectId() for _ in range(students)]
+    busy = make_busy(ids, share, start, slot_length, slot_count)
+    began = time.perf_counter()
+    allocation, unallocated = allocate_slots(ids, slot_count, panels, busy)
+    seconds = time.perf_counter() - began
+    print(
+        f"{students:6d} students x {panels:3d} panels, {slot_count:4d} slots: "
+        f"{seconds * 1000:8.1f} ms, {len(allocation)} allocated, "
+        f"{len(unallocated)} without a slot"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--busy", type=float, default=0.3)
+    parser.add_argument("--slot-minutes", type=int, default=15)
+    args = parser.parse_args()
+    random.seed(1)
+    for students, panels in SIZES:
+        bench(students, panels, args.busy, args.slot_minutes)
+
+
+if __name__ == "__main__":
+    main()
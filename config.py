@@ -5,6 +5,58 @@ class Config(object):
 
     # Put any configurations here that are common across all environments
 
+    # MongoDB connection pool of the process-wide client (see app/db.py)
+    MONGO_MAX_POOL_SIZE = 50
+    MONGO_MIN_POOL_SIZE = 0
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = 2000
+    MONGO_MAX_IDLE_TIME_MS = 60000
+
+    # create the indexes declared by the DAO modules in the background on start
+    MONGO_ENSURE_INDEXES = True
+
+    # keyset pagination of the listing endpoints (``?limit=&after=``)
+    PAGE_SIZE_DEFAULT = 50
+    PAGE_SIZE_MAX = 500
+
+    # documents fetched per round trip (and written per chunk) by streamed lists
+    STREAM_BATCH_SIZE = 100
+
+    # "canonical" writes dates as {"$date": ...}, "fast" as ISO 8601 strings
+    JSON_ENCODER = "canonical"
+
+    # read endpoints convert raw BSON to JSON without building Python dicts
+    RAW_BSON_READS = False
+
+    # seconds the student columns of the shortlist engine are cached per process
+    SHORTLIST_CACHE_SECONDS = 300
+
+    # in-process cache of GET responses of read-heavy endpoints (app/cache.py)
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_MAX_ENTRIES = 1024
+    RESPONSE_CACHE_MAX_BODY_BYTES = 1024 * 1024
+
+    # delta sync watermarks are kept this far behind now (``?since=``)
+    DELTA_SYNC_LAG_SECONDS = 5
+
+    # bcrypt cost of new password hashes, older hashes are rehashed on login
+    BCRYPT_LOG_ROUNDS = 12
+
+    # process pool hashing passwords (app/passwords.py), None for one per core
+    PASSWORD_POOL_WORKERS = None
+    # passwords queued or hashing at once before requests get 503
+    PASSWORD_POOL_MAX_PENDING = 64
+    PASSWORD_POOL_TIMEOUT = 10
+
+    # a scheduled phase lasts this long unless it has its own duration_minutes
+    PHASE_DEFAULT_DURATION_MINUTES = 24 * 60
+
+    # seconds between status updates of the phases (app/scheduler.py)
+    PHASE_SCHEDULER_ENABLED = True
+    PHASE_STATUS_INTERVAL_SECONDS = 60
+
+    # seconds after which the day lock of a crashed slot allocation expires
+    SLOT_ALLOCATION_LOCK_SECONDS = 60
+
 
 class DevelopmentConfig(Config):
     """
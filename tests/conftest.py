@@ -0,0 +1,38 @@
+import mongomock
+import pytest
+
+from app import create_app
+from app.cache import response_cache
+from app.db import get_db
+from app.indexes import ensure_indexes
+from app.shortlist import _cache as student_columns_cache
+from config import DevelopmentConfig
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """
+    App whose database is an in-memory mongomock client with the declared
+    indexes, without the background threads.
+    """
+    client = mongomock.MongoClient()
+    monkeypatch.setattr("app.db.get_client", lambda: client)
+    monkeypatch.setattr(DevelopmentConfig, "MONGO_ENSURE_INDEXES", False)
+    monkeypatch.setattr(DevelopmentConfig, "PHASE_SCHEDULER_ENABLED", False)
+    flask_app = create_app("development")
+    flask_app.config["TESTING"] = True
+    response_cache.clear()
+    monkeypatch.setitem(student_columns_cache, "columns", None)
+    with flask_app.app_context():
+        ensure_indexes()
+        yield flask_app
+
+
+@pytest.fixture
+def db(app):
+    return get_db()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,58 @@
+import random
+from datetime import datetime, timedelta
+
+from app.conflicts import IntervalTree
+
+START = datetime(2020, 5, 1)
+
+
+def _interval(rng):
+    start = START + timedelta(hours=rng.randrange(24 * 30))
+    return start, start + timedelta(hours=rng.randint(1, 72))
+
+
+def _brute_force(intervals, start, end):
+    return sorted(id for id, (s, e) in intervals.items() if s < end and e > start)
+
+
+def test_overlapping_matches_brute_force():
+    rng = random.Random(1)
+    tree = IntervalTree()
+    intervals = {}
+    for step in range(2000):
+        id = str(rng.randrange(300))
+        if rng.random() < 0.2:
+            tree.discard(id)
+            intervals.pop(id, None)
+        else:
+            start, end = _interval(rng)
+            tree.add(id, start, end, id)
+            intervals[id] = (start, end)
+        assert len(tree) == len(intervals)
+        if step % 10 == 0:
+            start, end = _interval(rng)
+            found = tree.overlapping(start, end)
+            assert sorted(found) == _brute_force(intervals, start, end)
+            starts = [intervals[id][0] for id in found]
+            assert starts == sorted(starts)
+
+
+def test_intervals_are_half_open():
+    hour = timedelta(hours=1)
+    tree = IntervalTree()
+    tree.add("a", START, START + hour, "a")
+    assert tree.overlapping(START + hour, START + 2 * hour) == []
+    assert tree.overlapping(START - hour, START) == []
+    assert tree.overlapping(START, START + timedelta(minutes=1)) == ["a"]
+
+
+def test_add_replaces_the_interval_with_the_same_id():
+    tree = IntervalTree()
+    tree.add("a", START, START + timedelta(hours=1), "old")
+    tree.add("a", START + timedelta(days=1), START + timedelta(days=2), "new")
+    assert len(tree) == 1
+    assert tree.overlapping(START, START + timedelta(hours=1)) == []
+    assert tree.overlapping(START, START + timedelta(days=3)) == ["new"]
+    tree.discard("a")
+    assert "a" not in tree
+    assert tree.overlapping(START, START + timedelta(days=3)) == []
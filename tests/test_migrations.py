@@ -0,0 +1,96 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.dao.placementsDAO import (
+    backfill_company_snapshots,
+    backfill_phase_ends,
+    migrate_phases,
+)
+
+
+def test_migrate_phases_keeps_the_placements_with_duplicate_titles(db):
+    company_id = ObjectId()
+    company = {"company_name": "Acme", "email": "hr@acme.com"}
+    duplicated = db["placements"].insert_one(
+        {
+            "company_id": company_id,
+            "company": company,
+            "phases": [
+                {"title": "Aptitude", "requested_date": datetime(2020, 5, 1)},
+                {"title": "Interview", "scheduled_date": datetime(2020, 5, 4)},
+                {"title": "Aptitude", "requested_date": datetime(2020, 5, 2)},
+            ],
+        }
+    ).inserted_id
+    copied = db["placements"].insert_one(
+        {
+            "company_id": company_id,
+            "company": company,
+            "phases": [{"title": "HR", "suggested_date": datetime(2020, 5, 3)}],
+        }
+    ).inserted_id
+
+    report = migrate_phases(batch_size=1)
+
+    assert report["duplicates"] == [(duplicated, "Aptitude")]
+    phases = {p["title"]: p for p in db["phases"].find()}
+    assert set(phases) == {"Aptitude", "Interview", "HR"}
+    assert phases["Aptitude"]["requested_date"] == datetime(2020, 5, 1)
+    assert phases["Interview"]["status"] == "upcoming"
+    assert phases["HR"]["status"] == "pending"
+    assert phases["HR"]["company"] == company
+    # the second Aptitude is still embedded, the copied placement is emptied
+    assert len(db["placements"].find_one({"_id": duplicated})["phases"]) == 3
+    assert "phases" not in db["placements"].find_one({"_id": copied})
+
+    # running it again copies nothing twice
+    migrate_phases()
+    assert db["phases"].count_documents({}) == 3
+
+
+def test_company_snapshots_repair_the_phases_moved_before(db):
+    company_id = db["users"].insert_one(
+        {
+            "role": "company",
+            "company_name": "Acme",
+            "concerned_person": {"email": "hr@acme.com"},
+        }
+    ).inserted_id
+    placement_id = db["placements"].insert_one(
+        {
+            "company_id": str(company_id),
+            "phases": [{"title": "Aptitude", "scheduled_date": datetime(2020, 5, 1)}],
+        }
+    ).inserted_id
+
+    migrate_phases()
+    assert db["phases"].find_one()["company"] is None
+    report = backfill_company_snapshots()
+
+    assert report == {"updated": 1, "missing_company": []}
+    for document in (
+        db["placements"].find_one({"_id": placement_id}),
+        db["phases"].find_one({"placement_id": placement_id}),
+    ):
+        assert document["company_id"] == company_id
+        assert document["company"]["company_name"] == "Acme"
+
+
+def test_backfill_phase_ends_bumps_updated_at(db):
+    written = datetime(2020, 1, 1)
+    id = db["phases"].insert_one(
+        {
+            "placement_id": ObjectId(),
+            "title": "Aptitude",
+            "status": "upcoming",
+            "scheduled_date": datetime(2020, 5, 1, 10),
+            "duration_minutes": 90,
+            "updated_at": written,
+        }
+    ).inserted_id
+
+    assert backfill_phase_ends(60) == {"updated": 1}
+    phase = db["phases"].find_one({"_id": id})
+    assert phase["ends_at"] == datetime(2020, 5, 1, 11, 30)
+    assert phase["updated_at"] > written
@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from app.offers import allocate_offers, offer_changes, parse_positions
+
+
+def _season(rng, students, placements):
+    placement_docs = [
+        {
+            "_id": id,
+            "dream": rng.random() < 0.2,
+            "positions": str(rng.randint(0, 4)),
+            "offers": [],
+        }
+        for id in range(placements)
+    ]
+    sgpa = {s: round(rng.uniform(5, 10), 1) for s in range(students)}
+    candidates = [
+        {"placement_id": placement, "student_id": s, "preference": preference}
+        for s in range(students)
+        for preference, placement in enumerate(
+            rng.sample(range(placements), rng.randint(0, placements)), 1
+        )
+    ]
+    return placement_docs, candidates, sgpa
+
+
+def _rank(sgpa, student):
+    return (-sgpa[student], student)
+
+
+def test_parse_positions():
+    assert parse_positions("12") == 12
+    assert parse_positions(" 3 ") == 3
+    assert parse_positions(0) == 0
+    for value in (None, "", "TBD", "10-15", "-1"):
+        with pytest.raises(ValueError):
+            parse_positions(value)
+
+
+def test_allocation_is_stable_and_within_positions():
+    rng = random.Random(1)
+    for _ in range(100):
+        placements, candidates, sgpa = _season(rng, 30, 8)
+        allocation, skipped = allocate_offers(placements, candidates, sgpa)
+        assert skipped == []
+        by_id = {p["_id"]: p for p in placements}
+        applied = {(c["placement_id"], c["student_id"]) for c in candidates}
+        preference = {
+            (c["student_id"], c["placement_id"]): c["preference"] for c in candidates
+        }
+
+        regular = {}
+        for id, students in allocation.items():
+            assert len(students) <= int(by_id[id]["positions"])
+            assert len(set(students)) == len(students)
+            assert all((id, s) in applied for s in students)
+            if not by_id[id]["dream"]:
+                for student in students:
+                    # one regular offer per student
+                    assert student not in regular
+                    regular[student] = id
+
+        # dream placements take their best candidates
+        for id, placement in by_id.items():
+            if placement["dream"]:
+                ranked = sorted(
+                    (s for p, s in applied if p == id), key=lambda s: _rank(sgpa, s)
+                )
+                assert allocation[id] == ranked[: int(placement["positions"])]
+
+        # no student & regular placement prefer each other to what they got
+        for id, student in applied:
+            if by_id[id]["dream"] or regular.get(student) == id:
+                continue
+            current = regular.get(student)
+            if current is not None and (
+                preference[(student, current)] < preference[(student, id)]
+            ):
+                continue
+            held = allocation[id]
+            assert len(held) == int(by_id[id]["positions"])
+            assert all(_rank(sgpa, s) < _rank(sgpa, student) for s in held)
+
+
+def test_invalid_positions_are_skipped():
+    placements = [
+        {"_id": 1, "positions": "0"},
+        {"_id": 2, "positions": "TBD"},
+        {"_id": 3, "positions": "1", "offers": ["c"]},
+        {"_id": 4, "positions": None, "offers": ["c"]},
+    ]
+    candidates = [
+        {"placement_id": id, "student_id": s, "preference": id}
+        for id in (1, 2, 3, 4)
+        for s in "abc"
+    ]
+    sgpa = {"a": 9.0, "b": 8.0, "c": 7.0}
+    allocation, skipped = allocate_offers(placements, candidates, sgpa)
+    assert allocation == {1: [], 3: ["a"]}
+    assert skipped == [2, 4]
+    assert offer_changes(placements, allocation) == {
+        # never allocated
+        1: {"added": [], "removed": []},
+        3: {"added": ["a"], "removed": ["c"]},
+    }
@@ -0,0 +1,143 @@
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.dao.placementsDAO import save_phase_results
+from app.dao.usersDAO import current_placement_details
+
+URL = "/api/v1/placement"
+
+
+def _students(db, *sgpa):
+    return db["users"].insert_many(
+        [
+            {"role": "student", "login_email": f"{i}@example.com", "sem_marks": [value]}
+            for i, value in enumerate(sgpa)
+        ]
+    ).inserted_ids
+
+
+def _placement(db, positions="1", phases=("Interview",)):
+    company_id = ObjectId()
+    placement_id = db["placements"].insert_one(
+        {"company_id": company_id, "year": 2020, "positions": positions}
+    ).inserted_id
+    db["phases"].insert_many(
+        [
+            {
+                "placement_id": placement_id,
+                "company_id": company_id,
+                "title": title,
+                "status": "upcoming",
+                "scheduled_date": datetime(2020, 5, day),
+            }
+            for day, title in enumerate(phases, 1)
+        ]
+    )
+    return placement_id, company_id
+
+
+def _upload(client, placement_id, title, results):
+    return client.post(
+        f"{URL}/phase/result",
+        json={
+            "placement_id": str(placement_id),
+            "phase_title": title,
+            "results": [
+                {"student_id": str(id), "status": status}
+                for id, status in results.items()
+            ],
+        },
+    )
+
+
+def test_result_uploads_do_not_undo_the_offers(client, db):
+    best, other = _students(db, 9.0, 7.0)
+    placement_id, company_id = _placement(db)
+    results = {best: "placed", other: "placed"}
+    assert _upload(client, placement_id, "Interview", results).status_code == 200
+
+    response = client.post(f"{URL}/offers", json={"year": 2020})
+    assert response.status_code == 200
+    assert response.get_json()["changes"] == {
+        str(placement_id): {"added": [str(best)], "removed": []}
+    }
+
+    assert _upload(client, placement_id, "Interview", results).status_code == 200
+    placement = db["placements"].find_one({"_id": placement_id})
+    assert placement["offers"] == [best]
+    assert sorted(placement["placed_students"]) == sorted([best, other])
+    details = current_placement_details(company_id)
+    assert details["total_placed"] == 1
+    assert details["total_passed"] == 2
+    assert [phase["title"] for phase in details["result"]] == ["Interview"]
+
+    dry_run = client.post(f"{URL}/offers", json={"year": 2020, "dry_run": True})
+    assert dry_run.get_json()["changes"] == {}
+
+
+def test_offers_report_invalid_positions(client, db):
+    (student,) = _students(db, 8.0)
+    placement_id, _ = _placement(db, positions="TBD")
+    _upload(client, placement_id, "Interview", {student: "placed"})
+
+    response = client.post(f"{URL}/offers", json={"year": 2020})
+    assert response.get_json()["invalid_positions"] == [str(placement_id)]
+    assert "offers" not in db["placements"].find_one({"_id": placement_id})
+
+
+def test_failed_result_upload_places_nobody(db, monkeypatch):
+    (student,) = _students(db, 8.0)
+    placement_id, _ = _placement(db)
+    results = db["phase_results"]
+
+    def bulk_write(requests, **kwargs):
+        raise BulkWriteError({"writeErrors": [], "nInserted": 0})
+
+    monkeypatch.setattr(results, "bulk_write", bulk_write)
+    saved = save_phase_results(
+        str(placement_id), "Interview", [{"student_id": student, "status": "placed"}]
+    )
+    assert isinstance(saved, BulkWriteError)
+    assert "placed_students" not in db["placements"].find_one({"_id": placement_id})
+
+
+def test_csv_results_by_roll_number(client, db):
+    students = {}
+    for roll in ("17CE1001", "17CE1002"):
+        user = {"role": "student", "login_email": roll, "roll_number": roll}
+        students[roll] = db["users"].insert_one(user).inserted_id
+    placement_id, company_id = _placement(db, phases=("Aptitude",))
+    query = {"placement_id": str(placement_id), "phase_title": "Aptitude"}
+    csv = (
+        "roll_number,status\n"
+        "17CE1001,placed\n"
+        "17CE1002,Passed\n"
+        "17CE9999,passed\n"
+        "17CE1001,maybe\n"
+    )
+    response = client.post(
+        f"{URL}/phase/result", query_string=query, data=csv, content_type="text/csv"
+    )
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["count"] == 2
+    assert body["unknown"] == ["17CE9999"]
+    assert [row["status"] for row in body["invalid"]] == ["maybe"]
+    placement = db["placements"].find_one({"_id": placement_id})
+    assert placement["placed_students"] == [students["17CE1001"]]
+
+    # a later upload replaces the result and the placed students
+    csv = "roll_number,status\n17CE1001,failed\n"
+    client.post(
+        f"{URL}/phase/result", query_string=query, data=csv, content_type="text/csv"
+    )
+    placement = db["placements"].find_one({"_id": placement_id})
+    assert placement["placed_students"] == []
+    response = client.get(
+        f"{URL}/phase/result",
+        query_string={"company_id": str(company_id), "phase_title": "Aptitude"},
+    )
+    results = {row["rollno"]: row["status"] for row in response.get_json()}
+    assert results == {"17CE1001": "failed", "17CE1002": "passed"}
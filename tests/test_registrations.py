@@ -0,0 +1,65 @@
+from bson import ObjectId
+
+URL = "/api/v1/placement"
+
+
+def _student(db, i):
+    return db["users"].insert_one(
+        {"role": "student", "login_email": f"{i}@example.com", "name": str(i)}
+    ).inserted_id
+
+
+def _register(client, placement_id, student_id, method="PUT", **data):
+    send = client.put if method == "PUT" else client.delete
+    return send(
+        f"{URL}/{placement_id}/register", json={"student_id": str(student_id), **data}
+    )
+
+
+def test_register_and_unregister(client, db):
+    placement_id = db["placements"].insert_one({"year": 2020}).inserted_id
+    student = _student(db, 1)
+
+    response = _register(client, placement_id, student, preference=2)
+    assert response.get_json() == {"success": True, "registered": True}
+    response = _register(client, placement_id, student, preference=1)
+    assert response.get_json() == {"success": True, "registered": False}
+    registration = db["registrations"].find_one({"student_id": student})
+    assert registration["preference"] == 1
+
+    response = _register(client, placement_id, student, method="DELETE")
+    assert response.get_json() == {"success": True, "unregistered": True}
+    response = _register(client, placement_id, student, method="DELETE")
+    assert response.get_json() == {"success": True, "unregistered": False}
+
+
+def test_register_rejects_unknown_placements_and_students(client, db):
+    placement_id = db["placements"].insert_one({"year": 2020}).inserted_id
+    company = db["users"].insert_one({"role": "company"}).inserted_id
+    for placement, student in (
+        (ObjectId(), _student(db, 1)),
+        (placement_id, ObjectId()),
+        (placement_id, company),
+    ):
+        assert _register(client, placement, student).status_code == 400
+    assert db["registrations"].count_documents({}) == 0
+
+
+def test_registrants_pages_skip_deleted_students(client, db):
+    placement_id = db["placements"].insert_one({"year": 2020}).inserted_id
+    students = sorted(_student(db, i) for i in range(5))
+    for student in students:
+        _register(client, placement_id, student)
+    db["users"].delete_one({"_id": students[1]})
+
+    names, after = [], None
+    while True:
+        query = {"limit": 2, **({"after": after} if after else {})}
+        page = client.get(f"{URL}/{placement_id}/registrations", query_string=query)
+        assert page.status_code == 200
+        body = page.get_json()
+        names += [student["name"] for student in body["data"]]
+        after = body["next_cursor"]
+        if after is None:
+            break
+    assert names == ["0", "2", "3", "4"]
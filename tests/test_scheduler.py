@@ -0,0 +1,50 @@
+import threading
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app import scheduler
+from app.scheduler import advance_phases, advance_phases_in_background
+
+
+def test_advance_phases_moves_the_statuses(db):
+    now = datetime.utcnow()
+    phases = {
+        status: db["phases"].insert_one(
+            {
+                "placement_id": ObjectId(),
+                "title": status,
+                "status": "upcoming",
+                "scheduled_date": now + start,
+                "ends_at": now + start + timedelta(hours=1),
+            }
+        ).inserted_id
+        for status, start in (
+            ("upcoming", timedelta(hours=1)),
+            ("ongoing", timedelta(minutes=-30)),
+            ("completed", timedelta(hours=-2)),
+        )
+    }
+    moved, version = advance_phases()
+    assert moved == {"ongoing": 1, "completed": 1}
+    for status, id in phases.items():
+        assert db["phases"].find_one({"_id": id})["status"] == status
+    assert advance_phases(version) == ({"ongoing": 0, "completed": 0}, version)
+
+
+def test_the_scheduler_thread_survives_a_failed_run(app, monkeypatch):
+    calls, retried, never = [], threading.Event(), threading.Event()
+
+    def advance(version):
+        calls.append(version)
+        if len(calls) == 1:
+            raise RuntimeError("unexpected")
+        retried.set()
+        # keep the daemon thread parked for the rest of the tests
+        never.wait()
+
+    monkeypatch.setattr(scheduler, "advance_phases", advance)
+    app.config["PHASE_STATUS_INTERVAL_SECONDS"] = 0
+    advance_phases_in_background(app)
+    assert retried.wait(5)
+    assert len(calls) == 2
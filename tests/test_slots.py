@@ -0,0 +1,128 @@
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.dao.placementsDAO import lock_slot_days, unlock_slot_days
+from app.slots import allocate_slots, busy_slots
+
+START = datetime(2020, 5, 8, 9)
+SLOT = timedelta(minutes=15)
+
+
+def test_busy_slots_cover_the_overlapping_slots():
+    intervals = [
+        (START + SLOT, START + 2 * SLOT),
+        (START + 3 * SLOT + timedelta(minutes=5), START + 5 * SLOT),
+        (START - SLOT, START + timedelta(minutes=1)),
+        (START + 9 * SLOT, START + 20 * SLOT),
+    ]
+    assert busy_slots(intervals, START, SLOT, 10) == {0, 1, 3, 4, 9}
+
+
+def test_allocation_respects_panels_and_busy_slots():
+    rng = random.Random(1)
+    for _ in range(50):
+        slot_count = rng.randint(1, 30)
+        panels = rng.randint(1, 5)
+        students = list(range(rng.randint(0, slot_count * panels + 10)))
+        busy = {
+            s: set(rng.sample(range(slot_count), rng.randint(1, slot_count)))
+            for s in students
+            if rng.random() < 0.4
+        }
+        allocation, unallocated = allocate_slots(students, slot_count, panels, busy)
+
+        allocated = [student for student, _, _ in allocation]
+        assert sorted(allocated + unallocated) == students
+        booked = [(slot, panel) for _, slot, panel in allocation]
+        assert len(set(booked)) == len(booked)
+        for student, slot, panel in allocation:
+            assert 0 <= slot < slot_count and 0 <= panel < panels
+            assert slot not in busy.get(student, ())
+
+        # a student without a slot was busy in every slot with a free panel
+        taken = Counter(slot for slot, _ in booked)
+        full = {slot for slot, count in taken.items() if count == panels}
+        for student in unallocated:
+            assert set(range(slot_count)) <= full | busy.get(student, set())
+
+
+def _phase(db, placement_id, title, start, hours=1):
+    db["phases"].insert_one(
+        {
+            "placement_id": placement_id,
+            "company_id": ObjectId(),
+            "title": title,
+            "status": "upcoming",
+            "scheduled_date": start,
+            "ends_at": start + timedelta(hours=hours),
+        }
+    )
+
+
+def _allocate(client, placement_id, title, panels=1, slot_minutes=15):
+    return client.post(
+        "/api/v1/placement/phase/slots",
+        json={
+            "placement_id": str(placement_id),
+            "phase_title": title,
+            "panels": panels,
+            "slot_minutes": slot_minutes,
+        },
+    )
+
+
+def test_slot_allocation_avoids_the_slots_of_other_phases(client, db):
+    students = [ObjectId() for _ in range(3)]
+    db["users"].insert_many(
+        [{"_id": id, "role": "student", "login_email": str(id)} for id in students]
+    )
+    placements = db["placements"].insert_many([{}, {}]).inserted_ids
+    for placement_id in placements:
+        _phase(db, placement_id, "Interview", START)
+        db["registrations"].insert_many(
+            [{"placement_id": placement_id, "student_id": id} for id in students]
+        )
+
+    first = _allocate(client, placements[0], "Interview")
+    assert first.get_json()["allocated"] == 3
+    # allocating again replaces the earlier allocation
+    assert _allocate(client, placements[0], "Interview").status_code == 200
+    second = _allocate(client, placements[1], "Interview")
+    assert second.get_json()["allocated"] == 3
+    assert db["interview_slots"].count_documents({}) == 6
+
+    for placement_id in placements:
+        query = {"placement_id": str(placement_id), "phase_title": "Interview"}
+        slots = client.get("/api/v1/placement/phase/slots", query_string=query)
+        assert len(slots.get_json()) == 3
+    starts = [(s["student_id"], s["starts_at"]) for s in db["interview_slots"].find()]
+    assert len(set(starts)) == len(starts)
+
+
+def test_slot_allocation_waits_for_a_running_allocation(client, db):
+    placement_id = db["placements"].insert_one({}).inserted_id
+    _phase(db, placement_id, "Interview", START)
+    running = ObjectId()
+    assert lock_slot_days(["2020-05-08"], running, 60) is True
+
+    response = _allocate(client, placement_id, "Interview")
+    assert response.status_code == 409
+    assert db["slot_locks"].find_one({"_id": "2020-05-08"})["owner"] == running
+
+    unlock_slot_days(["2020-05-08"], running)
+    assert _allocate(client, placement_id, "Interview").status_code == 200
+    assert db["slot_locks"].count_documents({}) == 0
+
+
+def test_expired_slot_locks_are_taken_over(db):
+    crashed, owner = ObjectId(), ObjectId()
+    # a lock of -1 seconds has already expired
+    assert lock_slot_days(["2020-05-08", "2020-05-09"], crashed, -1) is True
+    assert lock_slot_days(["2020-05-09"], owner, 60) is True
+    assert lock_slot_days(["2020-05-08", "2020-05-09"], ObjectId(), 60) is False
+    # a failed lock releases the days it had taken, the expired one included
+    assert db["slot_locks"].find_one({"_id": "2020-05-08"}) is None
+    assert db["slot_locks"].find_one({"_id": "2020-05-09"})["owner"] == owner
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.dao import usersDAO
+from app.dao.usersDAO import (
+    approve_user,
+    bulk_set_approval,
+    create_user,
+    get_user_by_email,
+    reject_user,
+)
+
+URL = "/api/v1/user"
+
+
+def _student(email):
+    user = {"role": "student", "email": email, "profile_completed": False}
+    return create_user(user)["_id"]
+
+
+def test_profile_email_is_the_login_email(client, db):
+    id = _student("a@example.com")
+    response = client.put(
+        f"{URL}/{id}/create_profile", json={"email": " New@Example.com "}
+    )
+    assert response.status_code == 200
+    assert db["users"].find_one({"_id": id})["login_email"] == "new@example.com"
+    assert get_user_by_email("new@example.com")["_id"] == id
+
+    company = create_user(
+        {"role": "company", "concerned_person": {"email": "hr@example.com"}}
+    )["_id"]
+    response = client.put(
+        f"{URL}/{company}/update_profile",
+        json={"concerned_person.email": "jobs@example.com"},
+    )
+    assert response.status_code == 200
+    assert get_user_by_email("jobs@example.com")["_id"] == company
+
+
+def test_profile_email_of_another_user_is_rejected(client, db):
+    id = _student("a@example.com")
+    _student("b@example.com")
+    for view in ("create_profile", "update_profile"):
+        response = client.put(f"{URL}/{id}/{view}", json={"email": "B@example.com"})
+        assert response.status_code == 400
+        assert "already exists" in response.get_json()["error"]
+        user = db["users"].find_one({"_id": id})
+        assert user["email"] == "a@example.com"
+        assert user["login_email"] == "a@example.com"
+
+
+def test_create_user_rejects_a_taken_email(db):
+    _student("a@example.com")
+    assert "error" in create_user({"role": "student", "email": "A@example.com"})
+    assert db["users"].count_documents({}) == 1
+
+
+class _FrozenDatetime(datetime):
+    @classmethod
+    def utcnow(cls):
+        return cls(2020, 5, 8, 9)
+
+
+def test_bulk_approval_reports_only_its_own_writes(db, monkeypatch):
+    # concurrent calls may write in the same millisecond
+    monkeypatch.setattr(usersDAO, "datetime", _FrozenDatetime)
+    first, second = _student("a@example.com"), _student("b@example.com")
+    approve_user(first)
+    outcomes = bulk_set_approval(
+        [str(first), str(second), str(ObjectId()), "x"], approve=True
+    )
+    assert outcomes.pop(str(first)) == "already_approved"
+    assert outcomes.pop(str(second)) == "approved"
+    assert sorted(outcomes.values()) == ["invalid_id", "not_found"]
+
+    third = _student("c@example.com")
+    reject_user(third, "incomplete")
+    assert bulk_set_approval([str(third)], approve=False, reason="late") == {
+        str(third): "rejected"
+    }
+    assert len(db["users"].find_one({"_id": third})["rejected"]) == 2